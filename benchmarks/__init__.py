@@ -0,0 +1,3 @@
+"""
+Бенчмарки конвейера «ссылка → транскрипт» на локальном имитаторе Яндекс.Диска
+"""
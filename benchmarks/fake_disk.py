@@ -0,0 +1,202 @@
+"""
+Локальный имитатор REST API Яндекс.Диска для бенчмарков
+"""
+import asyncio
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class FakeDisk:
+    """
+    aiohttp-сервер с эндпоинтами /resources, /public/resources и /download.
+
+    Дерево папок: от корня /bench — depth уровней вложенности, в каждой
+    папке width подпапок и files_per_folder видео. Все видео отдаются
+    из одного файла video_path с поддержкой Range. latency добавляется
+    к каждому ответу, bandwidth (байт/с, 0 — без ограничения) — скорость
+    отдачи одного соединения.
+
+    ranges=False — сервер игнорирует Range и всегда отдаёт файл целиком.
+    link_uses > 0 — каждая ссылка на скачивание годится только для стольких
+    запросов, дальше отвечает expired_status (как истёкшая подпись).
+    """
+
+    ROOT = "/bench"
+    PUBLIC_KEY = "https://disk.yandex.ru/d/bench"
+
+    def __init__(
+        self,
+        video_path: Path,
+        depth: int = 1,
+        width: int = 2,
+        files_per_folder: int = 2,
+        latency: float = 0.02,
+        bandwidth: float = 0.0,
+        port: int = 0,
+        ranges: bool = True,
+        link_uses: int = 0,
+        expired_status: int = 410,
+    ):
+        self.video_path = Path(video_path)
+        self.video_size = self.video_path.stat().st_size
+        self.depth = depth
+        self.width = width
+        self.files_per_folder = files_per_folder
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.port = port
+        self.ranges = ranges
+        self.link_uses = link_uses
+        self.expired_status = expired_status
+
+        self._folders: Dict[str, List[Dict]] = {}
+        self._build(self.ROOT, 0)
+
+        self._runner: Optional[web.AppRunner] = None
+        # Счётчики запросов и отданных байт
+        self.api_requests = 0
+        self.download_requests = 0
+        self.bytes_sent = 0
+        self.links_issued = 0
+        self.expired_responses = 0
+        self._link_requests: Dict[str, int] = {}
+
+    def _build(self, path: str, level: int) -> None:
+        items = []
+        if level < self.depth:
+            for i in range(self.width):
+                child = f"{path}/d{i}"
+                items.append({"type": "dir", "name": f"d{i}", "path": child, "revision": 1})
+                self._build(child, level + 1)
+        for i in range(self.files_per_folder):
+            name = f"v{i}.mp4"
+            items.append({
+                "type": "file",
+                "name": name,
+                "path": f"{path}/{name}",
+                "size": self.video_size,
+                "md5": f"{path}/{name}",
+            })
+        self._folders[path] = items
+
+    @property
+    def video_count(self) -> int:
+        return sum(1 for items in self._folders.values() for item in items if item["type"] == "file")
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def api_url(self) -> str:
+        """Подставляется в YandexDisk.API_BASE_URL."""
+        return f"{self.base_url}/v1/disk"
+
+    # ── Жизненный цикл ───────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/v1/disk/resources", self._resources)
+        app.router.add_get("/v1/disk/resources/download", self._download_link)
+        app.router.add_get("/v1/disk/public/resources", self._public_resources)
+        app.router.add_get("/v1/disk/public/resources/download", self._download_link)
+        app.router.add_get("/download", self._download)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        # Порт 0 — свободный порт, выбранный системой
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ── Эндпоинты ────────────────────────────────────────────────────────────
+
+    def _listing(self, path: str, request: web.Request, inner: bool) -> web.Response:
+        items = self._folders.get(path)
+        if items is None:
+            return web.json_response({"error": "DiskNotFoundError", "description": path}, status=404)
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 20))
+        page = items[offset:offset + limit]
+        if inner:
+            # В публичной папке пути — относительно корня ресурса
+            page = [dict(item, path=item["path"][len(self.ROOT):]) for item in page]
+        return web.json_response({
+            "type": "dir",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "revision": 1,
+            "_embedded": {"items": page, "offset": offset, "limit": limit, "total": len(items)},
+        })
+
+    async def _resources(self, request: web.Request) -> web.Response:
+        self.api_requests += 1
+        await asyncio.sleep(self.latency)
+        path = "/" + request.query.get("path", "").lstrip("/")
+        return self._listing(path.rstrip("/") or "/", request, inner=False)
+
+    async def _public_resources(self, request: web.Request) -> web.Response:
+        self.api_requests += 1
+        await asyncio.sleep(self.latency)
+        inner = request.query.get("path", "/")
+        return self._listing(self.ROOT + inner.rstrip("/"), request, inner=True)
+
+    async def _download_link(self, request: web.Request) -> web.Response:
+        self.api_requests += 1
+        await asyncio.sleep(self.latency)
+        path = request.query.get("path", "")
+        self.links_issued += 1
+        href = f"{self.base_url}/download?path={path}&link={self.links_issued}"
+        return web.json_response({"href": href, "method": "GET"})
+
+    async def _download(self, request: web.Request) -> web.StreamResponse:
+        self.download_requests += 1
+        await asyncio.sleep(self.latency)
+
+        if self.link_uses:
+            link = request.query.get("link", "")
+            self._link_requests[link] = self._link_requests.get(link, 0) + 1
+            if self._link_requests[link] > self.link_uses:
+                self.expired_responses += 1
+                return web.Response(status=self.expired_status)
+
+        start, end = 0, self.video_size - 1
+        match = _RANGE_RE.match(request.headers.get("Range", "")) if self.ranges else None
+        if match:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(end, int(match.group(2)))
+            response = web.StreamResponse(status=206)
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{self.video_size}"
+        else:
+            response = web.StreamResponse(status=200)
+        if self.ranges:
+            response.headers["Accept-Ranges"] = "bytes"
+        response.content_length = end - start + 1
+        await response.prepare(request)
+
+        chunk = 64 * 1024
+        with open(self.video_path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(chunk, remaining))
+                if not data:
+                    break
+                await response.write(data)
+                remaining -= len(data)
+                self.bytes_sent += len(data)
+                if self.bandwidth > 0:
+                    await asyncio.sleep(len(data) / self.bandwidth)
+        await response.write_eof()
+        return response
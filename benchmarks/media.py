@@ -0,0 +1,35 @@
+"""
+Синтетические тестовые видео для бенчмарков (генерируются ffmpeg)
+"""
+import subprocess
+from pathlib import Path
+
+
+def make_video(path: Path, duration: float, width: int = 640, height: int = 360) -> Path:
+    """
+    Создаёт MP4 заданной длительности: тестовая картинка и тон 440 Гц.
+
+    Используются встроенные кодеки ffmpeg (mpeg4 + aac), поэтому хватает
+    любой сборки. Существующий файл не пересоздаётся — параметры стоит
+    включать в имя файла.
+    """
+    path = Path(path)
+    if path.exists() and path.stat().st_size > 0:
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc=size={width}x{height}:rate=25",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+        "-t", str(duration),
+        "-c:v", "mpeg4", "-q:v", "5",
+        "-c:a", "aac", "-b:a", "128k",
+        "-movflags", "+faststart",
+        "-y",
+        str(path),
+    ]
+    subprocess.run(cmd, check=True)
+    return path
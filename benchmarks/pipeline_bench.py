@@ -0,0 +1,402 @@
+"""
+Бенчмарк конвейера «ссылка → транскрипт» на локальном имитаторе Диска.
+
+Видео проходят через этапы бота (_stage_download, _stage_convert,
+_stage_transcribe из handlers.disk_handler) — замеряется тот же код,
+что работает в боте; конфигурация задаёт только параллелизм и режимы.
+
+Запуск:
+    python -m benchmarks.pipeline_bench --duration 30 --width 2 --files 2
+    python -m benchmarks.pipeline_bench --skip-transcribe --bandwidth 20 --json out.json
+
+Для каждой конфигурации печатается время этапов, realtime factor
+(время обработки / длительность аудио), пиковая RSS процесса вместе
+с дочерними (ffmpeg, воркеры Whisper) и пиковый объём временных файлов.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Optional
+
+from benchmarks.fake_disk import FakeDisk
+from benchmarks.media import make_video
+from services.pipeline import Pipeline, Stage
+from services.scheduler import FairScheduler
+from services.temp_space import TempSpace
+from services.transcription_pool import TranscriptionPool
+from services.video_converter import VideoConverter
+from services.yandex_disk import YandexDisk
+
+
+@dataclass
+class BenchConfig:
+    """Параллелизм этапов — аналог PIPELINE_* и DOWNLOAD_SEGMENTS бота."""
+    name: str
+    download: int
+    convert: int
+    transcribe: int
+    max_in_flight: int
+    segments: int
+    # ffmpeg читает видео по ссылке, без скачивания файла (STREAM_AUDIO)
+    stream: bool = False
+
+
+CONFIGS = {
+    "serial": BenchConfig("serial", download=1, convert=1, transcribe=1, max_in_flight=1, segments=1),
+    "concurrent": BenchConfig("concurrent", download=3, convert=2, transcribe=2, max_in_flight=6, segments=4),
+    "stream": BenchConfig("stream", download=3, convert=2, transcribe=2, max_in_flight=6, segments=4, stream=True),
+}
+
+
+@dataclass
+class _StageTimes:
+    busy: float = 0.0
+    count: int = 0
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+
+    def report(self) -> Dict:
+        span = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        return {
+            "busy_s": round(self.busy, 3),
+            "span_s": round(span, 3),
+            "mean_s": round(self.busy / self.count, 3) if self.count else 0.0,
+            "items": self.count,
+        }
+
+
+@dataclass
+class _Result:
+    config: str
+    videos: int = 0
+    failed: int = 0
+    audio_s: float = 0.0
+    listing_s: float = 0.0
+    model_load_s: float = 0.0
+    wall_s: float = 0.0
+    peak_rss_mb: float = 0.0
+    peak_temp_mb: float = 0.0
+    api_requests: int = 0
+    download_mb: float = 0.0
+    stages: Dict[str, Dict] = field(default_factory=dict)
+
+    @property
+    def rtf(self) -> float:
+        return self.wall_s / self.audio_s if self.audio_s else 0.0
+
+
+# ── Замеры памяти и временных файлов ─────────────────────────────────────────
+
+def _tree_rss_bytes(root_pid: int) -> Optional[int]:
+    """Суммарная RSS процесса и всех его потомков по /proc (None — /proc недоступен)."""
+    page = os.sysconf("SC_PAGE_SIZE")
+    parents: Dict[int, int] = {}
+    rss: Dict[int, int] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm") as f:
+                resident = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        # Имя процесса в скобках может содержать пробелы — разбираем после ")"
+        fields = stat.rsplit(")", 1)[1].split()
+        pid = int(entry)
+        parents[pid] = int(fields[1])
+        rss[pid] = resident * page
+
+    total = 0
+    for pid, size in rss.items():
+        current = pid
+        while current and current != root_pid:
+            current = parents.get(current, 0)
+        if current == root_pid:
+            total += size
+    return total
+
+
+def _dir_bytes(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass  # файл удалили между листингом и stat
+    return total
+
+
+class _Sampler:
+    """Фоновый опрос пиковой RSS и объёма временной папки."""
+
+    def __init__(self, temp_dir: Path, interval: float = 0.1):
+        self.temp_dir = temp_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_temp = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        pid = os.getpid()
+        while True:
+            rss = await asyncio.to_thread(_tree_rss_bytes, pid)
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss, rss)
+            self.peak_temp = max(self.peak_temp, await asyncio.to_thread(_dir_bytes, self.temp_dir))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self.peak_rss == 0:
+            # Без /proc — максимум RSS по getrusage (Linux: КБ, macOS: байты)
+            usage = max(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            )
+            self.peak_rss = usage * 1024 if os.uname().sysname == "Linux" else usage
+
+
+# ── Прогон одной конфигурации ────────────────────────────────────────────────
+
+def _load_handler(work_dir: Path) -> ModuleType:
+    """
+    Импортирует handlers.disk_handler, не трогая файлы бота.
+
+    Модуль читает config при импорте: токены подставляются фиктивные,
+    а очередь задач и кэш транскриптов создаются в work_dir.
+    """
+    os.environ.setdefault("BOT_TOKEN", "bench-token")
+    os.environ.setdefault("YANDEX_DISK_TOKEN", "bench-token")
+    os.environ.setdefault("ADMIN_IDS", "0")
+    jobs_path = work_dir / "jobs.sqlite3"
+    jobs_path.unlink(missing_ok=True)
+    os.environ["JOB_STORE_PATH"] = str(jobs_path)
+    os.environ["TRANSCRIPT_CACHE_PATH"] = str(work_dir / "transcripts.sqlite3")
+    os.environ["METADATA_CACHE_PATH"] = ""
+    from handlers import disk_handler
+    return disk_handler
+
+
+async def run_config(
+    config: BenchConfig, fake: FakeDisk, args: argparse.Namespace, work_dir: Path, handler: ModuleType
+) -> _Result:
+    result = _Result(config=config.name)
+    temp_dir = work_dir / config.name
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    temp_dir.mkdir(parents=True)
+
+    fake.api_requests = fake.download_requests = fake.bytes_sent = 0
+    disk = YandexDisk("bench-token", download_segments=config.segments, api_rate=args.api_rate)
+    # Запросы идут в имитатор вместо cloud-api.yandex.net
+    disk.API_BASE_URL = fake.api_url
+
+    # Сервисы обработчика на время прогона: этапы берут их из глобалов модуля
+    scheduler = FairScheduler({
+        "download": config.download,
+        "convert": config.convert,
+        "transcribe": config.transcribe,
+    })
+    handler._disk = disk
+    handler._converter = VideoConverter(temp_dir=str(temp_dir))
+    handler._convert_executor = ThreadPoolExecutor(max_workers=config.convert)
+    handler._scheduler = scheduler
+    handler._temp = TempSpace(
+        temp_dir,
+        handler.TEMP_MAX_MB * 1024 * 1024,
+        scheduler,
+        min_free_bytes=handler.TEMP_MIN_FREE_MB * 1024 * 1024,
+    )
+    handler.TEMP_DIR = temp_dir
+    handler.STREAM_AUDIO = config.stream
+    handler.AUDIO_IN_MEMORY = args.in_memory
+
+    pool: Optional[TranscriptionPool] = None
+    if not args.skip_transcribe:
+        pool = TranscriptionPool(
+            model_size=args.model, workers=config.transcribe, backend=args.backend, chunk_s=0
+        )
+        started = time.perf_counter()
+        await pool.start()
+        result.model_load_s = time.perf_counter() - started
+        handler._transcription = pool
+
+    times: Dict[str, _StageTimes] = {}
+
+    def timed(name: str, func):
+        stats = times.setdefault(name, _StageTimes())
+
+        async def wrapper(job):
+            started = time.perf_counter()
+            if stats.first_start is None:
+                stats.first_start = started
+            try:
+                return await func(job)
+            finally:
+                ended = time.perf_counter()
+                stats.busy += ended - started
+                stats.count += 1
+                stats.last_end = ended
+        return wrapper
+
+    # Те же этапы, что в handler._build_pipeline; без транскрибации аудио удаляет sink
+    stages = [
+        Stage("download", timed("download", handler._cancellable(handler._stage_download)), config.download),
+        Stage("convert", timed("convert", handler._cancellable(handler._stage_convert)), config.convert),
+    ]
+    if pool is not None:
+        stages.append(
+            Stage("transcribe", timed("transcribe", handler._cancellable(handler._stage_transcribe)), config.transcribe)
+        )
+
+    job_id = handler._jobs.create_job(chat_id=0, user_id=0, url=fake.ROOT)
+    listing_started: List[float] = []
+
+    async def source():
+        listing_started.append(time.perf_counter())
+        async for video in disk.iter_video_files_from_folder(fake.ROOT):
+            task = handler._jobs.add_task(job_id, video)
+            yield handler._VideoJob(task, handler._TaskProgress(task["id"], user_id=0))
+        result.listing_s = time.perf_counter() - listing_started[0]
+
+    async def sink(job, error: Optional[BaseException]) -> None:
+        result.videos += 1
+        job.cleanup()
+        if error is not None:
+            result.failed += 1
+            print(f"[{config.name}] {job.name}: {error}")
+
+    sampler = _Sampler(temp_dir)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        await Pipeline(stages, max_in_flight=config.max_in_flight).run(source(), sink)
+    finally:
+        result.wall_s = time.perf_counter() - started
+        await sampler.stop()
+        await disk.close()
+        handler._convert_executor.shutdown(wait=True)
+        if pool is not None:
+            pool.shutdown()
+        handler._jobs.update_job(job_id, status="done")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    result.audio_s = args.duration * (result.videos - result.failed)
+    result.peak_rss_mb = sampler.peak_rss / 2 ** 20
+    result.peak_temp_mb = sampler.peak_temp / 2 ** 20
+    result.api_requests = fake.api_requests
+    result.download_mb = fake.bytes_sent / 2 ** 20
+    result.stages = {name: stats.report() for name, stats in times.items()}
+    return result
+
+
+# ── Отчёт ────────────────────────────────────────────────────────────────────
+
+def print_report(results: List[_Result]) -> None:
+    header = f"{'config':<12}{'videos':>7}{'fail':>6}{'wall, s':>10}{'RTF':>8}{'x RT':>8}{'RSS, MB':>10}{'temp, MB':>10}{'api':>6}"
+    print()
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        speed = 1 / r.rtf if r.rtf else 0.0
+        print(
+            f"{r.config:<12}{r.videos:>7}{r.failed:>6}{r.wall_s:>10.2f}{r.rtf:>8.3f}{speed:>8.1f}"
+            f"{r.peak_rss_mb:>10.0f}{r.peak_temp_mb:>10.1f}{r.api_requests:>6}"
+        )
+
+    print()
+    for r in results:
+        extra = f", загрузка модели {r.model_load_s:.1f} с" if r.model_load_s else ""
+        print(f"{r.config}: обход папки завершён через {r.listing_s:.2f} с, скачано {r.download_mb:.1f} МБ{extra}")
+        for name, stats in r.stages.items():
+            print(
+                f"  {name:<11} занят {stats['busy_s']:>8.2f} с  окно {stats['span_s']:>8.2f} с  "
+                f"в среднем {stats['mean_s']:>6.2f} с × {stats['items']}"
+            )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера «ссылка → транскрипт»")
+    parser.add_argument("--configs", default="serial,concurrent", help=f"через запятую: {', '.join(CONFIGS)}")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность тестового видео, с")
+    parser.add_argument("--depth", type=int, default=1, help="глубина дерева папок")
+    parser.add_argument("--width", type=int, default=2, help="подпапок в каждой папке")
+    parser.add_argument("--files", type=int, default=2, help="видео в каждой папке")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа имитатора, с")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="скорость отдачи одного соединения, МБ/с (0 — без ограничения)")
+    parser.add_argument("--api-rate", type=float, default=10.0, help="лимит запросов к API в секунду")
+    parser.add_argument("--transcribe-workers", type=int, default=0, help="процессов Whisper в конфигурациях кроме serial")
+    parser.add_argument("--model", default="tiny", help="модель Whisper")
+    parser.add_argument("--backend", default="whisper", help="whisper или faster-whisper")
+    parser.add_argument("--skip-transcribe", action="store_true", help="только скачивание и конвертация")
+    parser.add_argument("--in-memory", action="store_true", help="аудио в память вместо WAV (AUDIO_IN_MEMORY)")
+    parser.add_argument("--work-dir", default="", help="папка для видео и временных файлов")
+    parser.add_argument("--json", default="", help="сохранить результаты в JSON")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> List[_Result]:
+    args = parse_args(argv)
+    names = [name.strip() for name in args.configs.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CONFIGS]
+    if unknown:
+        raise SystemExit(f"Неизвестные конфигурации: {', '.join(unknown)}")
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.gettempdir()) / "disk-bench"
+    video = make_video(work_dir / f"video_{args.duration:g}s.mp4", args.duration)
+    handler = _load_handler(work_dir)
+
+    fake = FakeDisk(
+        video,
+        depth=args.depth,
+        width=args.width,
+        files_per_folder=args.files,
+        latency=args.latency,
+        bandwidth=args.bandwidth * 2 ** 20,
+    )
+    await fake.start()
+    print(
+        f"Имитатор Диска: {fake.api_url}, видео {fake.video_count} × {args.duration:g} с "
+        f"({fake.video_size / 2 ** 20:.1f} МБ)"
+    )
+
+    results = []
+    try:
+        for name in names:
+            config = CONFIGS[name]
+            if config.transcribe > 1 and args.transcribe_workers:
+                config = replace(config, transcribe=args.transcribe_workers)
+            print(f"Прогон {name}…")
+            results.append(await run_config(config, fake, args, work_dir, handler))
+    finally:
+        await fake.stop()
+
+    print_report(results)
+    if args.json:
+        payload = [dict(vars(r), rtf=r.rtf) for r in results]
+        Path(args.json).write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -26,6 +26,130 @@ YANDEX_OAUTH_URL = "https://oauth.yandex.ru/authorize"
 YANDEX_TOKEN_URL = "https://oauth.yandex.ru/token"
 YANDEX_API_URL = "https://api-yandex.cloud/v1"
 
+# Получение обновлений: polling (по умолчанию) или webhook — aiohttp-сервер
+# на WEBHOOK_HOST:WEBHOOK_PORT, Telegram шлёт обновления на WEBHOOK_URL + WEBHOOK_PATH
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Секрет в заголовке X-Telegram-Bot-Api-Secret-Token (пусто — не проверять)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# Роль процесса бота: all — бот сам скачивает и транскрибирует видео;
+# frontend — только Telegram, видео обрабатывают процессы worker.py,
+# которые берут их из общей базы JOB_STORE_PATH
+BOT_ROLE = os.getenv("BOT_ROLE", "all").lower()
+# Процессы worker.py: имя (пусто — хост и pid), срок аренды видео, который
+# продлевается, пока идёт обработка, и интервал опроса очереди (секунды)
+WORKER_ID = os.getenv("WORKER_ID", "")
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "60"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1"))
+
+# Сколько секунд при остановке ждать завершения начатых задач; остальные
+# прерываются и продолжаются после следующего запуска
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+
+# Метрики Prometheus: GET /metrics на METRICS_HOST:METRICS_PORT (0 — выключено;
+# в режиме webhook при METRICS_PORT = WEBHOOK_PORT — на том же сервере)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Пул HTTP-соединений к API Яндекс.Диска (одна общая сессия на всё приложение)
+YANDEX_HTTP_POOL_LIMIT = int(os.getenv("YANDEX_HTTP_POOL_LIMIT", "100"))
+YANDEX_HTTP_LIMIT_PER_HOST = int(os.getenv("YANDEX_HTTP_LIMIT_PER_HOST", "10"))
+YANDEX_HTTP_KEEPALIVE = float(os.getenv("YANDEX_HTTP_KEEPALIVE", "30"))
+YANDEX_HTTP_DNS_TTL = int(os.getenv("YANDEX_HTTP_DNS_TTL", "300"))
+
+# Максимум одновременных запросов листинга при обходе дерева папок
+YANDEX_LISTING_CONCURRENCY = int(os.getenv("YANDEX_LISTING_CONCURRENCY", "8"))
+
+# REST API Яндекс.Диска: общий лимит запросов в секунду, допустимый всплеск
+# и число повторов при 429/5xx/сетевых ошибках (с экспоненциальной паузой)
+YANDEX_API_RATE = float(os.getenv("YANDEX_API_RATE", "10"))
+YANDEX_API_BURST = int(os.getenv("YANDEX_API_BURST", "20"))
+YANDEX_API_RETRIES = int(os.getenv("YANDEX_API_RETRIES", "5"))
+
+# Скачивание видео: число параллельных Range-сегментов на файл
+# и повторов при обрыве (с экспоненциальной паузой и докачкой)
+YANDEX_DOWNLOAD_SEGMENTS = int(os.getenv("YANDEX_DOWNLOAD_SEGMENTS", "4"))
+YANDEX_DOWNLOAD_RETRIES = int(os.getenv("YANDEX_DOWNLOAD_RETRIES", "5"))
+
+# Запись скачиваемых файлов (в отдельном потоке): размер чтения из сети,
+# размер одной записи на диск и предел данных в очереди записи на файл
+YANDEX_DOWNLOAD_CHUNK_KB = int(os.getenv("YANDEX_DOWNLOAD_CHUNK_KB", "256"))
+YANDEX_DOWNLOAD_WRITE_KB = int(os.getenv("YANDEX_DOWNLOAD_WRITE_KB", "1024"))
+YANDEX_DOWNLOAD_BUFFER_MB = int(os.getenv("YANDEX_DOWNLOAD_BUFFER_MB", "16"))
+
+# Модель Whisper: tiny, base, small, medium, large
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
+# Бэкенд распознавания: whisper (openai-whisper) или faster-whisper (CTranslate2, int8)
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "whisper")
+# Поиск речи (VAD) перед транскрибацией: тишина не отправляется в модель
+VAD_ENABLED = os.getenv("VAD_ENABLED", "false").lower() in ("1", "true", "yes")
+# Длинное аудио режется на фрагменты (секунды) с перекрытием и распознаётся
+# по очереди или параллельно во всех процессах транскрибации (0 — не резать)
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "300"))
+TRANSCRIBE_CHUNK_OVERLAP = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP", "3"))
+# Потоков инференса на один процесс транскрибации (0 — ядра / число процессов)
+TRANSCRIBE_THREADS = int(os.getenv("TRANSCRIBE_THREADS", "0"))
+
+# Конвейер обработки: число параллельных скачиваний, процессов ffmpeg
+# и процессов транскрибации (в каждом своя копия модели) — общие на всех
+# пользователей, места распределяются между пользователями по кругу
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "3"))
+PIPELINE_CONVERT_WORKERS = int(os.getenv("PIPELINE_CONVERT_WORKERS", "2"))
+PIPELINE_TRANSCRIBE_WORKERS = int(os.getenv("PIPELINE_TRANSCRIBE_WORKERS", "1"))
+# Задачи, в которых не больше стольких видео (в том числе ссылка на один файл),
+# получают высокий приоритет: их видео занимают общие ресурсы раньше больших папок
+PRIORITY_SMALL_JOB_VIDEOS = int(os.getenv("PRIORITY_SMALL_JOB_VIDEOS", "3"))
+# Максимум видео одновременно внутри конвейера (ограничивает место в temp/)
+PIPELINE_MAX_IN_FLIGHT = int(os.getenv("PIPELINE_MAX_IN_FLIGHT", "6"))
+# Порядок видео внутри ссылки: listing — в порядке листинга (по умолчанию),
+# shortest — сначала короткие (по размеру из листинга или длительности), включается
+# явно. С shortest обход папки идёт вперёд не больше чем на PIPELINE_ORDER_LOOKAHEAD
+# видео; перед первым видео листинг ждут до PIPELINE_ORDER_WAIT секунд, чтобы было
+# из чего выбирать
+PIPELINE_ORDER = os.getenv("PIPELINE_ORDER", "listing").lower()
+PIPELINE_ORDER_LOOKAHEAD = int(os.getenv("PIPELINE_ORDER_LOOKAHEAD", "100"))
+PIPELINE_ORDER_WAIT = float(os.getenv("PIPELINE_ORDER_WAIT", "2"))
+# Уточнять длительность через ffprobe по прямой ссылке (запрос к API и чтение
+# заголовков файла на каждое видео) и число одновременных проверок
+PIPELINE_ORDER_PROBE = os.getenv("PIPELINE_ORDER_PROBE", "false").lower() in ("1", "true", "yes")
+PIPELINE_ORDER_PROBE_WORKERS = int(os.getenv("PIPELINE_ORDER_PROBE_WORKERS", "4"))
+# Общий лимит скачанных видео в temp/ (МБ): скачивание ждёт, пока не освободится место
+TEMP_MAX_MB = int(os.getenv("TEMP_MAX_MB", "10240"))
+# Сколько места на томе всегда оставлять свободным (МБ): квота урезается, если не помещается
+TEMP_MIN_FREE_MB = int(os.getenv("TEMP_MIN_FREE_MB", "1024"))
+
+# Потоковое извлечение аудио: ffmpeg читает видео по прямой ссылке, без файла в temp/
+# (при ошибке — откат на скачивание файла целиком)
+STREAM_AUDIO = os.getenv("STREAM_AUDIO", "true").lower() in ("1", "true", "yes")
+
+# Передавать аудио в Whisper массивом в памяти, без промежуточного WAV
+# (~230 МБ на час записи; при нехватке памяти отключите)
+AUDIO_IN_MEMORY = os.getenv("AUDIO_IN_MEMORY", "true").lower() in ("1", "true", "yes")
+
+# Обновление сообщений с прогрессом: общий лимит правок в секунду на все задачи
+# и минимальный интервал между правками одного сообщения (секунды)
+PROGRESS_EDITS_PER_SECOND = float(os.getenv("PROGRESS_EDITS_PER_SECOND", "5"))
+PROGRESS_MESSAGE_INTERVAL = float(os.getenv("PROGRESS_MESSAGE_INTERVAL", "3"))
+
+# Постоянная очередь задач (SQLite): незавершённые ссылки продолжаются после перезапуска
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "cache/jobs.sqlite3")
+
+# Кэш листингов папок и метаданных ресурсов: время жизни записи (секунды),
+# максимум записей в памяти и файл SQLite (пусто — только в памяти)
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "300"))
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "5000"))
+METADATA_CACHE_PATH = os.getenv("METADATA_CACHE_PATH", "")
+# Через сколько секунд без подтверждения запись удаляется из файла SQLite
+METADATA_CACHE_MAX_AGE = float(os.getenv("METADATA_CACHE_MAX_AGE", "604800"))
+
+# Кэш транскрипций по хэшу содержимого файла (SQLite) и его максимальный размер
+TRANSCRIPT_CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH", "cache/transcripts.sqlite3")
+TRANSCRIPT_CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "200"))
+
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не установлен. Укажите токен бота в .env файле")
 
@@ -35,3 +159,17 @@ if not YANDEX_DISK_TOKEN:
 if not ADMIN_IDS:
     raise ValueError("ADMIN_IDS не установлен. Укажите ID администраторов в .env файле (через запятую)")
 
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE должен быть polling или webhook")
+
+if BOT_ROLE not in ("all", "frontend"):
+    raise ValueError("BOT_ROLE должен быть all или frontend")
+
+if TRANSCRIPTION_BACKEND not in ("whisper", "faster-whisper"):
+    raise ValueError("TRANSCRIPTION_BACKEND должен быть whisper или faster-whisper")
+
+if PIPELINE_ORDER not in ("shortest", "listing"):
+    raise ValueError("PIPELINE_ORDER должен быть shortest или listing")
+
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL не установлен. Укажите публичный https-адрес бота для режима webhook")
@@ -1,6 +1,10 @@
 from aiogram import Router
 from .start import router as start_router
+from .admin import router as admin_router
 from .disk_handler import router as disk_handler_router
+from .disk_handler import on_startup, on_shutdown, run_job_worker, health_status, metrics
+
+__all__ = ["router", "on_startup", "on_shutdown", "run_job_worker", "health_status", "metrics"]
 
 # Создание главного роутера
 router = Router()
@@ -8,5 +12,6 @@ router = Router()
 # Подключение всех роутеров
 # Порядок важен: сначала обработчик ссылок, потом команды
 router.include_router(start_router)  # Команды /start и /help (должны быть первыми!)
+router.include_router(admin_router)  # Команды администратора /queue, /stats, /cancel и кнопка отмены
 router.include_router(disk_handler_router)  # Обрабатывает ссылки на Яндекс.Диск
 
@@ -0,0 +1,168 @@
+from typing import Dict, Optional
+
+from aiogram import Router
+from aiogram.types import CallbackQuery, Message
+from aiogram.filters import Command, CommandObject
+
+from config import ADMIN_IDS
+from handlers.disk_handler import CancelJob, active_job_ids, cancel_job, queue_snapshot, stats_snapshot
+
+router = Router()
+
+_STAGE_NAMES = {
+    0: "⏸ ждёт",
+    1: "📥 скачивание",
+    2: "🎵 конвертация",
+    3: "📝 транскрибация",
+}
+
+# Сколько видео показывать в /queue (длинная очередь не влезет в сообщение)
+_QUEUE_LIMIT = 20
+
+
+def _size(size_bytes: float) -> str:
+    if size_bytes >= 1024 ** 3:
+        return f"{size_bytes / 1024 ** 3:.1f} ГБ"
+    return f"{size_bytes / 1024 ** 2:.1f} МБ"
+
+
+def _duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} ч {seconds % 3600 // 60} мин"
+    if seconds >= 60:
+        return f"{seconds // 60} мин {seconds % 60} с"
+    return f"{seconds} с"
+
+
+def _ratio(hits: int, total: int) -> str:
+    return f"{100 * hits / total:.0f}% ({hits} из {total})" if total else "—"
+
+
+@router.message(Command("queue"))
+async def cmd_queue(message: Message):
+    """
+    Обработчик команды /queue: видео в работе и в очереди с оценкой готовности
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    snapshot = queue_snapshot()
+    videos = snapshot["videos"]
+    lines = [
+        f"📋 Очередь: задач в работе {snapshot['running_jobs']}, ждут запуска {snapshot['queued_jobs']}",
+        f"Видео: в работе {sum(1 for v in videos if v['step'])}, ждут {sum(1 for v in videos if not v['step'])}",
+    ]
+    if not videos:
+        lines.append("\nОчередь пуста.")
+    for video in videos[:_QUEUE_LIMIT]:
+        stage = _STAGE_NAMES.get(video["step"], "")
+        if video["step"]:
+            stage += f" {video['pct']}%"
+        if video["waiting"]:
+            stage += f" (ждёт места: {video['waiting']})"
+        lines.append(
+            f"\n📄 {video['name']} — {_size(video['size'])}\n"
+            f"   задача {video['job_id']}, {stage}, готово через ≈ {_duration(video['eta_s'])}"
+        )
+    if len(videos) > _QUEUE_LIMIT:
+        lines.append(f"\n… и ещё {len(videos) - _QUEUE_LIMIT}")
+    etas = [video["eta_s"] for video in videos if video["eta_s"] is not None]
+    if etas:
+        lines.append(f"\n⏱ Вся очередь: ≈ {_duration(max(etas))}")
+    await message.answer("\n".join(lines), parse_mode=None)
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """
+    Обработчик команды /stats: пропускная способность за час, кэши и временная папка
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    snapshot = stats_snapshot()
+    window: Dict = snapshot["window"]
+    transcripts = snapshot["transcript_cache"]
+    meta = snapshot["metadata_cache"]
+    temp = snapshot["temp"]
+    api = snapshot["api"]
+
+    speed = window["videos_per_hour"]
+    rtf = window["rtf"]
+    means = window["stage_means"]
+    stage_line = ", ".join(
+        f"{label} {_duration(means[stage])}"
+        for stage, label in (("download", "скачивание"), ("ffmpeg", "конвертация"), ("whisper", "транскрибация"))
+        if stage in means
+    )
+    lines = [
+        "📊 За последний час",
+        f"Готово видео: {window['videos']} (из кэша {window['cached']}), ошибок: {window['failed']}",
+        f"Скорость: {f'{speed:.1f} видео/ч' if speed is not None else '—'}",
+        f"Скачано: {_size(window['bytes'])}, аудио: {_duration(window['audio_s'])}",
+        f"Realtime factor транскрибации: {f'{rtf:.2f}' if rtf is not None else '—'}",
+    ]
+    if stage_line:
+        lines.append(f"В среднем на видео: {stage_line}")
+    lines += [
+        "",
+        f"⚙️ Сейчас: задач в работе {snapshot['running_jobs']}, ждут {snapshot['queued_jobs']}, "
+        f"видео в работе {window['active']}, ждут {window['pending']}",
+        f"Временная папка: {_size(temp['on_disk'])} на диске, "
+        f"зарезервировано {_size(temp['reserved'])} из {_size(temp['capacity'])}, "
+        f"свободно на томе {_size(temp['free'])}",
+        "",
+        "🗂 С запуска",
+        f"Кэш транскрипций: {_ratio(transcripts['hits'], transcripts['hits'] + transcripts['misses'])}",
+        f"Кэш листингов: "
+        f"{_ratio(meta['hits'] + meta['revalidated'], meta['hits'] + meta['revalidated'] + meta['misses'])}",
+        f"API Диска: запросов {api['requests']}, повторов {api['retries']}, ответов 429 {api['rate_limited']}",
+        f"Задержка event loop: p99 {snapshot['loop_lag']['p99_ms']:.1f} мс",
+    ]
+    await message.answer("\n".join(lines), parse_mode=None)
+
+
+@router.message(Command("cancel"))
+async def cmd_cancel(message: Message, command: CommandObject):
+    """
+    Обработчик команды /cancel: отменяет все незавершённые задачи пользователя,
+    /cancel <номер> — одну задачу (номер виден в /queue)
+    """
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    if command.args:
+        try:
+            job_ids = [int(command.args.strip())]
+        except ValueError:
+            await message.answer("Использование: /cancel или /cancel <номер задачи>", parse_mode=None)
+            return
+    else:
+        job_ids = active_job_ids(message.from_user.id)
+        if not job_ids:
+            await message.answer("Нет задач в работе.", parse_mode=None)
+            return
+
+    cancelled = [job_id for job_id in job_ids if cancel_job(job_id)]
+    if not cancelled:
+        await message.answer("Задача уже завершена.", parse_mode=None)
+    else:
+        await message.answer(f"⛔ Отменено задач: {len(cancelled)} ({', '.join(map(str, cancelled))})", parse_mode=None)
+
+
+@router.callback_query(CancelJob.filter())
+async def on_cancel_button(callback: CallbackQuery, callback_data: CancelJob):
+    """
+    Кнопка «Отменить» под сообщением с прогрессом
+    """
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer()
+        return
+
+    if cancel_job(callback_data.job_id):
+        await callback.answer("⛔ Задача отменена")
+    else:
+        await callback.answer("Задача уже завершена")
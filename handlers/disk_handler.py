@@ -1,32 +1,439 @@
+import json
 import logging
 import re
-import uuid
 import asyncio
+import threading
 import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Set
 from concurrent.futures import ThreadPoolExecutor
 
-_executor = ThreadPoolExecutor(max_workers=2)
-
-from aiogram import Router
-from aiogram.types import Message, FSInputFile
+from aiogram import Bot, Router
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import Message, FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup
 
 from services.yandex_disk import YandexDisk
 from services.video_converter import VideoConverter
-from services.transcription import TranscriptionService
-from config import YANDEX_DISK_TOKEN, ADMIN_IDS
+from services.transcription import SAMPLE_RATE
+from services.transcription_pool import TranscriptionPool
+from services.pipeline import Pipeline, Stage, StageFailed
+from services.transcript_cache import TranscriptCache
+from services.progress import ProgressUpdater
+from services.job_store import JobStore, TASK_STATES, FINAL_STATES
+from services.loop_monitor import LoopLagMonitor
+from services.metadata_cache import MetadataCache
+from services.scheduler import FairScheduler, PRIORITY_HIGH, PRIORITY_NORMAL
+from services.temp_space import TempSpace
+from services.metrics import MetricsRegistry, Trace
+from services.ordering import shortest_first
+from services.telemetry import Telemetry
+from config import (
+    YANDEX_DISK_TOKEN,
+    ADMIN_IDS,
+    YANDEX_HTTP_POOL_LIMIT,
+    YANDEX_HTTP_LIMIT_PER_HOST,
+    YANDEX_HTTP_KEEPALIVE,
+    YANDEX_HTTP_DNS_TTL,
+    YANDEX_LISTING_CONCURRENCY,
+    YANDEX_API_RATE,
+    YANDEX_API_BURST,
+    YANDEX_API_RETRIES,
+    YANDEX_DOWNLOAD_SEGMENTS,
+    YANDEX_DOWNLOAD_RETRIES,
+    YANDEX_DOWNLOAD_CHUNK_KB,
+    YANDEX_DOWNLOAD_WRITE_KB,
+    YANDEX_DOWNLOAD_BUFFER_MB,
+    PIPELINE_DOWNLOAD_WORKERS,
+    PIPELINE_CONVERT_WORKERS,
+    PIPELINE_TRANSCRIBE_WORKERS,
+    PIPELINE_MAX_IN_FLIGHT,
+    PIPELINE_ORDER,
+    PIPELINE_ORDER_LOOKAHEAD,
+    PIPELINE_ORDER_WAIT,
+    PIPELINE_ORDER_PROBE,
+    PIPELINE_ORDER_PROBE_WORKERS,
+    PRIORITY_SMALL_JOB_VIDEOS,
+    TEMP_MAX_MB,
+    TEMP_MIN_FREE_MB,
+    STREAM_AUDIO,
+    AUDIO_IN_MEMORY,
+    TRANSCRIPT_CACHE_PATH,
+    TRANSCRIPT_CACHE_MAX_MB,
+    WHISPER_MODEL,
+    TRANSCRIBE_THREADS,
+    TRANSCRIPTION_BACKEND,
+    VAD_ENABLED,
+    TRANSCRIBE_CHUNK_SECONDS,
+    TRANSCRIBE_CHUNK_OVERLAP,
+    PROGRESS_EDITS_PER_SECOND,
+    PROGRESS_MESSAGE_INTERVAL,
+    JOB_STORE_PATH,
+    SHUTDOWN_DRAIN_TIMEOUT,
+    BOT_ROLE,
+    WORKER_LEASE_SECONDS,
+    WORKER_POLL_INTERVAL,
+    METADATA_CACHE_TTL,
+    METADATA_CACHE_MAX_ENTRIES,
+    METADATA_CACHE_PATH,
+    METADATA_CACHE_MAX_AGE,
+)
 
 logger = logging.getLogger(__name__)
+# Одна JSON-строка на завершённую задачу — для разбора логов
+job_logger = logging.getLogger(f"{__name__}.jobs")
 router = Router()
 
 # Инициализация сервисов (один раз при старте)
-_disk = YandexDisk(YANDEX_DISK_TOKEN)
+# Кэш листингов: повторная ссылка на ту же папку не обходит дерево заново
+_metadata_cache = MetadataCache(
+    ttl=METADATA_CACHE_TTL,
+    max_entries=METADATA_CACHE_MAX_ENTRIES,
+    db_path=METADATA_CACHE_PATH or None,
+    max_age=METADATA_CACHE_MAX_AGE,
+)
+_disk = YandexDisk(
+    YANDEX_DISK_TOKEN,
+    pool_limit=YANDEX_HTTP_POOL_LIMIT,
+    limit_per_host=YANDEX_HTTP_LIMIT_PER_HOST,
+    keepalive_timeout=YANDEX_HTTP_KEEPALIVE,
+    dns_cache_ttl=YANDEX_HTTP_DNS_TTL,
+    listing_concurrency=YANDEX_LISTING_CONCURRENCY,
+    download_segments=YANDEX_DOWNLOAD_SEGMENTS,
+    download_retries=YANDEX_DOWNLOAD_RETRIES,
+    download_chunk_size=YANDEX_DOWNLOAD_CHUNK_KB * 1024,
+    download_write_size=YANDEX_DOWNLOAD_WRITE_KB * 1024,
+    download_buffer_size=YANDEX_DOWNLOAD_BUFFER_MB * 1024 * 1024,
+    api_rate=YANDEX_API_RATE,
+    api_burst=YANDEX_API_BURST,
+    api_max_retries=YANDEX_API_RETRIES,
+    metadata_cache=_metadata_cache,
+)
 _converter = VideoConverter(temp_dir="temp")
-_transcription = TranscriptionService(model_size="small")
+# Пул процессов Whisper: по прогретой модели в каждом процессе
+_transcription = TranscriptionPool(
+    model_size=WHISPER_MODEL,
+    workers=PIPELINE_TRANSCRIBE_WORKERS,
+    threads_per_worker=TRANSCRIBE_THREADS,
+    backend=TRANSCRIPTION_BACKEND,
+    vad=VAD_ENABLED,
+    chunk_s=TRANSCRIBE_CHUNK_SECONDS,
+    overlap_s=TRANSCRIBE_CHUNK_OVERLAP,
+)
+_cache = TranscriptCache(TRANSCRIPT_CACHE_PATH, max_bytes=TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)
+
+# Общий обновлятель сообщений с прогрессом (лимит правок на все задачи)
+_progress_updater = ProgressUpdater(
+    edits_per_second=PROGRESS_EDITS_PER_SECOND,
+    min_interval=PROGRESS_MESSAGE_INTERVAL,
+)
+
+# Общие лимиты на всех пользователей: места выдаются пользователям по кругу
+_scheduler = FairScheduler({
+    "download": PIPELINE_DOWNLOAD_WORKERS,
+    "convert": PIPELINE_CONVERT_WORKERS,
+    "transcribe": PIPELINE_TRANSCRIBE_WORKERS,
+})
+
+# Замер задержки event loop (всё, что блокирует loop, тормозит весь бот)
+_loop_monitor = LoopLagMonitor()
+
+# Видео в работе и итоги за последний час — для команд /queue и /stats
+_telemetry = Telemetry()
+
+# Постоянная очередь задач: ссылки и состояние каждого видео переживают перезапуск
+_jobs = JobStore(JOB_STORE_PATH)
+# Новые задачи для фонового цикла run_job_worker: (id задачи, возобновлена ли)
+_job_queue: asyncio.Queue = asyncio.Queue()
+# Выполняемые задачи по id — для отмены (/cancel и кнопка под прогрессом)
+_running_jobs: Dict[int, asyncio.Task] = {}
+# Задачи, отменённые пользователем (отличает отмену от остановки бота)
+_cancelled_jobs: Set[int] = set()
+# Видео в работе по id задачи: при отмене их ffmpeg убивается, а temp/ освобождается
+_active_videos: Dict[int, Set["_VideoJob"]] = {}
+# Выставляется в on_startup: задачи не начинаются до прогрева моделей
+_services_ready = asyncio.Event()
+# Выставляется в on_shutdown: новые задачи не начинаются, начатые дорабатывают
+_draining = asyncio.Event()
+
+# Язык транскрибации (входит в ключ кэша)
+LANGUAGE = "ru"
+
+# Отдельный пул потоков для ffmpeg (транскрибация — в своём пуле процессов)
+_convert_executor = ThreadPoolExecutor(max_workers=PIPELINE_CONVERT_WORKERS)
+# ffprobe (порядок обработки, место под WAV) — отдельно, чтобы не ждать за конвертациями;
+# без PIPELINE_ORDER_PROBE — пул потоков event loop по умолчанию
+_probe_executor = ThreadPoolExecutor(max_workers=PIPELINE_ORDER_PROBE_WORKERS) if PIPELINE_ORDER_PROBE else None
+
+# Оценка длительности по размеру, пока нет замеров ffprobe (~2 Мбит/с)
+_DEFAULT_BYTES_PER_SECOND = 250_000
+# Байты и секунды видео, проверенных ffprobe: средний битрейт для остальных
+_probed = {"bytes": 0, "seconds": 0.0}
+# WAV, который пишет ffmpeg без AUDIO_IN_MEMORY: 16 kHz, моно, 16 бит — 32 КБ на секунду
+_WAV_BYTES_PER_SECOND = SAMPLE_RATE * 2
 
 TEMP_DIR = Path("temp")
 
+# Квота временной папки: ресурс "temp" в _scheduler, байты скачанных видео
+_temp = TempSpace(
+    TEMP_DIR,
+    TEMP_MAX_MB * 1024 * 1024,
+    _scheduler,
+    min_free_bytes=TEMP_MIN_FREE_MB * 1024 * 1024,
+)
+
+
+# ── Метрики ──────────────────────────────────────────────────────────────────
+
+metrics = MetricsRegistry(prefix="disk_bot_")
+
+_stage_seconds = metrics.histogram(
+    "stage_seconds", "Длительность этапов обработки видео (list, link, download, ffmpeg, whisper, send)", ("stage",)
+)
+_download_bytes = metrics.counter("download_bytes_total", "Скачано байт видео")
+_download_speed = metrics.histogram(
+    "download_speed_bytes_per_second",
+    "Скорость скачивания одного видео",
+    buckets=(256e3, 1e6, 4e6, 16e6, 64e6, 256e6),
+)
+_audio_seconds = metrics.counter("audio_seconds_total", "Длительность распознанного аудио, секунды")
+_transcribe_rtf = metrics.histogram(
+    "transcribe_realtime_factor",
+    "Время транскрибации / длительность аудио",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4),
+)
+_videos_total = metrics.counter("videos_total", "Обработанные видео по результату", ("result",))
+_errors_total = metrics.counter("errors_total", "Ошибки по этапу и типу исключения", ("stage", "type"))
+_jobs_total = metrics.counter("jobs_total", "Завершённые задачи (ссылки) по статусу", ("status",))
+_job_seconds = metrics.histogram("job_seconds", "Время выполнения задачи (ссылки) целиком")
+
+metrics.gauge("jobs_queued", "Задачи, ждущие запуска", getter=lambda: {(): _job_queue.qsize()})
+metrics.gauge("jobs_running", "Выполняемые задачи", getter=lambda: {(): len(_running_jobs)})
+# Загрузка общих ресурсов: слоты скачивания, потоки ffmpeg, процессы Whisper, байты temp/
+metrics.gauge(
+    "resource_in_use", "Занято мест в общем ресурсе", ("resource",),
+    getter=lambda: {(name,): s["in_use"] for name, s in _scheduler.stats().items()},
+)
+metrics.gauge(
+    "resource_capacity", "Ёмкость общего ресурса", ("resource",),
+    getter=lambda: {(name,): s["capacity"] for name, s in _scheduler.stats().items()},
+)
+metrics.gauge(
+    "resource_waiting", "Заявки, ждущие места в общем ресурсе", ("resource",),
+    getter=lambda: {(name,): s["waiting"] for name, s in _scheduler.stats().items()},
+)
+metrics.gauge("temp_bytes", "Занято во временной папке", getter=lambda: {(): _temp.on_disk()})
+
+
+def _cache_lookups() -> Dict[tuple, float]:
+    meta = _metadata_cache.stats()
+    transcripts = _cache.stats()
+    return {
+        ("metadata", "hit"): meta["hits"],
+        ("metadata", "revalidated"): meta["revalidated"],
+        ("metadata", "miss"): meta["misses"],
+        ("transcript", "hit"): transcripts["hits"],
+        ("transcript", "miss"): transcripts["misses"],
+    }
+
+
+metrics.counter("cache_lookups_total", "Обращения к кэшам по результату", ("cache", "result"), getter=_cache_lookups)
+metrics.counter(
+    "api_requests_total", "Запросы к REST API Яндекс.Диска (повторы и ответы 429 — отдельно)", ("kind",),
+    getter=lambda: {(kind,): _disk.api_stats()[kind] for kind in ("requests", "retries", "rate_limited")},
+)
+metrics.counter(
+    "api_throttled_seconds_total", "Ожидание лимита запросов к API, секунды",
+    getter=lambda: {(): _disk.api_stats()["throttled_seconds"]},
+)
+metrics.counter(
+    "http_connections_total", "Соединения пула: новые и переиспользованные", ("state",),
+    getter=lambda: {(state,): count for state, count in _disk.connection_stats().items()},
+)
+metrics.gauge(
+    "loop_lag_p99_seconds", "99-й перцентиль задержки event loop",
+    getter=lambda: {(): _loop_monitor.stats()["p99_ms"] / 1000},
+)
+
+
+def _record_error(stage: Optional[str], error: BaseException) -> None:
+    _errors_total.inc(stage=stage or "unknown", type=type(error).__name__)
+
+
+def _log_job(job: Dict, status: str, trace: Trace, duration: float) -> None:
+    """Итог задачи: метрики и одна JSON-строка в журнал."""
+    _jobs_total.inc(status=status)
+    _job_seconds.observe(duration)
+    counts = _jobs.counts(job["id"])
+    record = {
+        "event": "job",
+        "job_id": job["id"],
+        "user_id": job["user_id"],
+        "status": status,
+        "duration_s": round(duration, 3),
+        "videos": sum(counts.values()),
+        "sent": counts.get("sent", 0),
+        "failed": counts.get("failed", 0),
+        "cached": int(trace.attrs.get("cached", 0)),
+        "stages_s": {stage: round(seconds, 3) for stage, seconds in trace.stages.items()},
+        "download_bytes": int(trace.attrs.get("download_bytes", 0)),
+        "audio_s": round(trace.attrs.get("audio_seconds", 0.0), 1),
+    }
+    job_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+# ── Жизненный цикл ───────────────────────────────────────────────────────────
+
+async def _start_services(transcription: bool) -> None:
+    _loop_monitor.start()
+    await _disk.start()
+    if transcription:
+        await _transcription.start()
+    _services_ready.set()
+
+
+async def on_startup():
+    """Открывает HTTP-сессию Яндекс.Диска и прогревает процессы Whisper при старте бота."""
+    # Во фронтенде модель не загружается: видео обрабатывают процессы worker.py
+    await _start_services(transcription=BOT_ROLE != "frontend")
+
+
+async def on_shutdown():
+    """Даёт начатым задачам завершиться и освобождает общие ресурсы при остановке бота."""
+    _draining.set()
+    if _running_jobs and SHUTDOWN_DRAIN_TIMEOUT > 0:
+        logger.info(f"Жду завершения задач: {len(_running_jobs)} (не дольше {SHUTDOWN_DRAIN_TIMEOUT:.0f} с)")
+        await asyncio.wait(set(_running_jobs.values()), timeout=SHUTDOWN_DRAIN_TIMEOUT)
+
+    stats = _disk.connection_stats()
+    logger.info(f"Соединения с Яндекс.Диском: новых {stats['created']}, переиспользовано {stats['reused']}")
+    api = _disk.api_stats()
+    logger.info(
+        f"API Яндекс.Диска: запросов {api['requests']}, повторов {api['retries']}, "
+        f"ответов 429 {api['rate_limited']}, ожидание лимита {api['throttled_seconds']:.1f} с"
+    )
+    meta = _metadata_cache.stats()
+    logger.info(
+        f"Кэш листингов: попаданий {meta['hits']}, подтверждено по метке {meta['revalidated']}, "
+        f"загружено {meta['misses']} (с диска {meta['disk_hits']}), записей {meta['entries']}"
+    )
+    temp = _temp.usage()
+    logger.info(
+        f"Временная папка: занято {_format_size(temp['on_disk'])}, "
+        f"зарезервировано {_format_size(temp['reserved'])} из {_format_size(temp['capacity'])}"
+    )
+    lag = _loop_monitor.stats()
+    logger.info(
+        f"Задержка event loop: средняя {lag['avg_ms']:.1f} мс, p99 {lag['p99_ms']:.1f} мс, "
+        f"максимум {lag['max_ms']:.1f} мс"
+    )
+    if VAD_ENABLED:
+        vad = _transcription.vad_stats()
+        logger.info(
+            f"VAD: пропущено {vad['skipped_seconds']:.0f} из {vad['audio_seconds']:.0f} с аудио "
+            f"({100 * vad['skipped_ratio']:.0f}%)"
+        )
+    # Прерываем задачи до закрытия ресурсов — их состояние уже в _jobs,
+    # после перезапуска они продолжатся с последнего пройденного этапа
+    tasks = list(_running_jobs.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _stop_converts()
+
+    await _progress_updater.stop()
+    await _loop_monitor.stop()
+    await _disk.close()
+    _transcription.shutdown()
+    _cache.close()
+    _metadata_cache.close()
+    _jobs.close()
+
+
+def _stop_converts() -> None:
+    """
+    Убивает ffmpeg видео, прерванных остановкой.
+
+    Поток конвертации не останавливается вместе с задачей asyncio, и выход
+    из процесса ждал бы его до конца. Флаг ставится после отмены задач:
+    прерванная конвертация уже не становится ошибкой видео, и после
+    перезапуска оно продолжится с последнего пройденного этапа.
+    """
+    for videos in list(_active_videos.values()):
+        for video_job in videos:
+            video_job.cancel_event.set()
+    # Конвертации, ещё ждущие потока, не запускаются
+    _convert_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def health_status() -> Dict:
+    """Состояние для health-проверки: готовность, число задач и задержка event loop."""
+    if _draining.is_set():
+        status = "draining"
+    elif _services_ready.is_set():
+        status = "ok"
+    else:
+        status = "starting"
+    return {
+        "status": status,
+        "running_jobs": len(_running_jobs),
+        "queued_jobs": _job_queue.qsize(),
+        "loop_lag_p99_ms": round(_loop_monitor.stats()["p99_ms"], 1),
+    }
+
+
+def queue_snapshot() -> Dict:
+    """Видео в работе и ожидающие с оценкой готовности (для /queue)."""
+    capacities = {
+        "download": PIPELINE_DOWNLOAD_WORKERS,
+        "ffmpeg": PIPELINE_CONVERT_WORKERS,
+        "whisper": PIPELINE_TRANSCRIBE_WORKERS,
+    }
+    return {
+        "videos": _telemetry.queue(capacities),
+        "running_jobs": len(_running_jobs),
+        "queued_jobs": _job_queue.qsize(),
+    }
+
+
+def stats_snapshot() -> Dict:
+    """Итоги за последний час, кэши и временная папка (для /stats)."""
+    return {
+        "window": _telemetry.summary(),
+        "transcript_cache": _cache.stats(),
+        "metadata_cache": _metadata_cache.stats(),
+        "temp": _temp.usage(),
+        "api": _disk.api_stats(),
+        "loop_lag": _loop_monitor.stats(),
+        "running_jobs": len(_running_jobs),
+        "queued_jobs": _job_queue.qsize(),
+    }
+
+
+def active_job_ids(user_id: int) -> List[int]:
+    """Незавершённые задачи пользователя — выполняемые и ждущие запуска."""
+    return [job["id"] for job in _jobs.unfinished_jobs() if job["user_id"] == user_id]
+
+
+def cancel_job(job_id: int) -> bool:
+    """
+    Отменяет задачу: её ffmpeg убивается, скачивания обрываются, оставшиеся
+    видео не обрабатываются, а после перезапуска задача не продолжается.
+
+    Returns:
+        False, если задача уже завершена (или такой нет).
+    """
+    if not _jobs.cancel_job(job_id):
+        return False
+    logger.info(f"Задача {job_id} отменена")
+    _cancelled_jobs.add(job_id)
+    for video_job in list(_active_videos.get(job_id, ())):
+        video_job.cancel()
+    task = _running_jobs.get(job_id)
+    if task is not None:
+        task.cancel()
+    return True
+
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
@@ -55,11 +462,6 @@ def _bar(pct: int, width: int = 12) -> str:
     return '█' * filled + '░' * (width - filled)
 
 
-def _progress_text(video_name: str, stage: str, pct: int, file_idx: int, total: int) -> str:
-    file_line = f"Файл {file_idx}/{total}\n" if total > 1 else ""
-    return f"⏳ {file_line}[{_bar(pct)}] {pct}%\n\n📄 {video_name}\n➤ {stage}"
-
-
 def _format_size(size_bytes: int) -> str:
     if size_bytes >= 1024 * 1024:
         return f"{size_bytes / (1024 * 1024):.1f} МБ"
@@ -80,21 +482,37 @@ def _file_list_text(videos: List[Dict]) -> str:
     return text
 
 
-def _step_range(file_idx: int, total_files: int, step: int):
-    """Возвращает (start_pct, end_pct) для шага внутри файла.
-    step: 1=скачать (0→33%), 2=конвертировать (33→66%), 3=транскрибировать (66→100%)
-    Для N файлов диапазон каждого файла масштабируется пропорционально.
+class CancelJob(CallbackData, prefix="cancel"):
+    """Кнопка «Отменить» под сообщением с прогрессом задачи."""
+
+    job_id: int
+
+
+def _cancel_keyboard(job_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="⛔ Отменить", callback_data=CancelJob(job_id=job_id).pack())
+    ]])
+
+
+class _MessageRef:
     """
-    f_start = (file_idx - 1) * 100 // total_files
-    f_end = file_idx * 100 // total_files
-    span = f_end - f_start
-    third = span // 3
-    if step == 1:
-        return f_start, f_start + third
-    elif step == 2:
-        return f_start + third, f_start + 2 * third
-    else:
-        return f_start + 2 * third, f_end
+    Сообщение бота по chat_id и message_id.
+
+    Задача может продолжаться после перезапуска, когда исходного объекта
+    Message уже нет, поэтому сообщения хранятся и правятся по id.
+    reply_markup сохраняется при каждой правке (без него Telegram убирает кнопки).
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.reply_markup = reply_markup
+
+    async def edit_text(self, text: str):
+        return await self.bot.edit_message_text(
+            text, chat_id=self.chat_id, message_id=self.message_id, reply_markup=self.reply_markup
+        )
 
 
 async def _try_edit(msg, text: str):
@@ -105,18 +523,213 @@ async def _try_edit(msg, text: str):
         pass
 
 
-async def _simulate_progress(msg, video_name, stage, start, end, stop_evt, file_idx, total):
-    """Плавно ползёт от start до end-5 пока stop_evt не выставлен."""
-    cur = start
-    while not stop_evt.is_set() and cur < end - 5:
-        await asyncio.sleep(1.5)
-        if stop_evt.is_set():
-            break
-        cur = min(cur + 5, end - 5)
-        await _try_edit(msg, _progress_text(video_name, stage, cur, file_idx, total))
+# ── Прогресс обработки ────────────────────────────────────────────────────────
+
+_STAGE_LABELS = {
+    1: "📥 Скачиваю…",
+    2: "🎵 Конвертирую в аудио…",
+    3: "📝 Транскрибирую…",
+}
+
+
+class _JobProgress:
+    """
+    Состояние обработки всех видео по одной ссылке.
+
+    Этапы конвейера только обновляют состояние (дёшево), а правки сообщения
+    выполняет общий _progress_updater с лимитом правок на все задачи.
+    """
+
+    def __init__(self, msg, user_id: int, job_id: int, priority: int = PRIORITY_NORMAL):
+        self.msg = msg
+        self.user_id = user_id
+        self.job_id = job_id
+        # Приоритет заявок видео задачи в _scheduler (повышается для небольших задач)
+        self.priority = priority
+        self.discovered = 0
+        self.listing_done = False
+        self.done = 0
+        # index -> (имя файла, шаг 1..3, процент внутри шага)
+        self.active: Dict[int, tuple] = {}
+        # index -> ресурс _scheduler, места в котором ждёт видео
+        self.waiting: Dict[int, str] = {}
+        _scheduler.add_listener(self._on_queue_changed)
+
+    def _changed(self) -> None:
+        _progress_updater.update(self.msg, self.render)
+
+    def _on_queue_changed(self) -> None:
+        # Позиция в общей очереди могла сдвинуться из-за чужих задач
+        if self.waiting:
+            self._changed()
+
+    def update(self, index: int, name: str, step: int, pct: int) -> None:
+        self.active[index] = (name, step, max(0, min(100, pct)))
+        _telemetry.update((self.job_id, index), step, pct)
+        self._changed()
+
+    def set_waiting(self, index: int, resource: Optional[str]) -> None:
+        if resource is None:
+            self.waiting.pop(index, None)
+        else:
+            self.waiting[index] = resource
+        _telemetry.set_waiting((self.job_id, index), resource)
+        self._changed()
+
+    def add_discovered(self) -> None:
+        self.discovered += 1
+        self._changed()
+
+    def set_listing_done(self) -> None:
+        self.listing_done = True
+        self._changed()
+
+    def finish(self, index: int) -> None:
+        self.active.pop(index, None)
+        self.waiting.pop(index, None)
+        self.done += 1
+        self._changed()
+
+    def close(self) -> None:
+        """Снимает сообщение с автообновления перед финальной правкой."""
+        _scheduler.remove_listener(self._on_queue_changed)
+        _progress_updater.discard(self.msg)
+        _telemetry.drop_job(self.job_id)
+
+    def render(self) -> str:
+        total = max(self.discovered, 1)
+        in_progress = sum((step - 1) * 100 + pct for _, step, pct in self.active.values()) / 3
+        pct = int((self.done * 100 + in_progress) / total)
+        search = "" if self.listing_done else " (поиск продолжается…)"
+        lines = [f"⏳ Готово {self.done}/{self.discovered}{search}", f"[{_bar(pct)}] {pct}%"]
+        for index in sorted(self.active):
+            name, step, step_pct = self.active[index]
+            position = _scheduler.position(self.waiting[index], self.user_id) if index in self.waiting else 0
+            if position:
+                lines.append(f"\n📄 {name}\n➤ 🕒 В очереди: {position}-й")
+            else:
+                lines.append(f"\n📄 {name}\n➤ {_STAGE_LABELS[step]} {step_pct}%")
+        return "\n".join(lines)
+
+
+# ── Этапы конвейера ───────────────────────────────────────────────────────────
+
+class _VideoJob:
+    """
+    Один видеофайл, проходящий через конвейер, и его временные файлы.
+
+    Имена файлов привязаны к подзадаче в _jobs, поэтому после перезапуска
+    результаты уже пройденных этапов находятся на диске и не пересчитываются.
+    """
 
+    def __init__(self, task: Dict, progress: _JobProgress):
+        self.task_id = task["id"]
+        self.job_id = task["job_id"]
+        self.index = task["idx"]
+        self.video = task["video"]
+        self.state = task["state"]
+        self.progress = progress
+        self.user_id = progress.user_id
+        self.name = self.video.get("name", "video")
+        # Место, занятое скачанным видео и WAV-файлом в общем лимите temp/ (байты)
+        self.temp_reserved = 0
+        self.audio_reserved = 0
+
+        base = TEMP_DIR / f"job{task['job_id']}_{self.index}"
+        self.video_path = Path(task["video_path"] or f"{base}{Path(self.name).suffix or '.mp4'}")
+        # Видео уже скачано целиком (после перезапуска)
+        self.video_ready = self._artifact_ready("downloaded", task["video_path"])
+        self.audio_path: Optional[str] = task["audio_path"] if self._artifact_ready("converted", task["audio_path"]) else None
+        # Декодированное аудио в памяти (float32, 16 kHz) — вместо WAV-файла
+        self.audio_samples = None
+        # Прямая ссылка для потоковой конвертации (без сохранения видео)
+        self.stream_url: Optional[str] = None
+        self.stream_audio_path = Path(f"{base}.wav")
+        self.text_path = Path(task["text_path"] or f"{base}.txt")
+        self.transcript: Optional[str] = None
+        if self._artifact_ready("transcribed", task["text_path"]):
+            self.transcript = self.text_path.read_text(encoding="utf-8")
+        elif self.state == "transcribed" and task.get("transcript") is not None:
+            # Текст сохранён в базе (из кэша или от воркера)
+            self.transcript = task["transcript"]
+        # Результат взят из кэша — видео минует этапы конвейера
+        self.from_cache = False
+        # Длительность этапов этого видео (идут и в метрики)
+        self.trace = Trace(_stage_seconds)
+        # Отмена задачи: флаг читает поток ffmpeg, а текущий этап идёт отдельной задачей asyncio
+        self.cancel_event = threading.Event()
+        self.stage_task: Optional[asyncio.Task] = None
+        _active_videos.setdefault(self.job_id, set()).add(self)
+
+    @property
+    def priority(self) -> int:
+        return self.progress.priority
+
+    def _artifact_ready(self, state: str, path: Optional[str]) -> bool:
+        """Этап state уже пройден и его файл на месте."""
+        if self.state not in TASK_STATES or not path:
+            return False
+        return TASK_STATES.index(self.state) >= TASK_STATES.index(state) and Path(path).exists()
+
+    def advance(self, state: str, **artifacts) -> None:
+        """Сохраняет новое состояние видео в очереди задач."""
+        self.state = state
+        _jobs.update_task(self.task_id, state, **artifacts)
+
+    def release_temp(self) -> None:
+        """Возвращает место скачанного видео в общий лимит temp/."""
+        if self.temp_reserved:
+            _scheduler.release("temp", self.temp_reserved)
+            self.temp_reserved = 0
+
+    def release_audio(self) -> None:
+        """Возвращает место под WAV в общий лимит temp/."""
+        if self.audio_reserved:
+            _scheduler.release("temp", self.audio_reserved)
+            self.audio_reserved = 0
+
+    def cancel(self) -> None:
+        """Прерывает обработку: ffmpeg убивается, текущий этап отменяется."""
+        self.cancel_event.set()
+        if self.stage_task is not None:
+            self.stage_task.cancel()
+
+    def cleanup(self) -> None:
+        """Гарантированная очистка temp-файлов."""
+        videos = _active_videos.get(self.job_id)
+        if videos is not None:
+            videos.discard(self)
+            if not videos:
+                del _active_videos[self.job_id]
+        self.release_temp()
+        self.release_audio()
+        for f in (str(self.video_path), self.audio_path, str(self.stream_audio_path), str(self.text_path)):
+            if f:
+                try:
+                    p = Path(f)
+                    if p.exists():
+                        p.unlink()
+                except Exception:
+                    pass
+
+
+async def _acquire(job: _VideoJob, resource: str, amount: int = 1) -> int:
+    """Ждёт место в общем ресурсе _scheduler; пока видео ждёт, в прогрессе видна позиция."""
+    job.progress.set_waiting(job.index, resource)
+    try:
+        return await _scheduler.acquire(resource, job.user_id, amount, job.priority)
+    finally:
+        job.progress.set_waiting(job.index, None)
+
+
+@asynccontextmanager
+async def _slot(job: _VideoJob, resource: str, amount: int = 1):
+    amount = await _acquire(job, resource, amount)
+    try:
+        yield
+    finally:
+        _scheduler.release(resource, amount)
 
-# ── Загрузка одного файла ─────────────────────────────────────────────────────
 
 async def _download_video(video: Dict, save_path: Path, on_progress=None) -> bool:
     """Скачивает видео — приватное или публичное."""
@@ -129,6 +742,261 @@ async def _download_video(video: Dict, save_path: Path, on_progress=None) -> boo
         return await _disk.download_file(video.get("path", ""), str(save_path), on_progress=on_progress)
 
 
+async def _get_video_link(video: Dict) -> Optional[str]:
+    """Возвращает прямую ссылку на видео — приватное или публичное."""
+    if "public_key" in video:
+        return await _disk.get_public_download_link(video["public_key"], video.get("inner_path"))
+    else:
+        return await _disk.get_download_link(video.get("path", ""))
+
+
+async def _estimate_duration(video: Dict) -> float:
+    """
+    Оценка длительности видео в секундах — стоимость для порядка обработки.
+
+    По умолчанию считается по размеру из листинга. С PIPELINE_ORDER_PROBE
+    длительность читает ffprobe из заголовков по прямой ссылке, а видео,
+    которое проверить не удалось, оценивается по среднему битрейту проверенных.
+    """
+    size = int(video.get("size") or 0)
+    if PIPELINE_ORDER_PROBE:
+        link = await _get_video_link(video)
+        if link:
+            loop = asyncio.get_running_loop()
+            duration = await loop.run_in_executor(_probe_executor, _converter.probe_duration, link)
+            if duration:
+                _probed["bytes"] += size
+                _probed["seconds"] += duration
+                return duration
+    return _duration_from_size(size)
+
+
+def _wav_bytes(duration: float) -> int:
+    """Размер WAV, который пишет ffmpeg: 44 байта заголовка и 32 КБ на секунду."""
+    return int(duration * _WAV_BYTES_PER_SECOND) + 44
+
+
+def _duration_from_size(size: int) -> float:
+    """Длительность по размеру файла и среднему битрейту видео, проверенных ffprobe."""
+    rate = _probed["bytes"] / _probed["seconds"] if _probed["seconds"] else _DEFAULT_BYTES_PER_SECOND
+    return size / max(rate, 1.0)
+
+
+async def _fetch_video_file(job: _VideoJob) -> None:
+    """Скачивает видео целиком в temp/."""
+    job.progress.update(job.index, job.name, 1, 0)
+
+    async def on_download(downloaded: int, total_bytes: int):
+        job.progress.update(job.index, job.name, 1, 100 * downloaded // total_bytes)
+
+    # Место в temp/ занимается до слота скачивания и освобождается после конвертации.
+    # Без AUDIO_IN_MEMORY вместе с видео сразу занимается место под WAV: видео,
+    # держащее место, не должно ждать ещё — иначе его заявка встанет в очередь
+    # за скачиваниями, которые ждут, пока оно освободит место
+    if not job.temp_reserved:
+        size = int(job.video.get("size") or 0)
+        wav = 0 if AUDIO_IN_MEMORY else _wav_bytes(_duration_from_size(size))
+        # Место под WAV после неудачной потоковой конвертации занимается заново, вместе с видео
+        job.release_audio()
+        amount = await _acquire(job, "temp", size + wav)
+        job.audio_reserved = min(wav, amount)
+        job.temp_reserved = amount - job.audio_reserved
+
+    async with _slot(job, "download"):
+        started = time.perf_counter()
+        with job.trace.span("download"):
+            ok = await _download_video(job.video, job.video_path, on_progress=on_download)
+    if not ok:
+        raise StageFailed(f"❌ Не удалось скачать: {job.name}")
+    size = job.video_path.stat().st_size
+    _download_bytes.inc(size)
+    _download_speed.observe(size / max(time.perf_counter() - started, 1e-6))
+    job.trace.add("download_bytes", size)
+    job.video_ready = True
+    job.advance("downloaded", video_path=str(job.video_path))
+
+
+async def _stage_download(job: _VideoJob) -> _VideoJob:
+    # Возобновлённое видео: этап уже пройден до перезапуска
+    if job.transcript is not None or job.audio_path or job.video_ready:
+        return job
+
+    if STREAM_AUDIO:
+        # Потоковый режим: видео не скачивается, ffmpeg читает его по ссылке
+        job.progress.update(job.index, job.name, 1, 0)
+        with job.trace.span("link"):
+            job.stream_url = await _get_video_link(job.video)
+        if job.stream_url:
+            return job
+        logger.info(f"Нет ссылки для потоковой конвертации {job.name} — скачиваю файл")
+
+    await _fetch_video_file(job)
+    return job
+
+
+async def _reserve_wav(job: _VideoJob, source: str) -> None:
+    """
+    Занимает место под WAV в общем лимите temp/ до запуска ffmpeg.
+
+    Нужно, когда видео не скачивалось в этом запуске (потоковая конвертация,
+    видео скачано до перезапуска): иначе место под WAV уже занято вместе
+    с видео. Длительность читает ffprobe (только заголовки файла или ссылки),
+    а если не удалось — она оценивается по размеру видео.
+    """
+    if job.audio_reserved or job.temp_reserved:
+        return
+    loop = asyncio.get_running_loop()
+    duration = await loop.run_in_executor(_probe_executor, _converter.probe_duration, source)
+    if not duration:
+        duration = _duration_from_size(int(job.video.get("size") or 0))
+    job.audio_reserved = await _acquire(job, "temp", _wav_bytes(duration))
+
+
+async def _extract_audio(job: _VideoJob, source: str) -> bool:
+    """Извлекает аудио из файла или ссылки: в память (массив) или в WAV."""
+    loop = asyncio.get_running_loop()
+
+    def on_progress(done_s: float, total_s: float):
+        # Вызывается из потока чтения ffmpeg — передаём в event loop
+        if loop.is_closed():
+            return
+        loop.call_soon_threadsafe(job.progress.update, job.index, job.name, 2, int(100 * done_s / total_s))
+
+    if not AUDIO_IN_MEMORY:
+        await _reserve_wav(job, source)
+    async with _slot(job, "convert"):
+        with job.trace.span("ffmpeg"):
+            if AUDIO_IN_MEMORY:
+                job.audio_samples = await loop.run_in_executor(
+                    _convert_executor, _converter.audio_array, source, on_progress, job.cancel_event
+                )
+                return job.audio_samples is not None
+
+            if source == job.stream_url:
+                job.audio_path = await loop.run_in_executor(
+                    _convert_executor,
+                    _converter.url_to_audio,
+                    source,
+                    str(job.stream_audio_path),
+                    on_progress,
+                    job.cancel_event,
+                )
+            else:
+                job.audio_path = await loop.run_in_executor(
+                    _convert_executor, _converter.video_to_audio, source, None, on_progress, job.cancel_event
+                )
+            return job.audio_path is not None
+
+
+async def _stage_convert(job: _VideoJob) -> _VideoJob:
+    if job.transcript is not None or job.audio_path:
+        return job
+    job.progress.update(job.index, job.name, 2, 0)
+
+    if job.stream_url and not await _extract_audio(job, job.stream_url):
+        # Контейнер не читается потоком — откатываемся на скачивание файла
+        logger.info(f"Потоковая конвертация {job.name} не удалась — скачиваю файл целиком")
+        await _fetch_video_file(job)
+        job.progress.update(job.index, job.name, 2, 0)
+
+    if job.video_ready:
+        ok = await _extract_audio(job, str(job.video_path))
+        if not ok:
+            raise StageFailed(f"❌ Не удалось конвертировать: {job.name}")
+        # Видео больше не нужно — освобождаем место до транскрибации
+        _converter.cleanup(str(job.video_path))
+        job.release_temp()
+
+    # Аудио в памяти не переживает перезапуск — тогда этап повторится
+    job.advance("converted", audio_path=job.audio_path)
+    return job
+
+
+def _audio_duration(job: _VideoJob) -> float:
+    """Длительность извлечённого аудио в секундах (массив или WAV 16 бит, моно)."""
+    if job.audio_samples is not None:
+        return len(job.audio_samples) / SAMPLE_RATE
+    if job.audio_path:
+        try:
+            # 44 байта — заголовок WAV, 2 байта на отсчёт
+            return max(0, Path(job.audio_path).stat().st_size - 44) / (2 * SAMPLE_RATE)
+        except OSError:
+            return 0.0
+    return 0.0
+
+
+async def _stage_transcribe(job: _VideoJob) -> _VideoJob:
+    if job.transcript is not None:
+        return job
+    job.progress.update(job.index, job.name, 3, 0)
+    audio = job.audio_samples if job.audio_samples is not None else job.audio_path
+    audio_s = _audio_duration(job)
+    async with _slot(job, "transcribe"):
+        started = time.perf_counter()
+        with job.trace.span("whisper"):
+            job.transcript = await _transcription.transcribe(
+                audio,
+                language=LANGUAGE,
+                on_progress=lambda fraction: job.progress.update(job.index, job.name, 3, int(100 * fraction)),
+            )
+    if audio_s:
+        _audio_seconds.inc(audio_s)
+        _transcribe_rtf.observe((time.perf_counter() - started) / audio_s)
+        job.trace.add("audio_seconds", audio_s)
+    # Освобождаем память сразу, не дожидаясь отправки результата
+    job.audio_samples = None
+    if not job.transcript:
+        raise StageFailed(f"❌ Не удалось транскрибировать: {job.name}")
+
+    _cache.put(job.video, _transcription.model_tag, LANGUAGE, job.transcript)
+    job.text_path.write_text(job.transcript, encoding="utf-8")
+    # Текст — и в базе: его забирает бот, если видео обработал процесс worker.py
+    job.advance("transcribed", text_path=str(job.text_path), transcript=job.transcript)
+    return job
+
+
+class _VideoCancelled(StageFailed):
+    """Видео снято с обработки: задачу отменили."""
+
+
+def _cancellable(func):
+    """
+    Этап, который прерывается отменой задачи (_VideoJob.cancel).
+
+    Этап идёт отдельной задачей asyncio: её отмена обрывает скачивание или
+    ожидание ресурса и становится ошибкой видео, а воркер конвейера, общий
+    для многих задач (worker.py), продолжает работу. Остановка самого
+    конвейера пробрасывается как обычно.
+    """
+    async def run(job: _VideoJob) -> _VideoJob:
+        if job.cancel_event.is_set():
+            raise _VideoCancelled(f"⛔ Отменено: {job.name}")
+        job.stage_task = asyncio.ensure_future(func(job))
+        try:
+            return await job.stage_task
+        except asyncio.CancelledError:
+            if job.cancel_event.is_set() and not asyncio.current_task().cancelling():
+                raise _VideoCancelled(f"⛔ Отменено: {job.name}")
+            raise
+        finally:
+            job.stage_task = None
+    return run
+
+
+def _build_pipeline(ordered: bool = True) -> Pipeline:
+    return Pipeline(
+        [
+            Stage("download", _cancellable(_stage_download), concurrency=PIPELINE_DOWNLOAD_WORKERS),
+            Stage("convert", _cancellable(_stage_convert), concurrency=PIPELINE_CONVERT_WORKERS),
+            Stage("transcribe", _cancellable(_stage_transcribe), concurrency=PIPELINE_TRANSCRIBE_WORKERS),
+        ],
+        max_in_flight=PIPELINE_MAX_IN_FLIGHT,
+        ordered=ordered,
+        # Готовый текст (кэш, перезапуск) не занимает место в конвейере и ресурсы планировщика
+        ready=lambda job: job.transcript is not None,
+    )
+
+
 # ── Основной обработчик ───────────────────────────────────────────────────────
 
 @router.message()
@@ -158,138 +1026,343 @@ async def handle_disk_link(message: Message):
     logger.info(f"Обрабатываю ссылку: {url}")
 
     status_msg = await message.answer("🔍 Обрабатываю ссылку…")
-    TEMP_DIR.mkdir(exist_ok=True)
+    # Задача сохраняется до начала работы — её выполнит run_job_worker
+    job_id = _jobs.create_job(message.chat.id, user_id, url, status_message_id=status_msg.message_id)
+    _job_queue.put_nowait((job_id, False))
 
-    try:
-        videos = await _resolve_videos(url, status_msg)
-    except Exception as e:
-        logger.exception("Ошибка при определении списка видео")
-        await status_msg.edit_text(f"❌ Ошибка:\n<code>{e}</code>")
-        return
 
-    if videos is None:
-        return  # статус уже обновлён внутри _resolve_videos
+# ── Очередь задач ─────────────────────────────────────────────────────────────
 
-    if not videos:
-        await status_msg.edit_text("❌ Видеофайлы не найдены.\nПроверьте ссылку.")
-        return
+async def run_job_worker(bot: Bot):
+    """
+    Фоновый цикл задач (запускается из main.py).
 
-    # 1. Редактируем первое сообщение → список найденных файлов
-    await status_msg.edit_text(_file_list_text(videos))
+    При старте возобновляет задачи, прерванные перезапуском, затем
+    выполняет новые ссылки из _job_queue — каждую в отдельной корутине.
+    """
+    await _services_ready.wait()
+
+    purged = _jobs.purge_finished()
+    if purged:
+        logger.info(f"Удалено завершённых задач из очереди: {purged}")
+
+    unfinished = _jobs.unfinished_jobs()
+    # Файлы прерванных задач нужны для продолжения, остальное — мусор после падения
+    removed, freed = _temp.cleanup_orphans(f"job{job['id']}_" for job in unfinished)
+    if removed:
+        logger.info(f"Удалено осиротевших временных файлов: {removed} ({_format_size(freed)})")
+    temp = _temp.usage()
+    logger.info(
+        f"Временная папка: занято {_format_size(temp['on_disk'])}, квота {_format_size(temp['capacity'])}, "
+        f"свободно на томе {_format_size(temp['free'])}"
+    )
 
-    # 2. Новое сообщение под списком → прогресс обработки
-    progress_msg = await message.answer("🔄 Начинаю обработку…")
+    for job in unfinished:
+        logger.info(f"Возобновляю задачу {job['id']}: {job['url']}")
+        _job_queue.put_nowait((job["id"], True))
+
+    started: Set[int] = set()
+    while True:
+        job_id, resumed = await _job_queue.get()
+        # Задача, созданная до прогрева, уже попала в список незавершённых;
+        # при остановке задача остаётся в _jobs и начнётся после запуска
+        if job_id in started or _draining.is_set():
+            continue
+        started.add(job_id)
+        task = asyncio.create_task(_run_job(bot, job_id, resumed))
+        _running_jobs[job_id] = task
+        task.add_done_callback(lambda _, job_id=job_id: _running_jobs.pop(job_id, None))
+
+
+async def _run_job(bot: Bot, job_id: int, resumed: bool):
+    job = _jobs.get_job(job_id)
+    if job is None or job["status"] != "active":
+        # Задачу отменили, пока она ждала запуска
+        _cancelled_jobs.discard(job_id)
+        return
+    chat_id = job["chat_id"]
+    status_msg = _MessageRef(bot, chat_id, job["status_message_id"])
+    TEMP_DIR.mkdir(exist_ok=True)
+    # Итог по задаче: листинг, отправка и суммарные этапы всех видео
+    trace = Trace(_stage_seconds)
+    started = time.perf_counter()
 
-    processed = 0
-    failed = 0
-    total = len(videos)
-    loop = asyncio.get_event_loop()
+    try:
+        if resumed:
+            await bot.send_message(chat_id, f"♻️ Бот был перезапущен — продолжаю обработку:\n{job['url']}")
+        await _process_job(bot, job, status_msg, trace)
+        _jobs.update_job(job_id, status="done")
+        status = "done"
+    except asyncio.CancelledError:
+        if job_id not in _cancelled_jobs:
+            # Остановка бота: задача остаётся активной и продолжится после запуска
+            raise
+        # Отмена пользователем (cancel_job): статус уже записан
+        asyncio.current_task().uncancel()
+        status = "cancelled"
+        await _report_cancelled(bot, job_id, chat_id)
+    except Exception as e:
+        logger.exception(f"Ошибка задачи {job_id}")
+        _record_error(trace.current, e)
+        _jobs.update_job(job_id, status="failed")
+        status = "failed"
+        await bot.send_message(chat_id, f"❌ Ошибка:\n<code>{e}</code>")
+    _log_job(job, status, trace, time.perf_counter() - started)
+    _cancelled_jobs.discard(job_id)
+
+    # Видео, прерванные отменой, не дошли до отправки — возвращаем их место в temp/
+    for video_job in list(_active_videos.get(job_id, ())):
+        video_job.cleanup()
+
+    # Файлы видео, прерванных вместе с задачей, больше не понадобятся
+    for leftover in TEMP_DIR.glob(f"job{job_id}_*"):
+        _converter.cleanup(str(leftover))
+
+
+async def _report_cancelled(bot: Bot, job_id: int, chat_id: int) -> None:
+    """Итог отменённой задачи — в сообщение с прогрессом (кнопка отмены убирается)."""
+    job = _jobs.get_job(job_id)
+    counts = _jobs.counts(job_id)
+    sent, failed = counts.get("sent", 0), counts.get("failed", 0)
+    text = (
+        f"⛔ Задача отменена.\n\n"
+        f"Обработано: {sent}\n"
+        f"Ошибок: {failed}\n"
+        f"Не обработано: {sum(counts.values()) - sent - failed}"
+    )
+    if job and job["progress_message_id"]:
+        await _try_edit(_MessageRef(bot, chat_id, job["progress_message_id"]), text)
+    else:
+        await bot.send_message(chat_id, text)
 
-    for i, video in enumerate(videos, 1):
-        video_name = video.get("name", "video")
-        video_ext = Path(video_name).suffix or ".mp4"
-        uid = uuid.uuid4().hex[:8]
 
-        video_path = TEMP_DIR / f"{uid}{video_ext}"
-        audio_path: Optional[str] = None
-        text_path = TEMP_DIR / f"{uid}.txt"
+async def _process_job(bot: Bot, job: Dict, status_msg: _MessageRef, trace: Trace):
+    job_id = job["id"]
+    chat_id = job["chat_id"]
+    listing_started = time.perf_counter()
 
+    if job["listing_done"]:
+        # Список уже сохранён — повторный обход папки не нужен
+        found = _iter_list([task["video"] for task in _jobs.tasks(job_id)])
+    else:
         try:
-            # ── Шаг 1: Скачивание (реальный прогресс по байтам) ──────────────
-            dl_start, dl_end = _step_range(i, total, 1)
-            await _try_edit(progress_msg, _progress_text(video_name, "📥 Скачиваю…", dl_start, i, total))
-
-            last_pct: list[int] = [dl_start]
-            last_edit: list[float] = [0.0]
-
-            async def on_download(downloaded: int, total_bytes: int):
-                pct = dl_start + int((dl_end - dl_start) * downloaded / total_bytes)
-                rounded = (pct // 5) * 5
-                now = time.time()
-                if rounded != last_pct[0] and now - last_edit[0] >= 1.0:
-                    last_pct[0] = rounded
-                    last_edit[0] = now
-                    await _try_edit(progress_msg, _progress_text(video_name, "📥 Скачиваю…", rounded, i, total))
-
-            ok = await _download_video(video, video_path, on_progress=on_download)
-            if not ok:
-                failed += 1
-                await message.answer(f"❌ Не удалось скачать: {video_name}")
-                continue
-            await _try_edit(progress_msg, _progress_text(video_name, "📥 Скачиваю…", dl_end, i, total))
+            trace.current = "list"
+            found = await _resolve_videos(job["url"], status_msg)
+        except Exception as e:
+            logger.exception("Ошибка при определении списка видео")
+            _record_error("list", e)
+            await status_msg.edit_text(f"❌ Ошибка:\n<code>{e}</code>")
+            return
 
-            # ── Шаг 2: Конвертация (симуляция прогресса) ─────────────────────
-            cv_start, cv_end = _step_range(i, total, 2)
-            stop_cv = asyncio.Event()
-            sim_cv = asyncio.create_task(
-                _simulate_progress(progress_msg, video_name, "🎵 Конвертирую в аудио…", cv_start, cv_end, stop_cv, i, total)
-            )
-            audio_path = await loop.run_in_executor(_executor, _converter.video_to_audio, str(video_path))
-            stop_cv.set()
-            await sim_cv
-            if not audio_path:
-                failed += 1
-                await message.answer(f"❌ Не удалось конвертировать: {video_name}")
-                continue
-            await _try_edit(progress_msg, _progress_text(video_name, "🎵 Конвертирую в аудио…", cv_end, i, total))
+    if found is None:
+        return  # статус уже обновлён внутри _resolve_videos
+
+    if PIPELINE_ORDER == "shortest" and not job["listing_done"]:
+        # Сначала короткие видео: большой файл в начале листинга не задерживает
+        # первые результаты. После перезапуска порядок уже задан номерами видео
+        found = shortest_first(
+            found,
+            _estimate_duration,
+            lookahead=PIPELINE_ORDER_LOOKAHEAD,
+            settle=PIPELINE_ORDER_WAIT,
+            concurrency=PIPELINE_ORDER_PROBE_WORKERS,
+        )
 
-            # ── Шаг 3: Транскрибация (симуляция прогресса) ───────────────────
-            tr_start, tr_end = _step_range(i, total, 3)
-            stop_tr = asyncio.Event()
-            sim_tr = asyncio.create_task(
-                _simulate_progress(progress_msg, video_name, "📝 Транскрибирую…", tr_start, tr_end, stop_tr, i, total)
+    videos: List[Dict] = []
+    progress: Optional[_JobProgress] = None
+
+    async def source():
+        """Отдаёт видео в конвейер по мере обхода папки; готовые до перезапуска пропускаются."""
+        nonlocal progress
+        async for video in found:
+            if progress is None:
+                # Сообщение под списком → прогресс обработки с кнопкой отмены
+                keyboard = _cancel_keyboard(job_id)
+                message_id = job["progress_message_id"]
+                if not message_id:
+                    sent = await bot.send_message(chat_id, "🔄 Начинаю обработку…", reply_markup=keyboard)
+                    message_id = sent.message_id
+                    _jobs.update_job(job_id, progress_message_id=message_id)
+                progress = _JobProgress(
+                    _MessageRef(bot, chat_id, message_id, keyboard), job["user_id"], job_id, job["priority"]
+                )
+            # Кэш проверяется до конвейера: такое видео сразу записывается
+            # расшифрованным, его не берут ни этапы, ни воркеры
+            cached = _cache.get(video, _transcription.model_tag, LANGUAGE)
+            task = _jobs.add_task(job_id, video, transcript=cached)
+            videos.append(video)
+            progress.add_discovered()
+            if task["state"] in FINAL_STATES:
+                progress.finish(task["idx"])
+                continue
+            _telemetry.queued(
+                (job_id, task["idx"]), job_id, job["user_id"], video.get("name", ""), int(video.get("size") or 0)
             )
-            transcript = await loop.run_in_executor(
-                _executor, lambda: _transcription.transcribe(audio_path, language="ru")
+            video_job = _VideoJob(task, progress)
+            video_job.from_cache = cached is not None and task["state"] == "transcribed"
+            yield video_job
+
+        if not job["listing_done"]:
+            # Обход папки вместе с ожиданием места в конвейере — время до последнего найденного видео
+            trace.record("list", time.perf_counter() - listing_started)
+        if progress is not None:
+            _jobs.update_job(job_id, listing_done=1)
+            progress.set_listing_done()
+            if len(videos) <= PRIORITY_SMALL_JOB_VIDEOS and progress.priority != PRIORITY_HIGH:
+                # Небольшая задача (файл или папка с парой видео) обгоняет большие папки
+                progress.priority = PRIORITY_HIGH
+                _jobs.update_job(job_id, priority=PRIORITY_HIGH)
+            # Первое сообщение → список найденных файлов
+            await _try_edit(status_msg, _file_list_text(videos))
+
+    async def deliver(job: _VideoJob, error: Optional[BaseException]):
+        """Отправляет результат в чат — строго в порядке списка."""
+        sent = False
+        try:
+            if error is None:
+                job.text_path.write_text(job.transcript, encoding="utf-8")
+                stem = Path(job.name).stem
+                doc = FSInputFile(str(job.text_path), filename=f"{stem}.txt")
+                cached_mark = " (из кэша)" if job.from_cache else ""
+                with job.trace.span("send"):
+                    await bot.send_document(chat_id, doc, caption=f"📝 {job.name}{cached_mark}")
+                job.advance("sent")
+                sent = True
+                _videos_total.inc(result="cached" if job.from_cache else "sent")
+            elif isinstance(error, StageFailed):
+                _record_error(job.trace.current, error)
+                _videos_total.inc(result="failed")
+                job.advance("failed", error=str(error))
+                await bot.send_message(chat_id, str(error))
+            else:
+                _record_error(job.trace.current, error)
+                _videos_total.inc(result="failed")
+                job.advance("failed", error=repr(error))
+                logger.error(f"Ошибка при обработке {job.name}", exc_info=error)
+                await bot.send_message(chat_id, f"❌ Ошибка при обработке <b>{job.name}</b>")
+        except Exception as e:
+            _record_error("send", e)
+            _videos_total.inc(result="failed")
+            job.advance("failed", error=repr(e))
+            logger.exception(f"Ошибка при отправке результата {job.name}")
+            await bot.send_message(chat_id, f"❌ Ошибка при обработке <b>{job.name}</b>")
+        finally:
+            trace.merge(job.trace)
+            if job.from_cache:
+                trace.add("cached", 1)
+            _telemetry.finish(
+                (job_id, job.index), sent, cached=job.from_cache, audio_s=job.trace.attrs.get("audio_seconds", 0.0)
             )
-            stop_tr.set()
-            await sim_tr
-            if not transcript:
-                failed += 1
-                await message.answer(f"❌ Не удалось транскрибировать: {video_name}")
-                continue
-            await _try_edit(progress_msg, _progress_text(video_name, "📝 Транскрибирую…", tr_end, i, total))
-
-            # ── Отправляем результат ──────────────────────────────────────────
-            text_path.write_text(transcript, encoding="utf-8")
-            stem = Path(video_name).stem
-            doc = FSInputFile(str(text_path), filename=f"{stem}.txt")
-            await message.answer_document(doc, caption=f"📝 {video_name}")
+            job.progress.finish(job.index)
+            job.cleanup()
 
-            processed += 1
+    pipeline_error: Optional[Exception] = None
+    try:
+        if BOT_ROLE == "frontend":
+            await _await_workers(job_id, source(), deliver)
+        else:
+            await _build_pipeline().run(source(), deliver)
+    except Exception as e:
+        # Например, листинг упёрся в лимит запросов API после всех повторов
+        pipeline_error = e
+        _record_error("list", e)
+        logger.exception("Ошибка конвейера обработки")
+        await bot.send_message(chat_id, f"❌ Ошибка:\n<code>{e}</code>")
+    finally:
+        if progress is not None:
+            progress.close()
 
-        except Exception as e:
-            failed += 1
-            logger.exception(f"Ошибка при обработке {video_name}")
-            await message.answer(f"❌ Ошибка при обработке <b>{video_name}</b>")
+    if not videos:
+        if pipeline_error is not None:
+            return
+        await status_msg.edit_text("❌ Видеофайлы не найдены.\nПроверьте ссылку.")
+        return
 
-        finally:
-            # Гарантированная очистка temp-файлов
-            for f in (str(video_path), audio_path, str(text_path)):
-                if f:
-                    try:
-                        p = Path(f)
-                        if p.exists():
-                            p.unlink()
-                    except Exception:
-                        pass
-
-        await asyncio.sleep(0.5)
-
-    # Итог
-    await progress_msg.edit_text(
+    # Итог — по сохранённым состояниям, включая видео, готовые до перезапуска
+    counts = _jobs.counts(job_id)
+    progress.msg.reply_markup = None
+    await progress.msg.edit_text(
         f"✅ Готово!\n\n"
-        f"Обработано: {processed}\n"
-        f"Ошибок: {failed}\n"
-        f"Всего: {total}"
+        f"Обработано: {counts.get('sent', 0)}\n"
+        f"Ошибок: {counts.get('failed', 0)}\n"
+        f"Всего: {len(videos)}"
     )
 
 
+async def _await_workers(job_id: int, source: AsyncIterator[_VideoJob], sink) -> None:
+    """
+    Фронтенд (BOT_ROLE=frontend): видео обрабатывают процессы worker.py.
+
+    source регистрирует найденные видео в _jobs, откуда их берут воркеры.
+    База опрашивается раз в WORKER_POLL_INTERVAL: прогресс воркеров переносится
+    в сообщение, готовые результаты отдаются в sink в порядке списка.
+    Ошибка source пробрасывается после выдачи уже найденных видео.
+    """
+    pending: List[_VideoJob] = []
+    source_errors: List[Exception] = []
+    listing_done = asyncio.Event()
+
+    async def consume():
+        try:
+            async for video_job in source:
+                pending.append(video_job)
+        except Exception as e:
+            source_errors.append(e)
+        finally:
+            listing_done.set()
+
+    consumer = asyncio.create_task(consume())
+    try:
+        while True:
+            # Флаг — до чтения базы, чтобы не потерять видео, найденные в последний момент
+            finished = listing_done.is_set()
+            rows = {task["id"]: task for task in _jobs.tasks(job_id)}
+
+            while pending:
+                head = pending[0]
+                row = rows.get(head.task_id)
+                if row is None:
+                    break
+                if row["state"] == "failed":
+                    error = StageFailed(row["error"] or f"❌ Ошибка при обработке <b>{head.name}</b>")
+                elif row["state"] == "transcribed" and row["transcript"] is not None:
+                    head.transcript = row["transcript"]
+                    error = None
+                else:
+                    break
+                pending.pop(0)
+                await sink(head, error)
+
+            for video_job in pending:
+                row = rows.get(video_job.task_id)
+                if row is None or not row["worker"] or not row["step"]:
+                    continue
+                current = video_job.progress.active.get(video_job.index)
+                if current is None or current[1:] != (row["step"], row["pct"]):
+                    video_job.progress.update(video_job.index, video_job.name, row["step"], row["pct"])
+
+            if finished and not pending:
+                break
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+    finally:
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+
+    if source_errors:
+        raise source_errors[0]
+
+
 # ── Определение списка видео по ссылке ───────────────────────────────────────
 
-async def _resolve_videos(url: str, status_msg) -> Optional[List[Dict]]:
+async def _iter_list(videos: List[Dict]) -> AsyncIterator[Dict]:
+    for video in videos:
+        yield video
+
+
+async def _resolve_videos(url: str, status_msg) -> Optional[AsyncIterator[Dict]]:
     """
-    Разбирает URL и возвращает список видеофайлов.
+    Разбирает URL и возвращает асинхронный поток видеофайлов
+    (папки обходятся по мере обработки).
     При ошибке обновляет status_msg и возвращает None.
     """
     is_public = '/i/' in url or 'yandex.ru/i/' in url
@@ -319,17 +1392,18 @@ async def _resolve_videos(url: str, status_msg) -> Optional[List[Dict]]:
             if not _disk.is_video_file(name):
                 await status_msg.edit_text(f"❌ Файл не является видео: <b>{name}</b>")
                 return None
-            return [{
+            return _iter_list([{
                 "name": name,
                 "size": info.get("size", 0),
                 "public_key": public_key,
                 "inner_path": None,
-            }]
+                "md5": info.get("md5"),
+                "sha256": info.get("sha256"),
+            }])
 
         elif resource_type == "dir":
             await status_msg.edit_text("🔍 Ищу видео в публичной папке…")
-            videos = await _disk.get_video_files_from_public_folder(public_key)
-            return videos
+            return _disk.iter_video_files_from_public_folder(public_key)
 
         else:
             await status_msg.edit_text("❌ Неизвестный тип ресурса.")
@@ -345,5 +1419,140 @@ async def _resolve_videos(url: str, status_msg) -> Optional[List[Dict]]:
             return None
 
         await status_msg.edit_text("🔍 Ищу видео файлы…")
-        videos = await _disk.get_video_files_from_folder(parsed_path, recursive=True)
-        return videos
+        return _disk.iter_video_files_from_folder(parsed_path, recursive=True)
+
+
+# ── Процессы обработки (worker.py) ───────────────────────────────────────────
+
+class _TaskProgress:
+    """
+    Прогресс видео в процессе worker.py: этап и процент пишутся в _jobs,
+    откуда их показывает бот. Запись — не чаще раза в секунду на видео.
+    """
+
+    def __init__(self, task_id: int, user_id: int, priority: int = PRIORITY_NORMAL):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.priority = priority
+        self._step = 0
+        self._written = 0.0
+
+    def update(self, index: int, name: str, step: int, pct: int) -> None:
+        now = time.monotonic()
+        if step == self._step and pct < 100 and now - self._written < 1.0:
+            return
+        self._step = step
+        self._written = now
+        _jobs.set_task_progress(self.task_id, step, max(0, min(100, pct)))
+
+    def set_waiting(self, index: int, resource: Optional[str]) -> None:
+        # Очередь за ресурсами своя у каждого воркера — боту она не видна
+        pass
+
+
+async def run_task_worker(worker_id: str, stop: asyncio.Event):
+    """
+    Цикл процесса worker.py (бот запущен с BOT_ROLE=frontend).
+
+    Берёт видео из общей базы _jobs в аренду и прогоняет через тот же конвейер,
+    но результат не отправляет, а возвращает в базу — его доставит бот.
+    Аренда продлевается, пока видео в работе; после stop новые видео не
+    берутся, начатые дорабатываются не дольше SHUTDOWN_DRAIN_TIMEOUT,
+    а остальные возвращаются в очередь для других воркеров.
+    """
+    await _start_services(transcription=True)
+    TEMP_DIR.mkdir(exist_ok=True)
+
+    removed, freed = _temp.cleanup_orphans(f"job{job['id']}_" for job in _jobs.unfinished_jobs())
+    if removed:
+        logger.info(f"Удалено осиротевших временных файлов: {removed} ({_format_size(freed)})")
+
+    claimed: Dict[int, _VideoJob] = {}
+
+    async def source():
+        while not stop.is_set():
+            task = _jobs.claim_task(worker_id, WORKER_LEASE_SECONDS)
+            if task is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), WORKER_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            video_job = _VideoJob(task, _TaskProgress(task["id"], task["user_id"], task["priority"]))
+            claimed[video_job.task_id] = video_job
+            logger.info(f"Воркер {worker_id}: беру {video_job.name} (задача {task['job_id']})")
+            yield video_job
+
+    async def publish(video_job: _VideoJob, error: Optional[BaseException]):
+        try:
+            if error is None:
+                _jobs.finish_task(video_job.task_id, "transcribed", transcript=video_job.transcript)
+                _videos_total.inc(result="cached" if video_job.from_cache else "transcribed")
+            elif isinstance(error, _VideoCancelled):
+                # Об отмене в чат сообщает бот
+                _videos_total.inc(result="cancelled")
+                _jobs.finish_task(video_job.task_id, "failed", error=str(error))
+            else:
+                _record_error(video_job.trace.current, error)
+                _videos_total.inc(result="failed")
+                if isinstance(error, StageFailed):
+                    _jobs.finish_task(video_job.task_id, "failed", error=str(error))
+                else:
+                    logger.error(f"Ошибка при обработке {video_job.name}", exc_info=error)
+                    _jobs.finish_task(
+                        video_job.task_id, "failed", error=f"❌ Ошибка при обработке <b>{video_job.name}</b>"
+                    )
+        finally:
+            claimed.pop(video_job.task_id, None)
+            video_job.cleanup()
+        # Задачу целиком завершает бот — воркер пишет строку на каждое видео
+        job_logger.info(json.dumps({
+            "event": "video",
+            "worker": worker_id,
+            "job_id": video_job.job_id,
+            "task_id": video_job.task_id,
+            "status": (
+                "transcribed" if error is None else "cancelled" if isinstance(error, _VideoCancelled) else "failed"
+            ),
+            "cached": video_job.from_cache,
+            "stages_s": {stage: round(seconds, 3) for stage, seconds in video_job.trace.stages.items()},
+            "download_bytes": int(video_job.trace.attrs.get("download_bytes", 0)),
+            "audio_s": round(video_job.trace.attrs.get("audio_seconds", 0.0), 1),
+        }, ensure_ascii=False))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(WORKER_LEASE_SECONDS / 3)
+            _jobs.renew_leases(list(claimed), worker_id, WORKER_LEASE_SECONDS)
+
+    async def watch_cancelled():
+        # Отмену задачи бот пишет в базу — видео этой задачи прерываются здесь
+        while True:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            statuses = _jobs.job_statuses(list({video_job.job_id for video_job in claimed.values()}))
+            for video_job in list(claimed.values()):
+                if statuses.get(video_job.job_id, "active") != "active" and not video_job.cancel_event.is_set():
+                    logger.info(f"Воркер {worker_id}: задача {video_job.job_id} отменена — прерываю {video_job.name}")
+                    video_job.cancel()
+
+    # Порядок не важен: готовое видео сразу возвращается боту
+    run = asyncio.create_task(_build_pipeline(ordered=False).run(source(), publish))
+    beat = asyncio.create_task(heartbeat())
+    watch = asyncio.create_task(watch_cancelled())
+    stopped = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait({run, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        if not run.done():
+            if claimed:
+                logger.info(f"Жду завершения видео: {len(claimed)} (не дольше {SHUTDOWN_DRAIN_TIMEOUT:.0f} с)")
+            await asyncio.wait({run}, timeout=SHUTDOWN_DRAIN_TIMEOUT)
+        if run.done():
+            run.result()
+    finally:
+        for task in (run, beat, watch, stopped):
+            task.cancel()
+        await asyncio.gather(run, beat, watch, stopped, return_exceptions=True)
+        # Недоделанные видео сразу достаются другим воркерам
+        for task_id in list(claimed):
+            _jobs.release_task(task_id)
+        await on_shutdown()
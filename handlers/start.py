@@ -24,9 +24,14 @@ async def cmd_help(message: Message):
     await message.answer(
         "Доступные команды:\n"
         "/start - Начать работу с ботом\n"
-        "/help - Показать эту справку\n\n"
+        "/help - Показать эту справку\n"
+        "/queue - Видео в работе и в очереди\n"
+        "/stats - Статистика за последний час\n"
+        "/cancel - Отменить свои задачи (/cancel номер — одну задачу)\n\n"
         "📁 Работа с Яндекс.Диском:\n"
-        "Отправьте ссылку на папку Яндекс.Диска, и бот найдет все видео файлы в ней!\n\n"
+        "Отправьте ссылку на папку Яндекс.Диска, и бот найдет все видео файлы в ней!\n"
+        "Видео обрабатываются в порядке папки; сначала короткие — "
+        "если администратор включил PIPELINE_ORDER=shortest.\n\n"
         "⚠️ Доступно только для администраторов."
     )
 
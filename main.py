@@ -1,11 +1,25 @@
 import asyncio
 import logging
+import signal
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
-from handlers import router
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    METRICS_HOST,
+    METRICS_PORT,
+)
+from handlers import router, on_startup, on_shutdown, run_job_worker, health_status, metrics
+from services.metrics import metrics_handler, start_metrics_server
 
 # Настройка логирования
 logging.basicConfig(
@@ -15,6 +29,58 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def health(request: web.Request) -> web.Response:
+    """GET /health: 200, когда бот готов принимать задачи, иначе 503."""
+    status = health_status()
+    return web.json_response(status, status=200 if status["status"] == "ok" else 503)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """
+    Принимает обновления через webhook на aiohttp-сервере.
+
+    Startup/shutdown диспетчера выполняются при запуске и остановке
+    приложения: сервер сначала перестаёт принимать запросы, затем
+    on_shutdown дожидается начатых задач. Webhook при остановке не
+    удаляется — Telegram придержит обновления до следующего запуска.
+    """
+    app = web.Application()
+    app.router.add_get("/health", health)
+    if METRICS_PORT == WEBHOOK_PORT:
+        # Метрики на том же сервере, что и webhook
+        app.router.add_get("/metrics", metrics_handler(metrics))
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET or None,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook: {WEBHOOK_URL}{WEBHOOK_PATH}, сервер на {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+
+        # Работаем до SIGINT/SIGTERM (docker stop)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass  # Windows: остановка по Ctrl+C через KeyboardInterrupt
+        await stop.wait()
+        logger.info("Остановка бота")
+    finally:
+        await runner.cleanup()
+
+
 async def main():
     # Инициализация бота и диспетчера
     bot = Bot(
@@ -22,18 +88,39 @@ async def main():
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     dp = Dispatcher(storage=MemoryStorage())
-    
+
     # Подключение роутера с обработчиками
     dp.include_router(router)
-    
+
+    # Открытие/закрытие общих ресурсов (HTTP-сессия Яндекс.Диска)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    # Фоновый цикл задач: продолжает прерванные перезапуском и берёт новые
+    job_worker = asyncio.create_task(run_job_worker(bot))
+
+    # GET /metrics для Prometheus (в режиме webhook на общем порту — внутри run_webhook)
+    metrics_runner = None
+    if METRICS_PORT and not (BOT_MODE == "webhook" and METRICS_PORT == WEBHOOK_PORT):
+        metrics_runner = await start_metrics_server(metrics, METRICS_HOST, METRICS_PORT)
+        logger.info(f"Метрики: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
     # Запуск бота
-    logger.info("Бот запущен")
+    logger.info(f"Бот запущен ({BOT_MODE})")
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # Webhook, оставшийся от запуска в режиме webhook, мешает polling
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        job_worker.cancel()
+        await asyncio.gather(job_worker, return_exceptions=True)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
 
 
 if __name__ == "__main__":
     asyncio.run(main())
-
@@ -0,0 +1,85 @@
+"""
+Модуль для нарезки длинного аудио на фрагменты и склейки их транскрипций
+"""
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+# Фрагмент: (начальный сэмпл, конечный сэмпл)
+Chunk = Tuple[int, int]
+
+
+def _quietest_point(audio: np.ndarray, start: int, end: int, frame: int) -> int:
+    """Возвращает середину самого тихого кадра в диапазоне [start, end)."""
+    start = max(0, start)
+    end = min(len(audio), end)
+    n_frames = (end - start) // frame
+    if n_frames <= 1:
+        return (start + end) // 2
+
+    frames = audio[start:start + n_frames * frame].reshape(n_frames, frame)
+    energy = np.mean(np.square(frames, dtype=np.float32), axis=1)
+    return start + int(np.argmin(energy)) * frame + frame // 2
+
+
+def split_chunks(
+    audio: np.ndarray,
+    sample_rate: int = 16000,
+    chunk_s: float = 300.0,
+    overlap_s: float = 3.0,
+    search_s: float = 15.0,
+) -> List[Chunk]:
+    """
+    Делит аудио на фрагменты примерно по chunk_s секунд.
+
+    Граница ищется в самом тихом месте в пределах ±search_s от целевой
+    точки, чтобы не резать слово; соседние фрагменты перекрываются на
+    overlap_s вокруг границы — повтор потом убирает merge_texts.
+    """
+    n = len(audio)
+    chunk = int(chunk_s * sample_rate)
+    half_overlap = int(overlap_s * sample_rate) // 2
+    search = int(search_s * sample_rate)
+    frame = max(1, sample_rate // 50)  # 20 мс
+
+    chunks: List[Chunk] = []
+    pos = 0
+    while pos < n:
+        target = pos + chunk
+        # Остаток короче половины фрагмента присоединяем к текущему
+        if target + chunk // 2 >= n:
+            chunks.append((pos, n))
+            break
+        cut = _quietest_point(audio, target - search, target + search, frame)
+        chunks.append((pos, min(n, cut + half_overlap)))
+        pos = max(cut - half_overlap, pos + 1)
+    return chunks
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def merge_texts(texts: List[str], max_overlap_words: int = 30) -> str:
+    """
+    Склеивает транскрипции соседних фрагментов, убирая повтор на перекрытии.
+
+    Ищется самое длинное совпадение (без учёта регистра и пунктуации)
+    между концом накопленного текста и началом следующего фрагмента.
+    """
+    words: List[str] = []
+    for text in texts:
+        new_words = text.split()
+        if not new_words:
+            continue
+
+        tail = [_normalize(w) for w in words[-max_overlap_words:]]
+        head = [_normalize(w) for w in new_words[:max_overlap_words]]
+        overlap = 0
+        for k in range(min(len(tail), len(head)), 0, -1):
+            if tail[-k:] == head[:k] and any(head[:k]):
+                overlap = k
+                break
+        words.extend(new_words[overlap:])
+    return " ".join(words)
@@ -0,0 +1,91 @@
+"""
+Модуль для конкурентного обхода дерева папок Яндекс.Диска
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# list_page(path, offset, limit) -> элементы страницы или None, если папки нет;
+# прочие ошибки — исключением
+ListPage = Callable[[Optional[str], int, int], Awaitable[Optional[List[Dict]]]]
+
+_DONE = object()
+
+
+async def crawl_files(
+    list_page: ListPage,
+    root: Optional[str],
+    is_wanted: Callable[[Dict], bool],
+    concurrency: int = 8,
+    page_limit: int = 1000,
+    recursive: bool = True,
+) -> AsyncIterator[Dict]:
+    """
+    Обходит дерево папок в ширину и отдаёт подходящие файлы по мере обнаружения.
+
+    Одновременно выполняется не больше `concurrency` запросов листинга.
+    Каждая страница (offset/limit) — отдельная задача в очереди, поэтому
+    большие папки дочитываются параллельно с обходом подпапок.
+
+    Args:
+        list_page: корутина, возвращающая одну страницу листинга
+        root: путь к корневой папке
+        is_wanted: фильтр для файлов (например, только видео)
+        concurrency: максимум одновременных запросов листинга
+        page_limit: размер страницы
+        recursive: обходить ли подпапки
+
+    Ошибка листинга одной страницы не останавливает обход остальных,
+    но после выдачи всех найденных файлов первая из них пробрасывается —
+    иначе, например, исчерпанный лимит запросов выглядел бы как «видео нет».
+    """
+    pending: "asyncio.Queue[Tuple[Optional[str], int]]" = asyncio.Queue()
+    found: asyncio.Queue = asyncio.Queue()
+    errors: List[Exception] = []
+    pending.put_nowait((root, 0))
+
+    async def worker():
+        while True:
+            path, offset = await pending.get()
+            try:
+                items = await list_page(path, offset, page_limit)
+                if not items:
+                    continue
+
+                # Полная страница — вероятно, есть продолжение
+                if len(items) >= page_limit:
+                    pending.put_nowait((path, offset + page_limit))
+
+                for item in items:
+                    if item.get("type") == "file":
+                        if is_wanted(item):
+                            await found.put(item)
+                    elif item.get("type") == "dir" and recursive:
+                        pending.put_nowait((item.get("path", ""), 0))
+            except Exception as e:
+                logger.exception(f"Исключение при обходе папки {path}: {e}")
+                errors.append(e)
+            finally:
+                pending.task_done()
+
+    async def finisher():
+        await pending.join()
+        await found.put(_DONE)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    tasks.append(asyncio.create_task(finisher()))
+
+    try:
+        while True:
+            item = await found.get()
+            if item is _DONE:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,409 @@
+"""
+Модуль для скачивания файлов по HTTP Range: параллельные сегменты, докачка и повторы
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# get_link() -> прямая ссылка на файл; вызывается снова, когда ссылка истекла
+LinkGetter = Callable[[], Awaitable[Optional[str]]]
+# on_progress(скачано байт, всего байт)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+# Размер чтения из сокета, размер одной записи на диск (чанки склеиваются)
+# и предел данных, ожидающих записи, на один файл
+CHUNK_SIZE = 256 * 1024
+WRITE_SIZE = 1024 * 1024
+BUFFER_SIZE = 16 * 1024 * 1024
+# Без общего лимита времени: большие файлы качаются дольше часа,
+# зависшее соединение отсекается таймаутом чтения
+SEGMENT_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+# Ответы, после которых ссылка считается истёкшей и запрашивается заново
+_EXPIRED_STATUSES = (401, 403, 404, 410)
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+# Файл состояния докачки рядом с файлом: {"size": N, "segments": [[pos, end], ...]}
+STATE_SUFFIX = ".part.json"
+_STATE_SAVE_INTERVAL = 2.0
+
+
+class _LinkExpired(Exception):
+    """Сервер отверг ссылку (истекла подпись) — нужна новая."""
+
+
+class _RetryableError(Exception):
+    """Временная ошибка: повторяем запрос после паузы."""
+
+
+class _Link:
+    """Текущая ссылка на файл; обновляется одним запросом на все сегменты."""
+
+    def __init__(self, get_link: LinkGetter):
+        self._get_link = get_link
+        self._lock = asyncio.Lock()
+        self.url: Optional[str] = None
+
+    async def refresh(self, stale_url: Optional[str]) -> bool:
+        async with self._lock:
+            # Другой сегмент уже получил новую ссылку
+            if self.url != stale_url:
+                return True
+            self.url = await self._get_link()
+            return self.url is not None
+
+
+class _FileWriter:
+    """
+    Запись в файл из отдельного потока.
+
+    Event loop только ставит готовые буферы в очередь, os.pwrite выполняется
+    в потоке писателя — медленный диск не останавливает опрос Telegram,
+    другие загрузки и правки сообщений. Очередь ограничена max_pending
+    буферами: если диск не успевает, скачивание ждёт, а не копит память.
+    """
+
+    def __init__(self, path: Path, max_pending: int):
+        self._loop = asyncio.get_running_loop()
+        self._fd = os.open(path, os.O_WRONLY)
+        self._queue: queue.Queue = queue.Queue()
+        self._slots = asyncio.Semaphore(max(1, max_pending))
+        self._error: Optional[OSError] = None
+        self._thread = threading.Thread(target=self._run, name=f"writer-{path.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            offset, data, done = item
+            if data and self._error is None:
+                try:
+                    view = memoryview(data)
+                    while view:
+                        written = os.pwrite(self._fd, view, offset)
+                        view = view[written:]
+                        offset += written
+                except OSError as e:
+                    self._error = e
+            self._loop.call_soon_threadsafe(done)
+        os.close(self._fd)
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    async def write(self, offset: int, data: bytes) -> None:
+        """Ставит буфер в очередь записи; ждёт, только если очередь заполнена."""
+        self._check()
+        await self._slots.acquire()
+        self._queue.put_nowait((offset, data, self._slots.release))
+
+    async def barrier(self) -> None:
+        """Дожидается записи всех буферов, поставленных до вызова."""
+        written = self._loop.create_future()
+        self._queue.put_nowait((0, b"", lambda: written.done() or written.set_result(None)))
+        await written
+        self._check()
+
+    async def close(self) -> None:
+        """Дописывает очередь и закрывает файл."""
+        try:
+            await self.barrier()
+        finally:
+            self._queue.put_nowait(None)
+
+
+def _backoff(attempt: int, base: float, max_delay: float) -> float:
+    """Экспоненциальная пауза со случайным разбросом (full jitter)."""
+    return random.uniform(0, min(max_delay, base * 2 ** (attempt - 1)))
+
+
+async def _with_retries(
+    link: _Link,
+    op: Callable[[str], Awaitable[None]],
+    max_retries: int,
+    backoff_base: float,
+    backoff_max: float,
+    progress: Callable[[], int] = lambda: 0,
+) -> None:
+    """
+    Выполняет op(url) до успеха: истёкшую ссылку обновляет, временные ошибки
+    повторяет с паузой. Счётчик попыток сбрасывается, если op успела что-то скачать.
+    """
+    attempt = 0
+    while True:
+        url = link.url
+        before = progress()
+        try:
+            await op(url)
+            return
+        except _LinkExpired:
+            if not await link.refresh(url):
+                raise _RetryableError("не удалось обновить ссылку на скачивание")
+            error = "ссылка истекла"
+        except (aiohttp.ClientError, asyncio.TimeoutError, _RetryableError) as e:
+            error = str(e) or type(e).__name__
+
+        attempt = 1 if progress() > before else attempt + 1
+        if attempt > max_retries:
+            raise _RetryableError(f"превышено число попыток ({max_retries}): {error}")
+        await asyncio.sleep(_backoff(attempt, backoff_base, backoff_max))
+
+
+def _load_state(save_path: Path, size: int) -> Optional[List[List[int]]]:
+    """Сегменты незавершённой загрузки того же размера или None."""
+    try:
+        state = json.loads(Path(f"{save_path}{STATE_SUFFIX}").read_text())
+        if state["size"] == size and save_path.stat().st_size == size:
+            return [[int(pos), int(end)] for pos, end in state["segments"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _save_state(save_path: Path, size: int, segments: List[List[int]]) -> None:
+    state_file = Path(f"{save_path}{STATE_SUFFIX}")
+    tmp = state_file.with_name(state_file.name + ".tmp")
+    tmp.write_text(json.dumps({"size": size, "segments": segments}))
+    os.replace(tmp, state_file)
+
+
+def _split(size: int, segments: int, min_segment_size: int) -> List[List[int]]:
+    """Делит [0, size) на сегменты [pos, end] (end включительно)."""
+    count = max(1, min(segments, size // max(1, min_segment_size)))
+    step = -(-size // count)
+    return [[start, min(size, start + step) - 1] for start in range(0, size, step)]
+
+
+async def _probe(session: aiohttp.ClientSession, url: str) -> Tuple[Optional[int], bool]:
+    """Размер файла и поддержка Range по ответу на запрос первого байта."""
+    async with session.get(url, headers={"Range": "bytes=0-0"}, timeout=SEGMENT_TIMEOUT) as response:
+        if response.status in _EXPIRED_STATUSES:
+            raise _LinkExpired()
+        if response.status == 206:
+            match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+            if match:
+                return int(match.group(1)), True
+            return None, False
+        if response.status == 200:
+            length = response.headers.get("Content-Length")
+            return (int(length) if length else None), False
+        raise _RetryableError(f"HTTP {response.status}")
+
+
+async def download_ranged(
+    session: aiohttp.ClientSession,
+    get_link: LinkGetter,
+    save_path: str,
+    on_progress: Optional[ProgressCallback] = None,
+    segments: int = 4,
+    min_segment_size: int = 8 * 1024 * 1024,
+    max_retries: int = 5,
+    backoff_base: float = 1.0,
+    backoff_max: float = 30.0,
+    chunk_size: int = CHUNK_SIZE,
+    write_size: int = WRITE_SIZE,
+    buffer_size: int = BUFFER_SIZE,
+) -> bool:
+    """
+    Скачивает файл по прямой ссылке параллельными Range-сегментами.
+
+    Файл заранее создаётся нужного размера, каждый сегмент пишет в свою
+    область по смещению. Прогресс сегментов сохраняется в <файл>.part.json,
+    поэтому после ошибки, отмены или перезапуска загрузка продолжается
+    с места остановки. Истёкшая ссылка обновляется через get_link,
+    временные ошибки повторяются с экспоненциальной паузой.
+    Сервер без поддержки Range скачивается одним потоком, без докачки.
+
+    Запись на диск идёт в отдельном потоке (_FileWriter) блоками по write_size,
+    не более buffer_size байт в очереди.
+
+    Returns:
+        True при успехе; при ошибке пишет причину в лог и возвращает False
+        (частично скачанный файл остаётся для докачки).
+    """
+    save_path = Path(save_path)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    link = _Link(get_link)
+    if not await link.refresh(None):
+        return False
+
+    retry = dict(max_retries=max_retries, backoff_base=backoff_base, backoff_max=backoff_max)
+    sizes = dict(chunk_size=chunk_size, write_size=write_size)
+    max_pending = buffer_size // max(1, write_size)
+    probed: List[Tuple[Optional[int], bool]] = []
+
+    async def probe(url: str):
+        probed.append(await _probe(session, url))
+
+    try:
+        await _with_retries(link, probe, **retry)
+        size, ranges_supported = probed[-1]
+        if not ranges_supported or not size:
+            return await _download_whole(session, link, save_path, size or 0, on_progress, retry, max_pending, **sizes)
+
+        state = _load_state(save_path, size)
+        if state is None:
+            state = _split(size, segments, min_segment_size)
+            with open(save_path, "wb") as f:
+                f.truncate(size)
+        else:
+            logger.info(f"Докачка {save_path.name}: уже скачано {size - _remaining(state)} из {size} байт")
+
+        writer = _FileWriter(save_path, max_pending)
+        downloaded = [size - _remaining(state)]
+        last_save = [time.monotonic()]
+
+        async def on_written(n: int):
+            downloaded[0] += n
+            if time.monotonic() - last_save[0] >= _STATE_SAVE_INTERVAL:
+                last_save[0] = time.monotonic()
+                # В файл состояния попадают только позиции, уже записанные на диск
+                snapshot = [list(s) for s in state]
+                await writer.barrier()
+                _save_state(save_path, size, snapshot)
+            if on_progress:
+                await on_progress(downloaded[0], size)
+
+        async def fetch_segment(segment: List[int]):
+            async def op(url: str):
+                await _fetch_range(session, url, segment, writer, on_written, **sizes)
+
+            await _with_retries(link, op, progress=lambda: segment[0], **retry)
+
+        tasks = [asyncio.create_task(fetch_segment(s)) for s in state if s[0] <= s[1]]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Ошибка одного сегмента останавливает остальные; позиции сохраняются для докачки
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await writer.close()
+            if _remaining(state):
+                _save_state(save_path, size, state)
+
+        Path(f"{save_path}{STATE_SUFFIX}").unlink(missing_ok=True)
+        return True
+    except _RetryableError as e:
+        logger.error(f"Ошибка скачивания файла {save_path.name}: {e}")
+        return False
+    except Exception as e:
+        logger.exception(f"Исключение при скачивании файла {save_path.name}: {e}")
+        return False
+
+
+def _remaining(state: List[List[int]]) -> int:
+    return sum(end - pos + 1 for pos, end in state if pos <= end)
+
+
+async def _fetch_range(
+    session: aiohttp.ClientSession,
+    url: str,
+    segment: List[int],
+    writer: _FileWriter,
+    on_written,
+    chunk_size: int,
+    write_size: int,
+) -> None:
+    """
+    Дописывает сегмент [pos, end] с текущей позиции.
+
+    Чанки из сокета склеиваются в блоки по write_size; segment[0] сдвигается,
+    когда блок передан писателю. Полученное до обрыва тоже отдаётся на запись.
+    """
+    pending: List[bytes] = []
+    pending_size = 0
+
+    async def flush():
+        nonlocal pending, pending_size
+        if not pending_size:
+            return
+        data = b"".join(pending)
+        pending, pending_size = [], 0
+        await writer.write(segment[0], data)
+        segment[0] += len(data)
+        await on_written(len(data))
+
+    headers = {"Range": f"bytes={segment[0]}-{segment[1]}"}
+    try:
+        async with session.get(url, headers=headers, timeout=SEGMENT_TIMEOUT) as response:
+            if response.status in _EXPIRED_STATUSES:
+                raise _LinkExpired()
+            # 200 на первый сегмент допустим: тело с начала файла, лишнее обрезаем
+            if response.status != 206 and not (response.status == 200 and segment[0] == 0):
+                raise _RetryableError(f"HTTP {response.status}")
+
+            async for chunk in response.content.iter_chunked(chunk_size):
+                chunk = chunk[: segment[1] + 1 - segment[0] - pending_size]
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= write_size or segment[0] + pending_size > segment[1]:
+                    await flush()
+                if segment[0] > segment[1]:
+                    return
+    finally:
+        await flush()
+    if segment[0] <= segment[1]:
+        raise _RetryableError("соединение закрыто до конца сегмента")
+
+
+async def _download_whole(
+    session: aiohttp.ClientSession,
+    link: _Link,
+    save_path: Path,
+    total: int,
+    on_progress: Optional[ProgressCallback],
+    retry: dict,
+    max_pending: int,
+    chunk_size: int,
+    write_size: int,
+) -> bool:
+    """Скачивание одним запросом (сервер не поддерживает Range): повтор — с начала."""
+
+    async def op(url: str):
+        async with session.get(url, timeout=SEGMENT_TIMEOUT) as response:
+            if response.status in _EXPIRED_STATUSES:
+                raise _LinkExpired()
+            if response.status != 200:
+                raise _RetryableError(f"HTTP {response.status}")
+
+            open(save_path, "wb").close()
+            writer = _FileWriter(save_path, max_pending)
+            downloaded = 0
+            pending: List[bytes] = []
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    pending.append(chunk)
+                    if sum(map(len, pending)) >= write_size:
+                        data = b"".join(pending)
+                        pending = []
+                        await writer.write(downloaded, data)
+                        downloaded += len(data)
+                        if on_progress and total:
+                            await on_progress(downloaded, total)
+                if pending:
+                    data = b"".join(pending)
+                    await writer.write(downloaded, data)
+                    downloaded += len(data)
+            finally:
+                await writer.close()
+            if total and downloaded < total:
+                raise _RetryableError("соединение закрыто до конца файла")
+            if on_progress and total:
+                await on_progress(downloaded, total)
+
+    await _with_retries(link, op, **retry)
+    return True
@@ -0,0 +1,327 @@
+"""
+Модуль для постоянного хранения задач обработки (переживает перезапуск бота)
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Состояния видео по порядку прохождения этапов
+TASK_STATES = ("listed", "downloaded", "converted", "transcribed", "sent")
+# Конечные состояния: результат или ошибка уже отправлены в чат
+FINAL_STATES = ("sent", "failed")
+# Состояния, в которых видео ждёт обработки (его может взять процесс worker.py)
+PENDING_STATES = ("listed", "downloaded", "converted")
+
+# Поля задачи, которые можно обновлять вместе с состоянием
+_TASK_FIELDS = ("video_path", "audio_path", "text_path", "transcript", "error")
+
+
+def video_key(video: Dict) -> str:
+    """Идентификатор видео внутри ссылки (путь на Диске или ключ + путь в публичной папке)."""
+    if "public_key" in video:
+        return f"{video['public_key']}|{video.get('inner_path') or ''}"
+    return video.get("path", "")
+
+
+class JobStore:
+    """
+    Очередь задач в SQLite.
+
+    Каждая ссылка — задача (job) с чатом и id служебных сообщений,
+    каждое найденное видео — подзадача (task) со своим состоянием
+    и путями к промежуточным файлам. После перезапуска незавершённые
+    задачи (status = active) продолжаются с последнего пройденного этапа;
+    done, failed и cancelled — конечные статусы.
+
+    Та же база служит брокером между ботом и процессами worker.py:
+    воркер берёт видео в аренду (claim_task), продлевает её, пока
+    обрабатывает, и возвращает текст или ошибку (finish_task). Видео
+    упавшего воркера после истечения аренды достаётся другому.
+    """
+
+    def __init__(self, db_path: str = "cache/jobs.sqlite3"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # timeout — ожидание блокировки, когда с базой работают несколько процессов
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'active',
+                listing_done INTEGER NOT NULL DEFAULT 0,
+                status_message_id INTEGER,
+                progress_message_id INTEGER,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                idx INTEGER NOT NULL,
+                video_key TEXT NOT NULL,
+                video TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'listed',
+                video_path TEXT,
+                audio_path TEXT,
+                text_path TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                UNIQUE (job_id, video_key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+            """
+        )
+        # Колонки брокера: воркер и срок аренды, прогресс этапа и готовый текст
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        for name, definition in (
+            ("worker", "TEXT"),
+            ("lease_until", "REAL"),
+            ("step", "INTEGER NOT NULL DEFAULT 0"),
+            ("pct", "INTEGER NOT NULL DEFAULT 0"),
+            ("transcript", "TEXT"),
+        ):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+        # Приоритет задачи (меньше — раньше): воркеры берут её видео первыми
+        job_columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "priority" not in job_columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 1")
+        self._conn.commit()
+
+    @staticmethod
+    def _task_dict(row: sqlite3.Row) -> Dict:
+        task = dict(row)
+        task["video"] = json.loads(task["video"])
+        return task
+
+    # ── Задачи (ссылки) ──────────────────────────────────────────────────────
+
+    def create_job(self, chat_id: int, user_id: int, url: str, status_message_id: Optional[int] = None) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO jobs (chat_id, user_id, url, status_message_id, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, user_id, url, status_message_id, now, now),
+            )
+            self._conn.commit()
+            return cur.lastrowid
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished_jobs(self) -> List[Dict]:
+        """Задачи, прерванные перезапуском, в порядке поступления."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs WHERE status = 'active' ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def update_job(self, job_id: int, **fields) -> None:
+        """Обновляет status, listing_done, priority или id служебных сообщений."""
+        allowed = {
+            k: v for k, v in fields.items() if k in ("status", "listing_done", "priority", "progress_message_id")
+        }
+        if not allowed:
+            return
+        assignments = ", ".join(f"{k} = ?" for k in allowed)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*allowed.values(), time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def cancel_job(self, job_id: int) -> bool:
+        """Отменяет задачу, если она ещё в работе; её видео больше не выдаются воркерам."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'active'",
+                (time.time(), job_id),
+            )
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def job_statuses(self, job_ids: List[int]) -> Dict[int, str]:
+        """Текущие статусы задач — воркер так узнаёт об отмене видео, которые обрабатывает."""
+        if not job_ids:
+            return {}
+        marks = ", ".join("?" for _ in job_ids)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, status FROM jobs WHERE id IN ({marks})", list(job_ids)).fetchall()
+        return {job_id: status for job_id, status in rows}
+
+    def purge_finished(self, max_age_s: float = 7 * 24 * 3600) -> int:
+        """Удаляет завершённые задачи старше max_age_s; возвращает их число."""
+        cutoff = time.time() - max_age_s
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT id FROM jobs WHERE status != 'active' AND updated_at < ?", (cutoff,)
+            ).fetchall()]
+            for job_id in ids:
+                self._conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+        return len(ids)
+
+    # ── Подзадачи (видео) ────────────────────────────────────────────────────
+
+    def add_task(self, job_id: int, video: Dict, transcript: Optional[str] = None) -> Dict:
+        """
+        Регистрирует найденное видео и возвращает его подзадачу.
+
+        Повторный обход папки после перезапуска не создаёт дубликатов:
+        для уже известного видео возвращается существующая запись с её состоянием.
+        Если передан transcript (текст из кэша), видео сразу записывается
+        расшифрованным — воркеры его не возьмут. Уже известное видео, ещё
+        ждущее обработки и не взятое в аренду, тоже переводится в transcribed.
+        """
+        key = video_key(video)
+        now = time.time()
+        states = ", ".join(f"'{s}'" for s in PENDING_STATES)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM tasks WHERE job_id = ? AND video_key = ?", (job_id, key)
+            ).fetchone()
+            if row is None:
+                idx = self._conn.execute(
+                    "SELECT COALESCE(MAX(idx), 0) + 1 FROM tasks WHERE job_id = ?", (job_id,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO tasks (job_id, idx, video_key, video, state, transcript, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id, idx, key, json.dumps(video, ensure_ascii=False),
+                        "listed" if transcript is None else "transcribed", transcript, now,
+                    ),
+                )
+            elif transcript is not None:
+                # Одним UPDATE: видео, которое воркер уже взял, остаётся ему
+                self._conn.execute(
+                    f"UPDATE tasks SET state = 'transcribed', transcript = ?, updated_at = ? "
+                    f"WHERE id = ? AND state IN ({states}) AND (lease_until IS NULL OR lease_until < ?)",
+                    (transcript, now, row["id"], now),
+                )
+            else:
+                return self._task_dict(row)
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT * FROM tasks WHERE job_id = ? AND video_key = ?", (job_id, key)
+            ).fetchone()
+        return self._task_dict(row)
+
+    def tasks(self, job_id: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tasks WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        return [self._task_dict(row) for row in rows]
+
+    def update_task(self, task_id: int, state: str, **fields) -> None:
+        """Переводит видео в новое состояние и сохраняет пути к его файлам."""
+        allowed = {k: v for k, v in fields.items() if k in _TASK_FIELDS}
+        assignments = "".join(f", {k} = ?" for k in allowed)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE tasks SET state = ?{assignments}, updated_at = ? WHERE id = ?",
+                (state, *allowed.values(), time.time(), task_id),
+            )
+            self._conn.commit()
+
+    # ── Брокер для процессов worker.py ───────────────────────────────────────
+
+    def claim_task(self, worker: str, lease_s: float) -> Optional[Dict]:
+        """
+        Берёт в аренду следующее видео, ожидающее обработки.
+
+        Сначала — задачи с более высоким приоритетом (меньшее priority),
+        среди них первым обслуживается пользователь, у которого сейчас меньше
+        всего видео в работе, затем — более ранняя ссылка и порядок в списке.
+        Returns:
+            Подзадачу или None, если ждущих видео нет.
+        """
+        now = time.time()
+        states = ", ".join(f"'{s}'" for s in PENDING_STATES)
+        with self._lock:
+            # IMMEDIATE: два воркера не возьмут одно и то же видео
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"""
+                    SELECT t.*, j.user_id AS user_id, j.priority AS priority
+                    FROM tasks t JOIN jobs j ON j.id = t.job_id
+                    WHERE j.status = 'active' AND t.state IN ({states})
+                      AND (t.lease_until IS NULL OR t.lease_until < :now)
+                    ORDER BY j.priority, (
+                        SELECT COUNT(*) FROM tasks t2 JOIN jobs j2 ON j2.id = t2.job_id
+                        WHERE j2.user_id = j.user_id AND t2.state IN ({states}) AND t2.lease_until >= :now
+                    ), t.job_id, t.idx
+                    LIMIT 1
+                    """,
+                    {"now": now},
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE tasks SET worker = ?, lease_until = ? WHERE id = ?",
+                        (worker, now + lease_s, row["id"]),
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return self._task_dict(row) if row is not None else None
+
+    def renew_leases(self, task_ids: List[int], worker: str, lease_s: float) -> None:
+        """Продлевает аренду видео, которые воркер ещё обрабатывает."""
+        if not task_ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ?",
+                [(time.time() + lease_s, task_id, worker) for task_id in task_ids],
+            )
+            self._conn.commit()
+
+    def set_task_progress(self, task_id: int, step: int, pct: int) -> None:
+        """Этап (1..3) и процент внутри него — бот показывает их в сообщении с прогрессом."""
+        with self._lock:
+            self._conn.execute("UPDATE tasks SET step = ?, pct = ? WHERE id = ?", (step, pct, task_id))
+            self._conn.commit()
+
+    def finish_task(self, task_id: int, state: str, transcript: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Возвращает результат воркера ("transcribed" с текстом или "failed" с ошибкой) и снимает аренду."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, transcript = ?, error = ?, worker = NULL, lease_until = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (state, transcript, error, time.time(), task_id),
+            )
+            self._conn.commit()
+
+    def release_task(self, task_id: int) -> None:
+        """Снимает аренду без результата (воркер останавливается) — видео возьмёт другой воркер."""
+        with self._lock:
+            self._conn.execute("UPDATE tasks SET worker = NULL, lease_until = NULL WHERE id = ?", (task_id,))
+            self._conn.commit()
+
+    def counts(self, job_id: int) -> Dict[str, int]:
+        """Число видео задачи в каждом состоянии."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY state", (job_id,)
+            ).fetchall()
+        return {state: count for state, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
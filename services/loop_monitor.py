@@ -0,0 +1,54 @@
+"""
+Модуль для измерения задержки event loop
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class LoopLagMonitor:
+    """
+    Измеряет, насколько позже запланированного просыпается asyncio.sleep(interval).
+
+    Задержка растёт, когда кто-то блокирует event loop (синхронная запись
+    на диск, тяжёлые вычисления): в это время бот не отвечает в Telegram
+    и не обслуживает другие загрузки. Хранятся последние window замеров.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 3000):
+        self.interval = interval
+        self._samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self._samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def reset(self) -> None:
+        self._samples.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Средняя, 99-й перцентиль и максимальная задержка в миллисекундах."""
+        if not self._samples:
+            return {"samples": 0, "avg_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self._samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return {
+            "samples": len(ordered),
+            "avg_ms": 1000 * sum(ordered) / len(ordered),
+            "p99_ms": 1000 * p99,
+            "max_ms": 1000 * ordered[-1],
+        }
@@ -0,0 +1,200 @@
+"""
+Модуль для кэширования метаданных Яндекс.Диска (листинги папок, информация о ресурсах)
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "stamp", "stored_at")
+
+    def __init__(self, value: Any, stamp: Optional[str], stored_at: float):
+        self.value = value
+        self.stamp = stamp
+        self.stored_at = stored_at
+
+
+class MetadataCache:
+    """
+    Кэш ответов API с временем жизни и проверкой актуальности.
+
+    Запись свежая ttl секунд после сохранения или последнего подтверждения.
+    Устаревшую запись можно подтвердить без повторного запроса — если метка
+    ресурса (revision / modified) совпала с сохранённой: confirm().
+    В памяти держится не больше max_entries записей (LRU); при заданном
+    db_path записи дублируются в SQLite и переживают перезапуск. Изменения
+    копятся в памяти и пишутся в базу пачкой в пуле потоков (flush), а записи,
+    которые не подтверждались дольше max_age секунд, удаляются из базы.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_entries: int = 5000,
+        db_path: Optional[str] = None,
+        max_age: float = 7 * 24 * 3600,
+    ):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_age = max_age
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Записи, ещё не сохранённые в SQLite
+        self._dirty: Dict[str, _Entry] = {}
+
+        # hits — свежие попадания, revalidated — устаревшие записи, подтверждённые
+        # по метке без скачивания листинга, misses — значения, загруженные из API
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            path = Path(db_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stamp TEXT,
+                    stored_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS metadata_stored_at ON metadata (stored_at)")
+            self._prune()
+            self._conn.commit()
+
+    def _prune(self) -> None:
+        """Удаляет записи старше max_age: устаревшую так давно запись уже не подтверждают."""
+        self._conn.execute("DELETE FROM metadata WHERE stored_at < ?", (time.time() - self.max_age,))
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        """Запись из памяти или с диска (с переносом в память)."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        if self._conn is None:
+            return None
+        entry = self._dirty.get(key)
+        if entry is not None:
+            self._remember(key, entry)
+            return entry
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stamp, stored_at FROM metadata WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = _Entry(json.loads(row[0]), row[1], row[2])
+        self._remember(key, entry)
+        self.disk_hits += 1
+        return entry
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Свежее значение или None (промах либо запись устарела)."""
+        entry = self._lookup(key)
+        if entry is not None and time.time() - entry.stored_at < self.ttl:
+            self.hits += 1
+            return entry.value
+        return None
+
+    def get_stale(self, key: str) -> Optional[Tuple[Any, Optional[str]]]:
+        """Значение и метка независимо от возраста записи — для проверки актуальности."""
+        entry = self._lookup(key)
+        return (entry.value, entry.stamp) if entry is not None else None
+
+    def confirm(self, key: str, stamp: Optional[str]) -> bool:
+        """
+        Продлевает запись, если её метка совпадает со stamp (ресурс не менялся).
+
+        Returns:
+            True, если запись есть и подтверждена.
+        """
+        entry = self._lookup(key)
+        if entry is None or stamp is None or entry.stamp != stamp:
+            return False
+        entry.stored_at = time.time()
+        self._mark(key, entry)
+        self.revalidated += 1
+        return True
+
+    def put(self, key: str, value: Any, stamp: Optional[str] = None) -> None:
+        """Сохраняет значение, загруженное из API (учитывается как промах)."""
+        self.misses += 1
+        entry = _Entry(value, stamp, time.time())
+        self._remember(key, entry)
+        self._mark(key, entry)
+
+    def _mark(self, key: str, entry: _Entry) -> None:
+        if self._conn is not None:
+            self._dirty[key] = entry
+
+    def _take_dirty(self) -> List[Tuple[str, str, Optional[str], float]]:
+        """Строки для записи в базу (снимок на момент вызова) и очистка очереди."""
+        rows = [
+            (key, json.dumps(entry.value, ensure_ascii=False), entry.stamp, entry.stored_at)
+            for key, entry in self._dirty.items()
+        ]
+        self._dirty = {}
+        return rows
+
+    def _write(self, rows: List[Tuple[str, str, Optional[str], float]]) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO metadata (key, value, stamp, stored_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._prune()
+            self._conn.commit()
+
+    async def flush(self) -> None:
+        """Сохраняет изменённые записи в SQLite одной транзакцией, не блокируя event loop."""
+        if not self._dirty:
+            return
+        rows = self._take_dirty()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, rows)
+        except sqlite3.Error as e:
+            # Кэш в памяти продолжает работать, только эти записи не переживут перезапуск
+            logger.warning(f"Не удалось сохранить кэш метаданных: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Попадания, подтверждения по метке, промахи и размер кэша в памяти."""
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            if self._dirty:
+                self._write(self._take_dirty())
+            with self._lock:
+                self._conn.close()
+            self._conn = None
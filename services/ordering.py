@@ -0,0 +1,99 @@
+"""
+Модуль порядка обработки: сначала короткие видео (shortest job first)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, List, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def shortest_first(
+    source: AsyncIterable[T],
+    cost: Callable[[T], Awaitable[float]],
+    lookahead: int = 100,
+    settle: float = 2.0,
+    concurrency: int = 4,
+) -> AsyncIterator[T]:
+    """
+    Отдаёт элементы source по возрастанию оценки cost(item).
+
+    source читается наперёд (не больше lookahead элементов в буфере),
+    и следующим отдаётся самый дешёвый из уже найденных — так большой файл
+    в начале листинга не задерживает первые результаты. Перед первым
+    элементом ждёт до settle секунд, пока листинг наполнит буфер; дальше
+    отдаёт сразу, поскольку конвейер и так разбирает элементы медленнее,
+    чем идёт обход. Оценки считаются параллельно (не больше concurrency);
+    упавшая оценка ставит элемент в конец. Ошибка source пробрасывается
+    после выдачи уже найденных элементов.
+    """
+    loop = asyncio.get_running_loop()
+    # (стоимость, порядок поступления, элемент): при равной стоимости — порядок листинга
+    heap: List[Tuple[float, int, T]] = []
+    arrival = itertools.count()
+    # Место в буфере: элементы в куче и те, чья стоимость ещё считается
+    space = asyncio.Semaphore(max(1, lookahead))
+    estimating = asyncio.Semaphore(max(1, concurrency))
+    ready = asyncio.Event()
+    estimates: set = set()
+    source_errors: List[Exception] = []
+    finished = False
+
+    async def estimate(seq: int, item: T) -> None:
+        try:
+            value = await cost(item)
+        except Exception as e:
+            logger.warning(f"Не удалось оценить стоимость элемента: {e}")
+            value = math.inf
+        finally:
+            estimating.release()
+        heapq.heappush(heap, (value, seq, item))
+        ready.set()
+
+    async def fill() -> None:
+        nonlocal finished
+        try:
+            async for item in source:
+                await space.acquire()
+                await estimating.acquire()
+                task = asyncio.create_task(estimate(next(arrival), item))
+                estimates.add(task)
+                task.add_done_callback(estimates.discard)
+        except Exception as e:
+            source_errors.append(e)
+        # Уже найденные элементы дооцениваются и при ошибке листинга
+        await asyncio.gather(*list(estimates))
+        finished = True
+        ready.set()
+
+    filler = asyncio.create_task(fill())
+    deadline = loop.time() + settle
+    try:
+        while True:
+            # Ждём, пока буфер наполнится: до конца листинга, lookahead элементов или settle
+            while not finished and (not heap or (len(heap) < lookahead and loop.time() < deadline)):
+                ready.clear()
+                try:
+                    await asyncio.wait_for(ready.wait(), None if not heap else deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+            if not heap:
+                if finished:
+                    break
+                continue
+            _, _, item = heapq.heappop(heap)
+            space.release()
+            yield item
+    finally:
+        filler.cancel()
+        for task in list(estimates):
+            task.cancel()
+        await asyncio.gather(filler, *estimates, return_exceptions=True)
+
+    if source_errors:
+        raise source_errors[0]
@@ -0,0 +1,159 @@
+"""
+Модуль конвейерной обработки: этапы с ограниченными очередями и параллелизмом
+"""
+import asyncio
+from typing import Any, AsyncIterable, Awaitable, Callable, List, Optional, Set
+
+
+class StageFailed(Exception):
+    """Этап не смог обработать элемент; текст исключения показывается пользователю."""
+
+
+class Stage:
+    """Один этап конвейера: корутина func(item) -> item с заданным параллелизмом."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Awaitable[Any]],
+        concurrency: int = 1,
+        queue_size: Optional[int] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        # Размер входной очереди этапа (по умолчанию — по числу воркеров)
+        self.queue_size = queue_size if queue_size is not None else self.concurrency
+
+
+# sink(item, error) вызывается строго в порядке поступления элементов
+Sink = Callable[[Any, Optional[BaseException]], Awaitable[None]]
+
+_STOP = object()
+
+
+class Pipeline:
+    """
+    Прогоняет элементы через последовательность этапов.
+
+    Каждый этап работает в своих воркерах и читает из своей ограниченной очереди,
+    поэтому сеть, ffmpeg и модель заняты одновременно. Результаты отдаются в sink
+    в исходном порядке (ordered=False — сразу по готовности); элемент, упавший
+    на одном из этапов, пропускает остальные и попадает в sink вместе с исключением. Ошибка самого source пробрасывается
+    из run после того, как уже запущенные элементы дойдут до sink.
+
+    Элемент, для которого ready(item) истинно (например, результат уже есть
+    в кэше), минует этапы и не занимает место в окне max_in_flight, но
+    попадает в sink в том же порядке, что и остальные.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        max_in_flight: Optional[int] = None,
+        ordered: bool = True,
+        ready: Optional[Callable[[Any], bool]] = None,
+    ):
+        if not stages:
+            raise ValueError("Конвейер должен содержать хотя бы один этап")
+        self.stages = stages
+        # Сколько элементов может одновременно находиться внутри конвейера
+        # (ограничивает буфер переупорядочивания и место на диске)
+        self.max_in_flight = max_in_flight or sum(s.concurrency + s.queue_size for s in stages)
+        self.ordered = ordered
+        self.ready = ready
+
+    async def run(self, source: AsyncIterable, sink: Sink) -> None:
+        """Обрабатывает все элементы source и дожидается их выдачи в sink."""
+        queues = [asyncio.Queue(maxsize=s.queue_size) for s in self.stages]
+        out_queue: asyncio.Queue = asyncio.Queue()
+        window = asyncio.Semaphore(self.max_in_flight)
+
+        source_errors: List[Exception] = []
+        # Индексы готовых элементов, прошедших мимо этапов (без места в окне)
+        bypassed: Set[int] = set()
+
+        def release(index: int) -> None:
+            if index in bypassed:
+                bypassed.discard(index)
+            else:
+                window.release()
+
+        async def feeder():
+            index = 0
+            try:
+                async for item in source:
+                    if self.ready is not None and self.ready(item):
+                        bypassed.add(index)
+                        await out_queue.put((index, item, None))
+                    else:
+                        await window.acquire()
+                        await queues[0].put((index, item, None))
+                    index += 1
+            except Exception as e:
+                # Уже запущенные элементы дорабатываются, ошибка — после них
+                source_errors.append(e)
+            finally:
+                for _ in range(self.stages[0].concurrency):
+                    await queues[0].put(_STOP)
+
+        async def run_stage(stage_idx: int):
+            stage = self.stages[stage_idx]
+            in_queue = queues[stage_idx]
+            next_queue = queues[stage_idx + 1] if stage_idx + 1 < len(queues) else out_queue
+
+            async def worker():
+                while True:
+                    entry = await in_queue.get()
+                    if entry is _STOP:
+                        return
+                    index, item, error = entry
+                    if error is None:
+                        try:
+                            item = await stage.func(item)
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception as e:
+                            error = e
+                    await next_queue.put((index, item, error))
+
+            await asyncio.gather(*(worker() for _ in range(stage.concurrency)))
+
+            # Все воркеры этапа завершились — закрываем следующий этап
+            stops = self.stages[stage_idx + 1].concurrency if stage_idx + 1 < len(queues) else 1
+            for _ in range(stops):
+                await next_queue.put(_STOP)
+
+        async def collector():
+            buffer = {}
+            next_index = 0
+            while True:
+                entry = await out_queue.get()
+                if entry is _STOP:
+                    break
+                index, item, error = entry
+                if not self.ordered:
+                    try:
+                        await sink(item, error)
+                    finally:
+                        release(index)
+                    continue
+                buffer[index] = (item, error)
+                while next_index in buffer:
+                    ready_item, ready_error = buffer.pop(next_index)
+                    try:
+                        await sink(ready_item, ready_error)
+                    finally:
+                        release(next_index)
+                    next_index += 1
+
+        tasks = [asyncio.create_task(feeder()), asyncio.create_task(collector())]
+        tasks += [asyncio.create_task(run_stage(i)) for i in range(len(self.stages))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if source_errors:
+            raise source_errors[0]
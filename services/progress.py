@@ -0,0 +1,112 @@
+"""
+Модуль для обновления сообщений с прогрессом с общим лимитом правок
+"""
+import asyncio
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+class _Entry:
+    def __init__(self, message, render: Callable[[], str]):
+        self.message = message
+        self.render = render
+        self.dirty = True
+        self.last_edit = 0.0
+        self.last_text = ""
+
+
+class ProgressUpdater:
+    """
+    Единая очередь правок сообщений с прогрессом.
+
+    Задачи лишь помечают сообщение «изменилось» (update — дёшево и без await),
+    а фоновая задача правит сообщения: не чаще edits_per_second в сумме по всем
+    задачам и не чаще раза в min_interval секунд для одного сообщения.
+    Между правками обновления склеиваются — отправляется только последний текст.
+    При flood control (исключение с retry_after) все правки приостанавливаются.
+    """
+
+    def __init__(self, edits_per_second: float = 5.0, min_interval: float = 3.0):
+        self.edits_per_second = edits_per_second
+        self.min_interval = min_interval
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+
+        self.edits_sent = 0
+        self.updates_coalesced = 0
+
+    @staticmethod
+    def _key(message) -> Hashable:
+        # message — любой объект с chat_id, message_id и корутиной edit_text(text)
+        return message.chat_id, message.message_id
+
+    def update(self, message, render: Callable[[], str]) -> None:
+        """Помечает сообщение для перерисовки; render вызывается в момент правки."""
+        key = self._key(message)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = _Entry(message, render)
+        else:
+            if entry.dirty:
+                self.updates_coalesced += 1
+            entry.render = render
+            entry.dirty = True
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def discard(self, message) -> None:
+        """Убирает сообщение из очереди (например, перед финальной правкой)."""
+        self._entries.pop(self._key(message), None)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _next_ready(self, now: float) -> Optional[_Entry]:
+        """Грязное сообщение, дольше всех ждущее правки и выдержавшее min_interval."""
+        ready = [e for e in self._entries.values() if e.dirty and now - e.last_edit >= self.min_interval]
+        return min(ready, key=lambda e: e.last_edit) if ready else None
+
+    async def _run(self) -> None:
+        interval = 1.0 / self.edits_per_second
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            entry = self._next_ready(now)
+            if entry is None:
+                self._wakeup.clear()
+                # Ждём нового обновления или истечения min_interval у ждущих
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            entry.dirty = False
+            entry.last_edit = now
+            text = entry.render()
+            if text != entry.last_text:
+                await self._edit(entry, text)
+            await asyncio.sleep(interval)
+
+    async def _edit(self, entry: _Entry, text: str) -> None:
+        try:
+            await entry.message.edit_text(text)
+            entry.last_text = text
+            self.edits_sent += 1
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after:
+                # Telegram flood control — ждём и повторяем правку позже
+                self._paused_until = time.monotonic() + float(retry_after)
+                entry.dirty = True
+            # Остальные ошибки (например, «message is not modified») игнорируем
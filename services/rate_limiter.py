@@ -0,0 +1,55 @@
+"""
+Модуль для ограничения частоты запросов (token bucket)
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты: в среднем rate запросов в секунду, всплеск до capacity.
+
+    Ожидающие обслуживаются по очереди. pause() останавливает выдачу
+    для всех на заданное время — так ответ 429 с Retry-After от одного
+    запроса притормаживает и все остальные.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Запрещает выдачу токенов на seconds секунд (например, по Retry-After)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        # После паузы — без накопленного всплеска, токены копятся заново
+        self._tokens = 0.0
+        self._updated = self._blocked_until
+
+    async def acquire(self) -> float:
+        """Ждёт свободный токен; возвращает время ожидания в секундах."""
+        started = time.monotonic()
+        if self.rate <= 0:
+            # Без лимита частоты пауза по Retry-After всё равно действует
+            while time.monotonic() < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - time.monotonic())
+            return time.monotonic() - started
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return time.monotonic() - started
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,178 @@
+"""
+Модуль для справедливого распределения общих ресурсов между пользователями
+"""
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Hashable, List, Tuple
+
+# Уровни приоритета заявок: меньшее значение обслуживается раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class _Waiter:
+    __slots__ = ("amount", "future")
+
+    def __init__(self, amount: int, future: asyncio.Future):
+        self.amount = amount
+        self.future = future
+
+
+class _Resource:
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        # Очереди ожидающих по (приоритет, пользователь); порядок ключей — порядок обхода
+        self.queues: "OrderedDict[Tuple[int, Hashable], Deque[_Waiter]]" = OrderedDict()
+
+    def head(self) -> Tuple[int, Hashable]:
+        """Следующая очередь: первая в круге среди очередей с наивысшим приоритетом."""
+        return min(self.queues, key=lambda key: key[0])
+
+    def order(self) -> List[Tuple[int, Hashable]]:
+        """Порядок, в котором очереди получат место."""
+        return sorted(self.queues, key=lambda key: key[0])
+
+
+class FairScheduler:
+    """
+    Общие лимиты ресурсов с обслуживанием пользователей по кругу.
+
+    Ресурс — именованный пул ёмкостью capacity: число одновременных скачиваний,
+    процессов ffmpeg, задач Whisper или байт во временной папке. Заявки одного
+    пользователя выполняются по порядку, а освободившееся место достаётся
+    следующему пользователю в круге — пользователь с большой папкой не
+    задерживает того, кто прислал одно видео.
+
+    Заявки с более высоким приоритетом (например, ссылка на один файл)
+    обслуживаются раньше остальных; внутри уровня — тот же круг по пользователям.
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self._resources = {name: _Resource(capacity) for name, capacity in limits.items()}
+        self._listeners: List[Callable[[], None]] = []
+
+    def add_resource(self, name: str, capacity: int) -> None:
+        self._resources[name] = _Resource(capacity)
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """callback() вызывается при каждом изменении очередей (для позиций в очереди)."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        try:
+            self._listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def _notify(self) -> None:
+        for callback in list(self._listeners):
+            callback()
+
+    def _dispatch(self, resource: _Resource) -> None:
+        """Выдаёт освободившееся место ожидающим по кругу."""
+        granted = False
+        while resource.queues:
+            key = resource.head()
+            queue = resource.queues[key]
+            waiter = queue[0]
+            if waiter.future.done():
+                # Заявку отменили, но её задача ещё не успела убрать себя из очереди
+                self._pop(resource, key, queue)
+                continue
+            # Первый в круге не помещается — ждёт, чтобы не голодать из-за мелких заявок
+            if resource.in_use + waiter.amount > resource.capacity:
+                break
+            resource.in_use += waiter.amount
+            waiter.future.set_result(None)
+            self._pop(resource, key, queue)
+            granted = True
+        if granted:
+            self._notify()
+
+    @staticmethod
+    def _pop(resource: _Resource, key: Tuple[int, Hashable], queue: Deque[_Waiter]) -> None:
+        """Убирает первую заявку очереди; очередь уходит в конец круга или удаляется."""
+        queue.popleft()
+        if queue:
+            resource.queues.move_to_end(key)
+        else:
+            del resource.queues[key]
+
+    async def acquire(self, name: str, user: Hashable, amount: int = 1, priority: int = PRIORITY_NORMAL) -> int:
+        """
+        Ждёт место в ресурсе name для пользователя user.
+
+        Заявка больше ёмкости ресурса урезается до ёмкости (выполнится одна).
+        Среди ожидающих первыми обслуживаются заявки с меньшим priority.
+        Returns:
+            Занятый объём — его нужно вернуть через release().
+        """
+        resource = self._resources[name]
+        amount = max(0, min(amount, resource.capacity))
+        if not resource.queues and resource.in_use + amount <= resource.capacity:
+            resource.in_use += amount
+            return amount
+
+        waiter = _Waiter(amount, asyncio.get_running_loop().create_future())
+        key = (priority, user)
+        queue = resource.queues.get(key)
+        if queue is None:
+            queue = resource.queues[key] = deque()
+        queue.append(waiter)
+        self._notify()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Место выдано одновременно с отменой — возвращаем его
+                self.release(name, amount)
+            else:
+                # Заявку могла уже убрать _dispatch при чужом release()
+                if waiter in queue:
+                    queue.remove(waiter)
+                if not queue and resource.queues.get(key) is queue:
+                    del resource.queues[key]
+                # Снятая заявка могла загораживать меньшие за ней
+                self._dispatch(resource)
+                self._notify()
+            raise
+        return amount
+
+    def release(self, name: str, amount: int = 1) -> None:
+        resource = self._resources[name]
+        resource.in_use = max(0, resource.in_use - amount)
+        self._dispatch(resource)
+
+    @asynccontextmanager
+    async def slot(
+        self, name: str, user: Hashable, amount: int = 1, priority: int = PRIORITY_NORMAL
+    ) -> AsyncIterator[None]:
+        amount = await self.acquire(name, user, amount, priority)
+        try:
+            yield
+        finally:
+            self.release(name, amount)
+
+    def position(self, name: str, user: Hashable) -> int:
+        """
+        Через сколько выдач подойдёт первая заявка пользователя (1 — следующая).
+
+        0 — у пользователя нет ожидающих заявок в этом ресурсе.
+        """
+        for position, (_, waiting_user) in enumerate(self._resources[name].order(), 1):
+            if waiting_user == user:
+                return position
+        return 0
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Занято, ёмкость и число ожидающих заявок по каждому ресурсу."""
+        return {
+            name: {
+                "in_use": resource.in_use,
+                "capacity": resource.capacity,
+                "waiting": sum(len(q) for q in resource.queues.values()),
+            }
+            for name, resource in self._resources.items()
+        }
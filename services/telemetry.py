@@ -0,0 +1,209 @@
+"""
+Модуль оперативной телеметрии обработки: текущая очередь видео и статистика за последний час
+"""
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Optional
+
+# Этапы, по которым оценивается оставшееся время (шаги прогресса 1..3)
+STAGES = ("download", "ffmpeg", "whisper")
+
+
+class _Entry:
+    __slots__ = ("job_id", "user_id", "name", "size", "step", "pct", "waiting", "queued_at", "stage_times", "mark")
+
+    def __init__(self, job_id: int, user_id: int, name: str, size: int):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.name = name
+        self.size = size
+        # 0 — ждёт начала, 1..3 — этап из STAGES
+        self.step = 0
+        self.pct = 0
+        # Ресурс, места в котором видео ждёт (None — работает)
+        self.waiting: Optional[str] = None
+        self.queued_at = time.time()
+        # Время работы каждого этапа без ожидания мест в общих ресурсах
+        self.stage_times: Dict[str, float] = {}
+        # Начало текущего отрезка работы (None — этап не идёт или видео ждёт)
+        self.mark: Optional[float] = None
+
+    def close_segment(self, now: float) -> None:
+        if self.mark is not None and self.step:
+            stage = STAGES[self.step - 1]
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + now - self.mark
+        self.mark = None
+
+
+class _Record:
+    __slots__ = ("ts", "size", "stages", "audio_s", "ok", "cached")
+
+    def __init__(self, size: int, stages: Dict[str, float], audio_s: float, ok: bool, cached: bool):
+        self.ts = time.time()
+        self.size = size
+        self.stages = stages
+        self.audio_s = audio_s
+        self.ok = ok
+        self.cached = cached
+
+
+class Telemetry:
+    """
+    Состояние видео в работе и итоги завершённых за последние window_s секунд.
+
+    Обновления — присваивания полей в словаре, их можно вызывать на каждое
+    изменение прогресса. Время этапов измеряется по смене шага прогресса
+    без интервалов ожидания мест (set_waiting), поэтому одинаково работает
+    и в боте, и по прогрессу, который пишут процессы worker.py.
+
+    Оставшееся время считается по измеренной скорости
+    этапов: секунды этапа на байт видео за окно, умноженные на размер, и
+    параллелизм этапа — самый загруженный этап определяет, когда освободится
+    место для следующих видео.
+    """
+
+    def __init__(self, window_s: float = 3600.0):
+        self.window_s = window_s
+        self._active: Dict[Hashable, _Entry] = {}
+        self._records: Deque[_Record] = deque()
+        self._started = time.time()
+
+    # ── Обновления из конвейера ──────────────────────────────────────────────
+
+    def queued(self, key: Hashable, job_id: int, user_id: int, name: str, size: int) -> None:
+        """Видео найдено и ждёт обработки."""
+        if key not in self._active:
+            self._active[key] = _Entry(job_id, user_id, name, size)
+
+    def update(self, key: Hashable, step: int, pct: int) -> None:
+        entry = self._active.get(key)
+        if entry is None:
+            return
+        now = time.time()
+        if step != entry.step:
+            entry.close_segment(now)
+            entry.step = step
+        if pct >= 100:
+            # Этап закончен — дальше видео ждёт в очереди следующего этапа
+            entry.close_segment(now)
+        elif entry.mark is None and entry.waiting is None:
+            entry.mark = now
+        entry.pct = pct
+
+    def set_waiting(self, key: Hashable, resource: Optional[str]) -> None:
+        entry = self._active.get(key)
+        if entry is None:
+            return
+        now = time.time()
+        if resource is not None:
+            entry.close_segment(now)
+        elif entry.step:
+            entry.mark = now
+        entry.waiting = resource
+
+    def finish(self, key: Hashable, ok: bool, cached: bool = False, audio_s: float = 0.0) -> None:
+        """Видео готово (или упало): время его этапов идёт в статистику окна."""
+        entry = self._active.pop(key, None)
+        if entry is None:
+            return
+        entry.close_segment(time.time())
+        self._records.append(_Record(entry.size, entry.stage_times, audio_s, ok, cached))
+        self._trim()
+
+    def drop_job(self, job_id: int) -> None:
+        """Убирает оставшиеся видео задачи (задача прервана) без записи в статистику."""
+        for key in [key for key, entry in self._active.items() if entry.job_id == job_id]:
+            del self._active[key]
+
+    def _trim(self) -> None:
+        cutoff = time.time() - self.window_s
+        while self._records and self._records[0].ts < cutoff:
+            self._records.popleft()
+
+    # ── Оценки ───────────────────────────────────────────────────────────────
+
+    def stage_rates(self) -> Dict[str, float]:
+        """Секунды этапа на байт видео по успешным видео за окно (без взятых из кэша)."""
+        self._trim()
+        rates = {}
+        for stage in STAGES:
+            seconds = 0.0
+            size = 0
+            for record in self._records:
+                if record.ok and not record.cached and stage in record.stages and record.size:
+                    seconds += record.stages[stage]
+                    size += record.size
+            if size:
+                rates[stage] = seconds / size
+        return rates
+
+    def queue(self, capacities: Dict[str, int]) -> List[Dict]:
+        """
+        Видео в работе и ожидающие — в порядке поступления — с оценкой,
+        через сколько секунд каждое будет готово (None — ещё нет замеров).
+
+        capacities — число одновременных видео на каждом этапе из STAGES.
+        """
+        rates = self.stage_rates()
+        # Этапа может не быть вовсе (потоковый режим — без скачивания файла)
+        known = bool(rates)
+        # Работа, накопленная на каждом этапе перед текущим видео
+        backlog = {stage: 0.0 for stage in STAGES}
+        # Сначала видео, которые уже идут, затем ожидающие
+        entries = sorted(self._active.values(), key=lambda e: (e.step == 0, e.queued_at))
+
+        result = []
+        for entry in entries:
+            eta = None
+            if known and entry.size:
+                own = 0.0
+                for i, stage in enumerate(STAGES, start=1):
+                    if i < entry.step:
+                        continue
+                    remaining = rates.get(stage, 0.0) * entry.size
+                    if i == entry.step:
+                        remaining *= 1 - entry.pct / 100
+                    backlog[stage] += remaining
+                    own += remaining
+                # Этапы одного видео идут подряд, а очередь упирается в самый загруженный этап
+                eta = max(own, *(backlog[stage] / max(1, capacities.get(stage, 1)) for stage in STAGES))
+            result.append({
+                "job_id": entry.job_id,
+                "user_id": entry.user_id,
+                "name": entry.name,
+                "size": entry.size,
+                "step": entry.step,
+                "pct": entry.pct,
+                "waiting": entry.waiting,
+                "eta_s": eta,
+            })
+        return result
+
+    def summary(self) -> Dict:
+        """Итоги за окно: число видео, объём, длительность аудио и realtime factor."""
+        self._trim()
+        records = list(self._records)
+        ok = [r for r in records if r.ok]
+        processed = [r for r in ok if not r.cached]
+        whisper_s = sum(r.stages.get("whisper", 0.0) for r in processed)
+        audio_s = sum(r.audio_s for r in processed)
+        stage_means: Dict[str, float] = {}
+        for stage in STAGES:
+            values = [r.stages[stage] for r in processed if stage in r.stages]
+            if values:
+                stage_means[stage] = sum(values) / len(values)
+        # Скорость — за реально прошедшее время, если бот работает меньше окна
+        span = min(self.window_s, time.time() - self._started)
+        return {
+            "window_s": self.window_s,
+            "videos": len(ok),
+            "failed": len(records) - len(ok),
+            "cached": len(ok) - len(processed),
+            "bytes": sum(r.size for r in processed),
+            "audio_s": audio_s,
+            "rtf": whisper_s / audio_s if audio_s else None,
+            "stage_means": stage_means,
+            "videos_per_hour": len(ok) * 3600 / span if span >= 60 else None,
+            "active": sum(1 for e in self._active.values() if e.step),
+            "pending": sum(1 for e in self._active.values() if not e.step),
+        }
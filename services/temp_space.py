@@ -0,0 +1,93 @@
+"""
+Модуль для учёта места во временной папке
+"""
+import logging
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from services.scheduler import FairScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class TempSpace:
+    """
+    Квота временной папки поверх общего FairScheduler.
+
+    Регистрирует в планировщике ресурс resource, ёмкость которого — quota_bytes,
+    но не больше, чем реально помещается на том с запасом min_free_bytes.
+    Место резервируется по размеру из листинга до начала скачивания, и при
+    исчерпанной квоте скачивание ждёт (scheduler.acquire(resource, ...)),
+    а не падает с «No space left on device» посреди записи.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        quota_bytes: int,
+        scheduler: FairScheduler,
+        resource: str = "temp",
+        min_free_bytes: int = 0,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.resource = resource
+        self._scheduler = scheduler
+
+        # Удаление файлов внутри папки не меняет used + free, поэтому ёмкость
+        # можно посчитать один раз — до очистки осиротевших файлов
+        available = self.on_disk() + shutil.disk_usage(self.root).free - min_free_bytes
+        self.capacity = max(1, min(quota_bytes, available))
+        scheduler.add_resource(resource, self.capacity)
+
+    def on_disk(self) -> int:
+        """Фактический размер файлов во временной папке, байты."""
+        total = 0
+        for path in self.root.rglob("*"):
+            try:
+                if path.is_file():
+                    total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def cleanup_orphans(self, keep_prefixes: Iterable[str] = ()) -> Tuple[int, int]:
+        """
+        Удаляет файлы, оставшиеся от прошлых запусков (например, после падения).
+
+        Файлы с именами на keep_prefixes (незавершённые задачи, которые
+        продолжатся) сохраняются. Вызывать до начала новых задач.
+
+        Returns:
+            (число удалённых файлов, освобождено байт)
+        """
+        keep = tuple(keep_prefixes)
+        removed = freed = 0
+        for path in self.root.iterdir():
+            if keep and path.name.startswith(keep):
+                continue
+            try:
+                if path.is_dir():
+                    size = sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+                    shutil.rmtree(path)
+                else:
+                    size = path.stat().st_size
+                    path.unlink()
+            except OSError as e:
+                logger.warning(f"Не удалось удалить временный файл {path}: {e}")
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def usage(self) -> Dict[str, int]:
+        """Квота, зарезервировано, фактически занято и свободно на томе (байты)."""
+        stats = self._scheduler.stats()[self.resource]
+        return {
+            "capacity": self.capacity,
+            "reserved": stats["in_use"],
+            "waiting": stats["waiting"],
+            "on_disk": self.on_disk(),
+            "free": shutil.disk_usage(self.root).free,
+        }
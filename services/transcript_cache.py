@@ -0,0 +1,116 @@
+"""
+Модуль для кэширования транскрипций по хэшу содержимого файла
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class TranscriptCache:
+    """
+    Постоянный кэш транскрипций в SQLite.
+
+    Ключ — хэш содержимого из листинга Диска (sha256, иначе md5 + размер),
+    размер модели и язык: переименованный или повторно присланный файл
+    не транскрибируется заново. При превышении max_bytes вытесняются
+    давно не использованные записи (LRU).
+    """
+
+    def __init__(self, db_path: str = "cache/transcripts.sqlite3", max_bytes: int = 200 * 1024 * 1024):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS transcripts (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_last_used ON transcripts(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def content_key(video: Dict) -> Optional[str]:
+        """Возвращает идентификатор содержимого файла из листинга или None."""
+        if video.get("sha256"):
+            return f"sha256:{video['sha256']}"
+        if video.get("md5"):
+            return f"md5:{video['md5']}:{video.get('size', 0)}"
+        return None
+
+    @classmethod
+    def make_key(cls, video: Dict, model: str, language: Optional[str]) -> Optional[str]:
+        content = cls.content_key(video)
+        if content is None:
+            return None
+        return f"{content}|{model}|{language or 'auto'}"
+
+    def get(self, video: Dict, model: str, language: Optional[str]) -> Optional[str]:
+        """Возвращает транскрипцию из кэша или None."""
+        key = self.make_key(video, model, language)
+        if key is None:
+            return None
+
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE transcripts SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, video: Dict, model: str, language: Optional[str], text: str) -> None:
+        """Сохраняет транскрипцию и вытесняет старые записи сверх лимита."""
+        key = self.make_key(video, model, language)
+        if key is None:
+            return
+
+        now = time.time()
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts (key, text, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, text, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM transcripts ORDER BY last_used ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        """Размер кэша и статистика попаданий."""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
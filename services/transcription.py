@@ -1,11 +1,25 @@
 """
 Модуль для транскрибации аудио через Whisper
 """
+import importlib.util
+import logging
 import re
+import wave
 import warnings
-import whisper
+import numpy as np
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Optional, Type, Union
+
+from services.vad import detect_speech, group_regions, join_regions
+
+logger = logging.getLogger(__name__)
+
+# Частота дискретизации входного аудио
+SAMPLE_RATE = 16000
+
+# on_progress(доля 0..1) — прогресс распознавания по сегментам
+ProgressCallback = Callable[[float], None]
 
 
 def _add_paragraphs(text: str, sentences_per_paragraph: int = 2) -> str:
@@ -21,57 +35,308 @@ def _add_paragraphs(text: str, sentences_per_paragraph: int = 2) -> str:
     return "\n".join(lines)
 
 
+def _load_wav(path: Path) -> Optional[np.ndarray]:
+    """Читает WAV pcm_s16le 16 kHz моно в float32; для других форматов — None."""
+    try:
+        with wave.open(str(path), "rb") as wav:
+            if wav.getsampwidth() != 2 or wav.getnchannels() != 1 or wav.getframerate() != SAMPLE_RATE:
+                return None
+            data = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    audio = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+    audio *= 1.0 / 32768.0
+    return audio
+
+
+def _scaled_progress(
+    on_progress: Optional[ProgressCallback], base: float, size: float, total: float
+) -> Optional[ProgressCallback]:
+    """Колбэк прогресса части [base, base + size) как доли от total; None, если прогресс не нужен."""
+    if on_progress is None:
+        return None
+
+    def report(fraction: float) -> None:
+        on_progress((base + fraction * size) / total)
+    return report
+
+
+def format_transcript(raw_text: str) -> Optional[str]:
+    """Приводит сырой текст распознавания к итоговому виду; пустой текст — None."""
+    text = raw_text.strip()
+    if not text:
+        logger.warning("Транскрибация вернула пустой текст")
+        return None
+    return _add_paragraphs(text)
+
+
+# ── Бэкенды распознавания ────────────────────────────────────────────────────
+
+class TranscriptionBackend(ABC):
+    """Интерфейс бэкенда: загружает модель и возвращает сырой текст распознавания."""
+
+    name = ""
+    # Модуль, который импортирует load, и пакет pip, в котором он лежит
+    module = ""
+    package = ""
+
+    def __init__(self, model_size: str, cpu_threads: int = 0):
+        self.model_size = model_size
+        self.cpu_threads = cpu_threads
+
+    @abstractmethod
+    def load(self) -> None:
+        """Загружает модель в память."""
+
+    @abstractmethod
+    def transcribe(
+        self, audio: Union[str, np.ndarray], language: Optional[str], on_progress: Optional[ProgressCallback] = None
+    ) -> str:
+        """Возвращает сырой текст распознавания."""
+
+
+class _WhisperProgressBar:
+    """Подменяет tqdm внутри whisper.transcribe и пересылает прогресс в колбэк."""
+
+    def __init__(self, on_progress: ProgressCallback, total=None, **kwargs):
+        self.on_progress = on_progress
+        self.total = total or 0
+        self.done = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n=1):
+        self.done += n
+        if self.total:
+            self.on_progress(min(1.0, self.done / self.total))
+
+
+class WhisperBackend(TranscriptionBackend):
+    """OpenAI Whisper (PyTorch, fp32 на CPU)."""
+
+    name = "whisper"
+    module = "whisper"
+    package = "openai-whisper"
+
+    def load(self) -> None:
+        import torch
+        import whisper
+
+        if self.cpu_threads:
+            torch.set_num_threads(self.cpu_threads)
+        self.model = whisper.load_model(self.model_size)
+
+    def transcribe(
+        self, audio: Union[str, np.ndarray], language: Optional[str], on_progress: Optional[ProgressCallback] = None
+    ) -> str:
+        if on_progress is None:
+            result = self.model.transcribe(audio, language=language, task="transcribe")
+            return result.get("text", "")
+
+        # openai-whisper сообщает прогресс только через tqdm — подменяем его на время вызова.
+        # Атрибут whisper.transcribe — функция, поэтому модуль берём через importlib
+        import importlib
+        import types
+
+        whisper_transcribe = importlib.import_module("whisper.transcribe")
+
+        original_tqdm = whisper_transcribe.tqdm
+        whisper_transcribe.tqdm = types.SimpleNamespace(
+            tqdm=lambda *args, **kwargs: _WhisperProgressBar(on_progress, **kwargs)
+        )
+        try:
+            result = self.model.transcribe(audio, language=language, task="transcribe", verbose=False)
+        finally:
+            whisper_transcribe.tqdm = original_tqdm
+        return result.get("text", "")
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """faster-whisper (CTranslate2, int8 на CPU) — в разы быстрее при том же качестве."""
+
+    name = "faster-whisper"
+    module = "faster_whisper"
+    package = "faster-whisper"
+
+    def __init__(self, model_size: str, cpu_threads: int = 0, compute_type: str = "int8"):
+        super().__init__(model_size, cpu_threads)
+        self.compute_type = compute_type
+
+    def load(self) -> None:
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            self.model_size,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+        )
+
+    def transcribe(
+        self, audio: Union[str, np.ndarray], language: Optional[str], on_progress: Optional[ProgressCallback] = None
+    ) -> str:
+        segments, info = self.model.transcribe(audio, language=language, task="transcribe")
+        # Сегменты — ленивый генератор, распознавание идёт при итерации
+        texts = []
+        for segment in segments:
+            texts.append(segment.text)
+            if on_progress and info.duration:
+                on_progress(min(1.0, segment.end / info.duration))
+        return "".join(texts)
+
+
+BACKENDS: Dict[str, Type[TranscriptionBackend]] = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def check_backend(name: str) -> None:
+    """
+    Проверяет, что бэкенд известен и его пакет установлен, не загружая модель.
+
+    Raises:
+        ValueError: неизвестный бэкенд
+        ImportError: пакет бэкенда не установлен
+    """
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"Неизвестный бэкенд транскрибации: {name} (доступны: {', '.join(BACKENDS)})")
+    if importlib.util.find_spec(backend_cls.module) is None:
+        raise ImportError(f"Бэкенд {name} не установлен: pip install {backend_cls.package}")
+
+
 class TranscriptionService:
-    """Транскрибирует аудиофайлы в текст через OpenAI Whisper."""
+    """Транскрибирует аудиофайлы в текст через выбранный бэкенд Whisper."""
 
-    def __init__(self, model_size: str = "base"):
+    def __init__(
+        self,
+        model_size: str = "base",
+        backend: str = "whisper",
+        cpu_threads: int = 0,
+        vad: bool = False,
+    ):
         self.model_size = model_size
-        self.model = None
+        self.backend_name = backend
+        self.cpu_threads = cpu_threads
+        # Предварительный поиск речи: тишина не отправляется в модель
+        self.vad = vad
+        # Длительность аудио и речи в последнем вызове transcribe, секунды
+        self.last_stats: Dict[str, float] = {}
+        self.model: Optional[TranscriptionBackend] = None
         self._load_model()
 
     def _load_model(self):
-        """Загружает модель Whisper (один раз при старте)."""
-        try:
-            print(f"Загрузка модели Whisper: {self.model_size}")
-            self.model = whisper.load_model(self.model_size)
-            print("Модель загружена успешно")
-        except Exception as e:
-            print(f"Ошибка при загрузке модели Whisper: {e}")
-            self.model = None
+        """
+        Загружает модель выбранного бэкенда (один раз при старте).
 
-    def transcribe(self, audio_path: str, language: Optional[str] = None) -> Optional[str]:
+        Неизвестный бэкенд, неустановленный пакет или ошибка загрузки модели
+        пробрасываются — без модели сервис работать не может.
         """
-        Транскрибирует аудиофайл в текст.
+        check_backend(self.backend_name)
+        logger.info(f"Загрузка модели Whisper: {self.model_size} ({self.backend_name})")
+        backend = BACKENDS[self.backend_name](self.model_size, cpu_threads=self.cpu_threads)
+        backend.load()
+        self.model = backend
+        logger.info("Модель загружена успешно")
+
+    def transcribe(
+        self,
+        audio: Union[str, np.ndarray],
+        language: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Optional[str]:
+        """
+        Транскрибирует аудио в текст.
 
         Args:
-            audio_path: путь к WAV-файлу
+            audio: путь к WAV-файлу или массив float32 (16 kHz, моно)
+                   из VideoConverter.audio_array — тогда повторного декодирования нет
             language: код языка ("ru", "en", …) или None для автоопределения
+            on_progress: колбэк доли распознанного аудио (по сегментам)
+
+        При включённом VAD в модель попадают только участки речи,
+        а last_stats содержит длительность аудио и найденной речи.
 
         Returns:
-            Строка с текстом или None при ошибке.
+            Строка с текстом, разбитым на абзацы, или None при ошибке.
         """
+        raw_text = self.transcribe_text(audio, language, on_progress)
+        if raw_text is None:
+            return None
+        return format_transcript(raw_text)
+
+    def transcribe_text(
+        self,
+        audio: Union[str, np.ndarray],
+        language: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Optional[str]:
+        """Как transcribe, но возвращает сырой текст без абзацев (для склейки фрагментов)."""
+        self.last_stats = {}
         if self.model is None:
-            print("Модель Whisper не загружена")
+            logger.error("Модель Whisper не загружена")
             return None
 
-        audio_path = Path(audio_path)
-        if not audio_path.exists():
-            print(f"Аудио файл не найден: {audio_path}")
+        if isinstance(audio, np.ndarray):
+            if audio.size == 0:
+                logger.error("Передан пустой аудио массив")
+                return None
+            model_input = audio
+        else:
+            audio_path = Path(audio)
+            if not audio_path.exists():
+                logger.error(f"Аудио файл не найден: {audio_path}")
+                return None
+            model_input = str(audio_path)
+
+        if self.vad:
+            samples = model_input if isinstance(model_input, np.ndarray) else _load_wav(Path(model_input))
+            if samples is not None:
+                return self._transcribe_speech(samples, language, on_progress)
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return self.model.transcribe(model_input, language, on_progress).strip()
+        except Exception as e:
+            logger.error(f"Ошибка при транскрибации: {e}")
             return None
 
+    def _transcribe_speech(
+        self, audio: np.ndarray, language: Optional[str], on_progress: Optional[ProgressCallback] = None
+    ) -> Optional[str]:
+        """Транскрибирует только участки речи, найденные VAD, в исходном порядке."""
+        regions = detect_speech(audio, SAMPLE_RATE)
+        total_s = len(audio) / SAMPLE_RATE
+        speech_s = sum(end - start for start, end in regions) / SAMPLE_RATE
+        self.last_stats = {"audio_seconds": total_s, "speech_seconds": speech_s}
+        if total_s:
+            logger.info(f"VAD: речь {speech_s:.0f} из {total_s:.0f} с, пропущено {100 * (1 - speech_s / total_s):.0f}%")
+
+        if not regions:
+            logger.info("VAD: речь не обнаружена")
+            return ""
+
+        speech_samples = sum(end - start for start, end in regions)
+        done_samples = 0
+
         try:
+            texts = []
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                result = self.model.transcribe(
-                    str(audio_path),
-                    language=language,
-                    task="transcribe",
-                )
-            text = result.get("text", "").strip()
-            if not text:
-                print("Транскрибация вернула пустой текст")
-                return None
-            return _add_paragraphs(text)
+                for group in group_regions(regions, SAMPLE_RATE):
+                    group_samples = sum(end - start for start, end in group)
+                    # Прогресс группы пересчитывается в долю от всей речи
+                    group_progress = _scaled_progress(on_progress, done_samples, group_samples, speech_samples)
+                    chunk = join_regions(audio, group, SAMPLE_RATE)
+                    texts.append(self.model.transcribe(chunk, language, group_progress).strip())
+                    done_samples += group_samples
+            return " ".join(t for t in texts if t)
         except Exception as e:
-            print(f"Ошибка при транскрибации: {e}")
+            logger.error(f"Ошибка при транскрибации: {e}")
             return None
@@ -0,0 +1,259 @@
+"""
+Модуль пула процессов для транскрибации: одна прогретая модель Whisper на процесс
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Union
+
+import numpy as np
+
+from services.chunking import merge_texts, split_chunks
+from services.transcription import SAMPLE_RATE, TranscriptionService, check_backend, format_transcript
+
+logger = logging.getLogger(__name__)
+
+# Экземпляр сервиса внутри процесса-воркера (создаётся инициализатором)
+_worker_service: Optional[TranscriptionService] = None
+# Очередь (task_id, доля) для отправки прогресса в основной процесс
+_worker_progress_queue = None
+
+
+def _init_worker(model_size: str, backend: str, threads: int, vad: bool, progress_queue) -> None:
+    """Инициализатор процесса: загружает модель с фиксированным числом потоков."""
+    global _worker_service, _worker_progress_queue
+    _worker_progress_queue = progress_queue
+    _worker_service = TranscriptionService(
+        model_size=model_size, backend=backend, cpu_threads=threads, vad=vad
+    )
+
+
+def _ping() -> int:
+    """Задача для прогрева: выполняется только после загрузки модели в воркере."""
+    # Короткая пауза, чтобы одновременные пинги разошлись по разным процессам
+    time.sleep(0.2)
+    return os.getpid()
+
+
+def _progress_reporter(task_id: Optional[int]) -> Optional[Callable[[float], None]]:
+    """Колбэк, отправляющий прогресс задачи в основной процесс; None, если он не нужен."""
+    if task_id is None or _worker_progress_queue is None:
+        return None
+    last = [-1.0]
+
+    def report(fraction: float) -> None:
+        # Не чаще, чем раз в процент
+        if fraction - last[0] >= 0.01 or fraction >= 1.0:
+            last[0] = fraction
+            _worker_progress_queue.put_nowait((task_id, fraction))
+    return report
+
+
+def _transcribe_in_worker(audio: Union[str, np.ndarray], language: Optional[str], task_id: Optional[int] = None):
+    text = _worker_service.transcribe_text(audio, language=language, on_progress=_progress_reporter(task_id))
+    return text, _worker_service.last_stats
+
+
+class TranscriptionPool:
+    """
+    Пул процессов для транскрибации.
+
+    Каждый процесс один раз загружает модель и держит её в памяти, поэтому
+    транскрибации не делят GIL и один экземпляр модели. Число потоков
+    инференса в процессе подбирается так, чтобы workers × threads ≈ числу ядер.
+
+    Длинное аудио (массив длиннее полутора chunk_s) режется на фрагменты,
+    которые распознаются параллельно во всех процессах и склеиваются обратно.
+    Режется и при одном процессе: в процесс уходит только срез фрагмента,
+    а не вся запись, и прогресс идёт по фрагментам.
+    """
+
+    def __init__(
+        self,
+        model_size: str = "base",
+        workers: int = 1,
+        threads_per_worker: int = 0,
+        backend: str = "whisper",
+        vad: bool = False,
+        chunk_s: float = 300.0,
+        overlap_s: float = 3.0,
+    ):
+        self.model_size = model_size
+        self.backend = backend
+        self.vad = vad
+        # Длина фрагмента для параллельной транскрибации (0 — не резать)
+        self.chunk_s = chunk_s
+        self.overlap_s = overlap_s
+        self.workers = max(1, workers)
+        cores = os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        # Канал прогресса из воркеров: очередь процессов + поток-читатель
+        self._progress_queue = None
+        self._progress_thread: Optional[threading.Thread] = None
+        self._progress_callbacks: Dict[int, tuple] = {}
+        self._task_ids = itertools.count()
+
+        # Суммарная длительность аудио и речи, прошедших через VAD, секунды
+        self.vad_audio_seconds = 0.0
+        self.vad_speech_seconds = 0.0
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn, а не fork: torch плохо переносит fork после инициализации
+        context = multiprocessing.get_context("spawn")
+        if self._progress_queue is None:
+            self._progress_queue = context.Queue()
+            self._progress_thread = threading.Thread(target=self._read_progress, daemon=True)
+            self._progress_thread.start()
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.model_size, self.backend, self.threads_per_worker, self.vad, self._progress_queue),
+        )
+
+    def _read_progress(self) -> None:
+        """Поток-читатель: передаёт прогресс из воркеров в колбэки на event loop."""
+        while True:
+            item = self._progress_queue.get()
+            if item is None:
+                return
+            task_id, fraction = item
+            entry = self._progress_callbacks.get(task_id)
+            if entry is not None:
+                loop, callback = entry
+                loop.call_soon_threadsafe(callback, fraction)
+
+    async def start(self, timeout: float = 600.0) -> None:
+        """
+        Запускает все процессы и дожидается загрузки модели в каждом.
+
+        Неустановленный бэкенд обнаруживается до запуска процессов; ошибка
+        загрузки модели в процессе пробрасывается (BrokenProcessPool).
+        """
+        check_backend(self.backend)
+        if self._executor is None:
+            self._executor = self._create_executor()
+        loop = asyncio.get_running_loop()
+        ready = set()
+        deadline = loop.time() + timeout
+        # Процессы создаются по мере отправки задач; пингуем, пока не ответят все
+        while len(ready) < self.workers and loop.time() < deadline:
+            pids = await asyncio.gather(
+                *(loop.run_in_executor(self._executor, _ping) for _ in range(self.workers))
+            )
+            ready.update(pids)
+        logger.info(
+            f"Пул транскрибации готов: процессов {len(ready)}, "
+            f"потоков на процесс {self.threads_per_worker}"
+        )
+
+    @property
+    def model_tag(self) -> str:
+        """Идентификатор модели для ключа кэша: разные бэкенды дают немного разный текст."""
+        return f"{self.backend}:{self.model_size}"
+
+    async def transcribe(
+        self,
+        audio: Union[str, np.ndarray],
+        language: Optional[str] = None,
+        on_progress: Optional[Callable[[float], None]] = None,
+    ) -> Optional[str]:
+        """
+        Транскрибирует аудио в свободном процессе (длинное — фрагментами во всех процессах).
+
+        on_progress(доля 0..1) вызывается в event loop по мере распознавания сегментов.
+        """
+        if self._executor is None:
+            self._executor = self._create_executor()
+
+        if isinstance(audio, np.ndarray) and self.chunk_s > 0 and len(audio) > 1.5 * self.chunk_s * SAMPLE_RATE:
+            raw_text = await self._transcribe_chunked(audio, language, on_progress)
+        else:
+            raw_text = await self._submit(audio, language, on_progress)
+
+        if raw_text is None:
+            return None
+        return format_transcript(raw_text)
+
+    async def _transcribe_chunked(
+        self, audio: np.ndarray, language: Optional[str], on_progress: Optional[Callable[[float], None]]
+    ) -> Optional[str]:
+        chunks = split_chunks(audio, SAMPLE_RATE, self.chunk_s, self.overlap_s)
+        logger.info(f"Длинное аудио ({len(audio) / SAMPLE_RATE:.0f} с) разбито на {len(chunks)} фрагментов")
+
+        # Общий прогресс — доли фрагментов, взвешенные по длине
+        fractions = [0.0] * len(chunks)
+        total = sum(end - start for start, end in chunks)
+
+        def chunk_progress(i: int):
+            if on_progress is None:
+                return None
+
+            def report(fraction: float) -> None:
+                fractions[i] = fraction
+                on_progress(sum(f * (end - start) for f, (start, end) in zip(fractions, chunks)) / total)
+            return report
+
+        # Срез — view без копии; pickle при отправке в процесс копирует только его данные
+        texts = await asyncio.gather(
+            *(self._submit(audio[start:end], language, chunk_progress(i)) for i, (start, end) in enumerate(chunks))
+        )
+        if any(text is None for text in texts):
+            return None
+        return merge_texts(texts)
+
+    async def _submit(
+        self,
+        audio: Union[str, np.ndarray],
+        language: Optional[str],
+        on_progress: Optional[Callable[[float], None]] = None,
+    ) -> Optional[str]:
+        """Отправляет одну задачу в пул и возвращает сырой текст."""
+        loop = asyncio.get_running_loop()
+        task_id = None
+        if on_progress is not None:
+            task_id = next(self._task_ids)
+            self._progress_callbacks[task_id] = (loop, on_progress)
+        try:
+            text, stats = await loop.run_in_executor(self._executor, _transcribe_in_worker, audio, language, task_id)
+        except BrokenProcessPool:
+            # Процесс упал (например, OOM) — пересоздаём пул для следующих задач
+            logger.warning("Пул транскрибации сломан, пересоздаю процессы")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create_executor()
+            return None
+        finally:
+            self._progress_callbacks.pop(task_id, None)
+
+        if stats:
+            self.vad_audio_seconds += stats.get("audio_seconds", 0.0)
+            self.vad_speech_seconds += stats.get("speech_seconds", 0.0)
+        return text
+
+    def vad_stats(self) -> Dict[str, float]:
+        """Сколько аудио VAD отбросил как тишину (суммарно с запуска)."""
+        skipped = self.vad_audio_seconds - self.vad_speech_seconds
+        ratio = skipped / self.vad_audio_seconds if self.vad_audio_seconds else 0.0
+        return {
+            "audio_seconds": self.vad_audio_seconds,
+            "skipped_seconds": skipped,
+            "skipped_ratio": ratio,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._progress_queue is not None:
+            self._progress_queue.put(None)
+            self._progress_thread.join(timeout=5)
+            self._progress_queue.close()
+            self._progress_queue = None
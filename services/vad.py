@@ -0,0 +1,113 @@
+"""
+Модуль для поиска речи в аудио (VAD) перед транскрибацией
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+# Регион речи: (начальный сэмпл, конечный сэмпл)
+Region = Tuple[int, int]
+
+
+def detect_speech(
+    audio: np.ndarray,
+    sample_rate: int = 16000,
+    frame_ms: int = 30,
+    margin_db: float = 10.0,
+    min_level_db: float = -50.0,
+    min_speech_ms: int = 250,
+    min_silence_ms: int = 700,
+    pad_ms: int = 200,
+) -> List[Region]:
+    """
+    Находит участки речи по энергии сигнала.
+
+    Порог — уровень шума (10-й перцентиль громкости кадров) плюс margin_db,
+    но не выше уровня громких кадров (90-й перцентиль) минус margin_db
+    (иначе запись без пауз целиком считалась бы тишиной) и не ниже min_level_db.
+    Паузы короче min_silence_ms склеиваются, всплески короче min_speech_ms
+    отбрасываются, к краям добавляется pad_ms.
+    Музыку энергетический VAD от речи не отличает — она остаётся в регионах.
+
+    Returns:
+        Отсортированный список непересекающихся регионов (в сэмплах).
+    """
+    frame = max(1, sample_rate * frame_ms // 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1) + 1e-12)
+    level_db = 20.0 * np.log10(rms)
+
+    noise_db, loud_db = np.percentile(level_db, [10, 90])
+    threshold = max(min(float(noise_db) + margin_db, float(loud_db) - margin_db), min_level_db)
+    is_speech = level_db > threshold
+
+    # Границы непрерывных участков речи (в кадрах)
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    min_silence = max(1, min_silence_ms // frame_ms)
+    min_speech = max(1, min_speech_ms // frame_ms)
+    pad = pad_ms // frame_ms
+
+    merged: List[List[int]] = []
+    for start, end in zip(starts, ends):
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    regions: List[Region] = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start_sample = max(0, int(start - pad) * frame)
+        # Хвост короче кадра относим к последнему региону
+        end_sample = len(audio) if end + pad >= n_frames else int(end + pad) * frame
+        if regions and start_sample <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end_sample)
+        else:
+            regions.append((start_sample, end_sample))
+    return regions
+
+
+def group_regions(
+    regions: List[Region],
+    sample_rate: int = 16000,
+    max_chunk_s: float = 600.0,
+) -> List[List[Region]]:
+    """
+    Объединяет соседние регионы речи в группы длительностью до max_chunk_s.
+
+    Каждая группа транскрибируется одним вызовом модели: так Whisper
+    сохраняет контекст между фразами, а длинные паузы между ними выкидываются.
+    """
+    max_samples = int(max_chunk_s * sample_rate)
+    groups: List[List[Region]] = []
+    current: List[Region] = []
+    current_len = 0
+    for start, end in regions:
+        length = end - start
+        if current and current_len + length > max_samples:
+            groups.append(current)
+            current, current_len = [], 0
+        current.append((start, end))
+        current_len += length
+    if current:
+        groups.append(current)
+    return groups
+
+
+def join_regions(audio: np.ndarray, regions: List[Region], sample_rate: int = 16000, gap_ms: int = 300) -> np.ndarray:
+    """Склеивает регионы в один массив, разделяя их короткой тишиной."""
+    gap = np.zeros(sample_rate * gap_ms // 1000, dtype=audio.dtype)
+    parts = []
+    for i, (start, end) in enumerate(regions):
+        if i:
+            parts.append(gap)
+        parts.append(audio[start:end])
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=audio.dtype)
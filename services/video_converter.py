@@ -1,9 +1,93 @@
 """
 Модуль для конвертации видео в аудио
 """
+import logging
+import re
 import subprocess
+import threading
+import numpy as np
+from collections import deque
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Частота дискретизации, которую ожидает Whisper
+SAMPLE_RATE = 16000
+
+# on_progress(обработано секунд, длительность в секундах) — вызывается из потока чтения ffmpeg
+ProgressCallback = Callable[[float, float], None]
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+# Строки вывода -progress имеют вид key=value
+_PROGRESS_LINE_RE = re.compile(r"^[a-z_0-9]+=\S*$")
+# Как часто проверять флаг отмены, пока ffmpeg работает (секунды)
+_CANCEL_POLL_INTERVAL = 0.2
+
+
+class ConversionCancelled(Exception):
+    """ffmpeg остановлен по флагу отмены (задачу отменили)."""
+
+
+def _run_ffmpeg(
+    cmd: List[str],
+    on_progress: Optional[ProgressCallback] = None,
+    cancel: Optional[threading.Event] = None,
+) -> bytes:
+    """
+    Запускает ffmpeg с -progress и возвращает его stdout.
+
+    Прогресс пишется в stderr (pipe:2), потому что stdout может быть занят
+    аудиоданными; длительность берётся из заголовка входа (Duration: …).
+    При ненулевом коде выхода бросает CalledProcessError с хвостом лога в stderr.
+    Если выставлен cancel, процесс убивается и бросается ConversionCancelled.
+    """
+    if cancel is not None and cancel.is_set():
+        raise ConversionCancelled()
+    full_cmd = [cmd[0], "-hide_banner", "-nostats", "-progress", "pipe:2", *cmd[1:]]
+    proc = subprocess.Popen(full_cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def watch_cancel():
+        # Поток с ffmpeg занят чтением stdout — флаг отмены проверяет отдельный поток
+        while proc.poll() is None:
+            if cancel.wait(_CANCEL_POLL_INTERVAL):
+                proc.kill()
+                return
+
+    log_tail = deque(maxlen=40)
+    duration = [0.0]
+
+    def read_stderr():
+        for raw in proc.stderr:
+            line = raw.decode(errors="replace").strip()
+            if not _PROGRESS_LINE_RE.match(line):
+                match = _DURATION_RE.search(line)
+                if match and not duration[0]:
+                    h, m, sec = match.groups()
+                    duration[0] = int(h) * 3600 + int(m) * 60 + float(sec)
+                log_tail.append(line)
+                continue
+
+            key, _, value = line.partition("=")
+            if key == "out_time_us" and on_progress and duration[0]:
+                try:
+                    on_progress(min(int(value) / 1_000_000, duration[0]), duration[0])
+                except ValueError:
+                    pass  # out_time_us=N/A до первого пакета
+
+    reader = threading.Thread(target=read_stderr, daemon=True)
+    reader.start()
+    if cancel is not None:
+        threading.Thread(target=watch_cancel, daemon=True).start()
+    stdout = proc.stdout.read()
+    proc.wait()
+    reader.join()
+
+    if cancel is not None and cancel.is_set():
+        raise ConversionCancelled()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, full_cmd, output=stdout, stderr="\n".join(log_tail))
+    return stdout
 
 
 class VideoConverter:
@@ -13,17 +97,27 @@ class VideoConverter:
         self.temp_dir = Path(temp_dir)
         self.temp_dir.mkdir(exist_ok=True)
 
-    def video_to_audio(self, video_path: str, output_path: Optional[str] = None) -> Optional[str]:
+    def video_to_audio(
+        self,
+        video_path: str,
+        output_path: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[str]:
         """
         Конвертирует видео в WAV (16 kHz, моно).
 
+        Args:
+            on_progress: колбэк реального прогресса ffmpeg (out_time / длительность)
+            cancel: флаг отмены — ffmpeg убивается, результат None
+
         Returns:
             Путь к созданному аудио файлу или None при ошибке.
         """
         video_path = Path(video_path)
 
         if not video_path.exists():
-            print(f"Видео файл не найден: {video_path}")
+            logger.error(f"Видео файл не найден: {video_path}")
             return None
 
         if output_path is None:
@@ -33,32 +127,194 @@ class VideoConverter:
 
         cmd = [
             "ffmpeg",
+            "-nostdin",
             "-i", str(video_path),
             "-vn",
             "-acodec", "pcm_s16le",
-            "-ar", "16000",
+            "-ar", str(SAMPLE_RATE),
             "-ac", "1",
             "-y",
             str(output_path),
         ]
 
         try:
-            subprocess.run(cmd, capture_output=True, text=True, check=True)
+            _run_ffmpeg(cmd, on_progress, cancel)
             if output_path.exists():
                 return str(output_path)
             else:
-                print(f"Аудио файл не был создан: {output_path}")
+                logger.error(f"Аудио файл не был создан: {output_path}")
+                return None
+        except ConversionCancelled:
+            self.cleanup(str(output_path))
+            return None
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Ошибка при конвертации видео: {e.stderr[-500:] if e.stderr else e}")
+            return None
+        except FileNotFoundError:
+            logger.error("ffmpeg не найден. Установите ffmpeg для работы с видео.")
+            return None
+        except Exception as e:
+            logger.exception(f"Неожиданная ошибка при конвертации: {e}")
+            return None
+
+    def url_to_audio(
+        self,
+        url: str,
+        output_path: str,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[str]:
+        """
+        Извлекает WAV (16 kHz, моно) напрямую из HTTP-ссылки, не сохраняя видео на диск.
+
+        ffmpeg читает поток сам и при необходимости дочитывает нужные части
+        Range-запросами (например, moov-атом в конце MP4).
+
+        Returns:
+            Путь к созданному аудио файлу или None при ошибке
+            (вызывающий код может откатиться на скачивание файла целиком).
+        """
+        output_path = Path(output_path)
+
+        cmd = [
+            "ffmpeg",
+            "-nostdin",
+            *self._input_args(url),
+            "-vn",
+            "-acodec", "pcm_s16le",
+            "-ar", str(SAMPLE_RATE),
+            "-ac", "1",
+            "-y",
+            str(output_path),
+        ]
+
+        try:
+            _run_ffmpeg(cmd, on_progress, cancel)
+            if output_path.exists() and output_path.stat().st_size > 0:
+                return str(output_path)
+            else:
+                logger.error(f"Аудио файл не был создан из потока: {output_path}")
                 return None
+        except ConversionCancelled:
+            self.cleanup(str(output_path))
+            return None
         except subprocess.CalledProcessError as e:
-            print(f"Ошибка при конвертации видео: {e.stderr}")
+            logger.error(f"Ошибка при потоковой конвертации: {e.stderr[-500:] if e.stderr else e}")
+            self.cleanup(str(output_path))
             return None
         except FileNotFoundError:
-            print("ffmpeg не найден. Установите ffmpeg для работы с видео.")
+            logger.error("ffmpeg не найден. Установите ffmpeg для работы с видео.")
             return None
         except Exception as e:
-            print(f"Неожиданная ошибка при конвертации: {e}")
+            logger.exception(f"Неожиданная ошибка при потоковой конвертации: {e}")
+            self.cleanup(str(output_path))
             return None
 
+    def audio_array(
+        self,
+        source: str,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Декодирует аудио в память: float32, 16 kHz, моно — формат, который Whisper
+        принимает напрямую. WAV на диск не пишется.
+
+        Args:
+            source: путь к видеофайлу или прямая HTTP-ссылка на него
+            on_progress: колбэк реального прогресса ffmpeg (out_time / длительность)
+            cancel: флаг отмены — ffmpeg убивается, результат None
+
+        Returns:
+            Массив сэмплов в диапазоне [-1, 1] или None при ошибке.
+        """
+        is_url = source.startswith(("http://", "https://"))
+        if not is_url and not Path(source).exists():
+            logger.error(f"Видео файл не найден: {source}")
+            return None
+
+        cmd = [
+            "ffmpeg",
+            "-nostdin",
+            *self._input_args(source),
+            "-vn",
+            "-f", "s16le",
+            "-acodec", "pcm_s16le",
+            "-ar", str(SAMPLE_RATE),
+            "-ac", "1",
+            "pipe:1",
+        ]
+
+        try:
+            pcm = _run_ffmpeg(cmd, on_progress, cancel)
+        except ConversionCancelled:
+            return None
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Ошибка при декодировании аудио: {e.stderr[-500:] if e.stderr else e}")
+            return None
+        except FileNotFoundError:
+            logger.error("ffmpeg не найден. Установите ffmpeg для работы с видео.")
+            return None
+        except Exception as e:
+            logger.exception(f"Неожиданная ошибка при декодировании аудио: {e}")
+            return None
+
+        if not pcm:
+            logger.warning(f"Аудиодорожка пуста: {source}")
+            return None
+
+        # frombuffer не копирует данные; единственная копия — перевод в float32
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        audio *= 1.0 / 32768.0
+        return audio
+
+    def probe_duration(self, source: str, timeout: float = 30.0) -> Optional[float]:
+        """
+        Длительность видео в секундах по заголовкам контейнера (ffprobe).
+
+        Для HTTP-ссылки читаются только заголовки — начало файла и, если
+        нужно, moov-атом в конце (Range-запросом), а не всё видео.
+
+        Returns:
+            Длительность или None, если её не удалось определить.
+        """
+        cmd = [
+            "ffprobe",
+            "-v", "error",
+            *self._input_args(source),
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+        ]
+        try:
+            result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"ffprobe не ответил за {timeout:.0f} с")
+            return None
+        except FileNotFoundError:
+            logger.error("ffprobe не найден. Установите ffmpeg для работы с видео.")
+            return None
+
+        try:
+            duration = float(result.stdout.decode(errors="replace").strip().splitlines()[0])
+        except (IndexError, ValueError):
+            return None
+        return duration if duration > 0 else None
+
+    @staticmethod
+    def _input_args(source: str) -> List[str]:
+        """Аргументы ffmpeg для входа: для HTTP — переподключение и таймауты."""
+        if source.startswith(("http://", "https://")):
+            return [
+                # Переподключение при обрыве соединения посреди потока
+                "-reconnect", "1",
+                "-reconnect_streamed", "1",
+                "-reconnect_delay_max", "10",
+                # Таймаут чтения/записи сокета, мкс
+                "-rw_timeout", "30000000",
+                "-i", source,
+            ]
+        return ["-i", source]
+
     @staticmethod
     def cleanup(file_path: str) -> None:
         """Удаляет файл, игнорируя ошибки."""
@@ -67,4 +323,4 @@ class VideoConverter:
             if p.exists():
                 p.unlink()
         except Exception as e:
-            print(f"Ошибка при удалении файла {file_path}: {e}")
+            logger.warning(f"Ошибка при удалении файла {file_path}: {e}")
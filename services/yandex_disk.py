@@ -1,11 +1,77 @@
 """
 Модуль для работы с Yandex Disk API
 """
+import asyncio
+import logging
+import random
 import aiohttp
 import re
-from typing import Optional, List, Dict
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional, List, Dict
 from urllib.parse import unquote, urlparse, parse_qs
 
+from services.crawler import crawl_files
+from services.downloader import download_ranged
+from services.metadata_cache import MetadataCache
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+# ── Ошибки API ───────────────────────────────────────────────────────────────
+
+class YandexDiskError(Exception):
+    """Ошибка REST API Яндекс.Диска; текст исключения можно показать пользователю."""
+
+    # Имеет ли смысл повторить запрос
+    retryable = False
+
+    def __init__(self, status: Optional[int], message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class YandexDiskAuthError(YandexDiskError):
+    """401: токен недействителен или истёк."""
+
+
+class YandexDiskNotFound(YandexDiskError):
+    """404: ресурс не найден."""
+
+
+class YandexDiskRateLimited(YandexDiskError):
+    """429: превышена частота запросов."""
+
+    retryable = True
+
+
+class YandexDiskServerError(YandexDiskError):
+    """5xx: временная ошибка на стороне Яндекса."""
+
+    retryable = True
+
+
+class YandexDiskNetworkError(YandexDiskError):
+    """Сетевая ошибка или таймаут до получения ответа."""
+
+    retryable = True
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After: число секунд или HTTP-дата."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
 
 class YandexDisk:
     """Класс для работы с Яндекс.Диском"""
@@ -15,10 +81,273 @@ class YandexDisk:
     # Расширения видео файлов
     VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.mpg', '.mpeg'}
 
-    def __init__(self, access_token: str):
+    # Размер страницы листинга (максимум, который отдаёт API)
+    PAGE_LIMIT = 1000
+
+    def __init__(
+        self,
+        access_token: str,
+        pool_limit: int = 100,
+        limit_per_host: int = 10,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        listing_concurrency: int = 8,
+        download_segments: int = 4,
+        download_retries: int = 5,
+        download_chunk_size: int = 256 * 1024,
+        download_write_size: int = 1024 * 1024,
+        download_buffer_size: int = 16 * 1024 * 1024,
+        api_rate: float = 10.0,
+        api_burst: int = 20,
+        api_max_retries: int = 5,
+        metadata_cache: Optional[MetadataCache] = None,
+    ):
         self.access_token = access_token
         self.headers = {"Authorization": f"OAuth {access_token}"}
 
+        # Параметры пула соединений общей сессии
+        self.pool_limit = pool_limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+
+        # Максимум одновременных запросов листинга при обходе дерева папок
+        self.listing_concurrency = listing_concurrency
+
+        # Скачивание: число параллельных Range-сегментов на файл и повторов при ошибках
+        self.download_segments = download_segments
+        self.download_retries = download_retries
+        # Запись на диск в отдельном потоке: размер чтения, блока записи и очереди
+        self.download_chunk_size = download_chunk_size
+        self.download_write_size = download_write_size
+        self.download_buffer_size = download_buffer_size
+
+        # Общий лимит частоты запросов к REST API (листинг, ссылки, метаданные)
+        self._rate_limiter = TokenBucket(api_rate, api_burst)
+        self.api_max_retries = api_max_retries
+
+        # Кэш листингов и метаданных (None — без кэша)
+        self.metadata_cache = metadata_cache
+
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # Счётчики запросов к API: всего, повторов, ответов 429 и время ожидания
+        # (лимитер + паузы перед повтором), секунды
+        self.api_requests = 0
+        self.api_retries = 0
+        self.api_rate_limited = 0
+        self.api_throttled_seconds = 0.0
+
+        # Счётчики соединений: новые (TCP+TLS handshake) и переиспользованные из пула
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    # ── Жизненный цикл сессии ────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        """Создаёт общую HTTP-сессию с пулом соединений (если ещё не создана)."""
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+
+        self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+    async def close(self) -> None:
+        """Закрывает общую сессию и все соединения пула."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "YandexDisk":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, лениво создавая её при первом обращении."""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def _on_connection_created(self, session, ctx, params) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, ctx, params) -> None:
+        self.connections_reused += 1
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Статистика переиспользования соединений пула."""
+        return {
+            "created": self.connections_created,
+            "reused": self.connections_reused,
+        }
+
+    def api_stats(self) -> Dict[str, float]:
+        """Статистика запросов к REST API: повторы и ограничение частоты."""
+        return {
+            "requests": self.api_requests,
+            "retries": self.api_retries,
+            "rate_limited": self.api_rate_limited,
+            "throttled_seconds": self.api_throttled_seconds,
+        }
+
+    # ── Общий слой запросов к API ────────────────────────────────────────────
+
+    @staticmethod
+    async def _api_error(response: aiohttp.ClientResponse) -> YandexDiskError:
+        """Преобразует ответ с ошибкой в типизированное исключение."""
+        try:
+            data = await response.json(content_type=None)
+            detail = data.get("description") or data.get("message") or data.get("error") or ""
+        except Exception:
+            detail = (await response.text())[:200]
+
+        status = response.status
+        if status == 401:
+            return YandexDiskAuthError(status, f"Нет доступа к Яндекс.Диску (401): {detail}")
+        if status == 404:
+            return YandexDiskNotFound(status, f"Ресурс не найден (404): {detail}")
+        if status == 429:
+            return YandexDiskRateLimited(
+                status,
+                "Яндекс.Диск ограничил частоту запросов (429)",
+                retry_after=_parse_retry_after(response.headers.get("Retry-After")),
+            )
+        if status >= 500:
+            return YandexDiskServerError(status, f"Ошибка сервера Яндекс.Диска ({status}): {detail}")
+        return YandexDiskError(status, f"Ошибка Яндекс.Диска ({status}): {detail}")
+
+    async def _api_get(self, endpoint: str, params: Dict) -> Dict:
+        """
+        GET-запрос к REST API через общий ограничитель частоты.
+
+        429, 5xx и сетевые ошибки повторяются с экспоненциальной паузой
+        (для 429 — не меньше Retry-After, и пауза действует на все запросы).
+
+        Raises:
+            YandexDiskError (и наследники) — если запрос не удался после повторов.
+        """
+        session = await self._get_session()
+        url = f"{self.API_BASE_URL}{endpoint}"
+        attempt = 0
+        while True:
+            self.api_throttled_seconds += await self._rate_limiter.acquire()
+            self.api_requests += 1
+            try:
+                async with session.get(url, headers=self.headers, params=params) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    error = await self._api_error(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = YandexDiskNetworkError(None, f"Сетевая ошибка при обращении к Яндекс.Диску: {e or type(e).__name__}")
+
+            if isinstance(error, YandexDiskRateLimited):
+                self.api_rate_limited += 1
+            if not error.retryable or attempt >= self.api_max_retries:
+                raise error
+
+            attempt += 1
+            self.api_retries += 1
+            # Full jitter: 0.5, 1, 2, 4… с, не больше 30 с
+            delay = random.uniform(0, min(30.0, 0.5 * 2 ** (attempt - 1)))
+            if error.retry_after is not None:
+                delay = max(delay, error.retry_after)
+            logger.warning(f"Яндекс.Диск: {error} — повтор {attempt}/{self.api_max_retries} через {delay:.1f} с")
+
+            if isinstance(error, YandexDiskRateLimited):
+                # Пауза для всех запросов: следующий acquire дождётся её окончания
+                self._rate_limiter.pause(delay)
+            else:
+                self.api_throttled_seconds += delay
+                await asyncio.sleep(delay)
+
+    # ── Кэш листингов ────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _stamp(resource: Dict) -> Optional[str]:
+        """Метка версии ресурса: revision, а если её нет — время изменения."""
+        stamp = resource.get("revision") or resource.get("modified")
+        return str(stamp) if stamp is not None else None
+
+    @staticmethod
+    def _listing_key(public_key: Optional[str], path: Optional[str], offset: int, limit: int) -> str:
+        return f"list|{public_key or ''}|{path or ''}|{offset}|{limit}"
+
+    async def _cached_listing(
+        self, endpoint: str, params: Dict, public_key: Optional[str], path: Optional[str]
+    ) -> List[Dict]:
+        """
+        Страница листинга через кэш метаданных.
+
+        Свежая запись отдаётся без запросов. Устаревшая проверяется дешёвым
+        запросом только полей revision/modified самой папки: если метка
+        не изменилась, запись продлевается. После загрузки или подтверждения
+        страницы заодно продлеваются закэшированные страницы подпапок, чьи
+        метки совпали, — неизменённые поддеревья не запрашиваются повторно.
+        """
+        cache = self.metadata_cache
+        offset, limit = params["offset"], params["limit"]
+        key = self._listing_key(public_key, path, offset, limit)
+
+        if cache is not None:
+            items = cache.get(key)
+            if items is not None:
+                return items
+            stale = cache.get_stale(key)
+            if stale is not None:
+                meta_params = {k: v for k, v in params.items() if k not in ("offset", "limit")}
+                meta_params["fields"] = "revision,modified"
+                meta = await self._api_get(endpoint, meta_params)
+                if cache.confirm(key, self._stamp(meta)):
+                    self._confirm_children(public_key, stale[0], limit)
+                    await cache.flush()
+                    return stale[0]
+
+        data = await self._api_get(endpoint, params)
+        items = data.get("_embedded", {}).get("items", [])
+        if cache is None:
+            return items
+
+        cache.put(key, items, self._stamp(data))
+        self._confirm_children(public_key, items, limit)
+        await cache.flush()
+        return items
+
+    def _confirm_children(self, public_key: Optional[str], items: List[Dict], limit: int) -> None:
+        """
+        Продлевает закэшированные страницы подпапок, чьи метки совпали с метками в листинге.
+
+        Подтверждённая страница актуальна, а значит, актуальны и метки её
+        подпапок — поэтому проверка спускается дальше по дереву без запросов.
+        """
+        cache = self.metadata_cache
+        pending = [items]
+        while pending:
+            for item in pending.pop():
+                if item.get("type") != "dir":
+                    continue
+                stamp = self._stamp(item)
+                child_offset = 0
+                while True:
+                    child_key = self._listing_key(public_key, item.get("path"), child_offset, limit)
+                    if not cache.confirm(child_key, stamp):
+                        break
+                    pending.append(cache.get_stale(child_key)[0])
+                    child_offset += limit
+
     @staticmethod
     def parse_disk_url(url: str) -> Optional[str]:
         """
@@ -58,219 +387,185 @@ class YandexDisk:
 
     # ── Приватные папки / файлы ──────────────────────────────────────────────
 
-    async def get_folder_contents(self, folder_path: str = "/") -> Optional[List[Dict]]:
-        """Получает список файлов и папок в указанной директории."""
-        url = f"{self.API_BASE_URL}/resources"
-        params = {"path": folder_path, "limit": 1000}
+    async def get_folder_contents(
+        self, folder_path: str = "/", offset: int = 0, limit: int = PAGE_LIMIT
+    ) -> Optional[List[Dict]]:
+        """
+        Получает одну страницу (offset/limit) списка файлов и папок в директории.
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("_embedded", {}).get("items", [])
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка получения содержимого папки: {response.status} - {error_text}")
-                        return None
-            except Exception as e:
-                print(f"Исключение при получении содержимого папки: {e}")
-                return None
+        Возвращает None, если папка не найдена; остальные ошибки API
+        (в том числе 429 после всех повторов) бросает как YandexDiskError.
+        """
+        params = {"path": folder_path, "offset": offset, "limit": limit}
+        try:
+            return await self._cached_listing("/resources", params, None, folder_path)
+        except YandexDiskNotFound as e:
+            logger.error(f"Ошибка получения содержимого папки: {e}")
+            return None
+
+    async def iter_video_files_from_folder(
+        self, folder_path: str = "/", recursive: bool = True
+    ) -> AsyncIterator[Dict]:
+        """Обходит приватную папку в ширину и отдаёт видеофайлы по мере обнаружения."""
+        async for item in crawl_files(
+            self.get_folder_contents,
+            folder_path,
+            lambda item: self.is_video_file(item.get("name", "")),
+            concurrency=self.listing_concurrency,
+            page_limit=self.PAGE_LIMIT,
+            recursive=recursive,
+        ):
+            yield item
 
     async def get_video_files_from_folder(self, folder_path: str = "/", recursive: bool = True) -> List[Dict]:
-        """Рекурсивно собирает видеофайлы из приватной папки."""
-        videos = []
-        items = await self.get_folder_contents(folder_path)
-
-        if not items:
-            return videos
-
-        for item in items:
-            if item.get("type") == "file":
-                if self.is_video_file(item.get("name", "")):
-                    videos.append(item)
-            elif item.get("type") == "dir" and recursive:
-                subfolder_path = item.get("path", "")
-                sub_videos = await self.get_video_files_from_folder(subfolder_path, recursive=True)
-                videos.extend(sub_videos)
-
+        """Собирает все видеофайлы из приватной папки (в порядке путей)."""
+        videos = [item async for item in self.iter_video_files_from_folder(folder_path, recursive)]
+        videos.sort(key=lambda v: v.get("path", ""))
         return videos
 
     async def get_download_link(self, file_path: str) -> Optional[str]:
-        """Возвращает прямую ссылку для скачивания приватного файла."""
-        url = f"{self.API_BASE_URL}/resources/download"
-        params = {"path": file_path}
-
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("href")
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка получения ссылки на скачивание: {response.status} - {error_text}")
-                        return None
-            except Exception as e:
-                print(f"Исключение при получении ссылки на скачивание: {e}")
-                return None
+        """Возвращает прямую ссылку для скачивания приватного файла (None — файл не найден)."""
+        try:
+            data = await self._api_get("/resources/download", {"path": file_path})
+        except YandexDiskNotFound as e:
+            logger.error(f"Ошибка получения ссылки на скачивание: {e}")
+            return None
+        return data.get("href")
 
     async def download_file(self, file_path: str, save_path: str, on_progress=None) -> bool:
-        """Скачивает приватный файл с Яндекс.Диска."""
-        download_link = await self.get_download_link(file_path)
-        if not download_link:
-            return False
+        """
+        Скачивает приватный файл с Яндекс.Диска параллельными сегментами.
 
-        timeout = aiohttp.ClientTimeout(total=3600, connect=30)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            try:
-                async with session.get(download_link) as response:
-                    if response.status == 200:
-                        from pathlib import Path
-                        Path(save_path).parent.mkdir(parents=True, exist_ok=True)
-                        total = int(response.headers.get('Content-Length', 0))
-                        downloaded = 0
-                        with open(save_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(65536):
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if on_progress and total:
-                                    await on_progress(downloaded, total)
-                        return True
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка скачивания файла: {response.status} - {error_text}")
-                        return False
-            except Exception as e:
-                print(f"Исключение при скачивании файла: {e}")
-                return False
+        Прерванная загрузка продолжается при следующем вызове с тем же save_path;
+        истёкшая ссылка запрашивается заново.
+        """
+        session = await self._get_session()
+        return await download_ranged(
+            session,
+            lambda: self.get_download_link(file_path),
+            save_path,
+            on_progress,
+            segments=self.download_segments,
+            max_retries=self.download_retries,
+            chunk_size=self.download_chunk_size,
+            write_size=self.download_write_size,
+            buffer_size=self.download_buffer_size,
+        )
 
     # ── Публичные папки / файлы ──────────────────────────────────────────────
 
     async def get_public_resource_info(self, public_key: str) -> Optional[Dict]:
-        """Получает метаданные публичного ресурса (файл или папка)."""
-        url = f"{self.API_BASE_URL}/public/resources"
-        params = {"public_key": public_key, "limit": 1}
-
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка получения информации о публичном ресурсе: {response.status} - {error_text}")
-                        return None
-            except Exception as e:
-                print(f"Исключение при получении информации о публичном ресурсе: {e}")
-                return None
-
-    async def get_public_folder_contents(self, public_key: str, path: Optional[str] = None) -> Optional[List[Dict]]:
+        """Получает метаданные публичного ресурса (файл или папка); None — ресурс не найден."""
+        key = f"info|{public_key}"
+        cache = self.metadata_cache
+        try:
+            if cache is not None:
+                info = cache.get(key)
+                if info is not None:
+                    return info
+                # Устаревшая запись проверяется по метке, как страницы листинга
+                stale = cache.get_stale(key)
+                if stale is not None:
+                    meta = await self._api_get(
+                        "/public/resources", {"public_key": public_key, "fields": "revision,modified"}
+                    )
+                    if cache.confirm(key, self._stamp(meta)):
+                        await cache.flush()
+                        return stale[0]
+            info = await self._api_get("/public/resources", {"public_key": public_key, "limit": 1})
+        except YandexDiskNotFound as e:
+            logger.error(f"Ошибка получения информации о публичном ресурсе: {e}")
+            return None
+        if cache is not None:
+            cache.put(key, info, self._stamp(info))
+            await cache.flush()
+        return info
+
+    async def get_public_folder_contents(
+        self, public_key: str, path: Optional[str] = None, offset: int = 0, limit: int = PAGE_LIMIT
+    ) -> Optional[List[Dict]]:
         """
-        Получает список файлов и подпапок внутри публичного ресурса.
+        Получает одну страницу списка файлов и подпапок внутри публичного ресурса.
 
         Args:
             public_key: ключ из ссылки /i/...
             path: путь к подпапке внутри публичного ресурса (для рекурсии)
+            offset: смещение страницы
+            limit: размер страницы
+
+        Возвращает None, если ресурс не найден; остальные ошибки — YandexDiskError.
         """
-        url = f"{self.API_BASE_URL}/public/resources"
-        params: Dict = {"public_key": public_key, "limit": 1000}
+        params: Dict = {"public_key": public_key, "offset": offset, "limit": limit}
         if path:
             params["path"] = path
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("_embedded", {}).get("items", [])
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка получения содержимого публичной папки: {response.status} - {error_text}")
-                        return None
-            except Exception as e:
-                print(f"Исключение при получении содержимого публичной папки: {e}")
-                return None
+        try:
+            return await self._cached_listing("/public/resources", params, public_key, path)
+        except YandexDiskNotFound as e:
+            logger.error(f"Ошибка получения содержимого публичной папки: {e}")
+            return None
 
-    async def get_video_files_from_public_folder(
+    async def iter_video_files_from_public_folder(
         self, public_key: str, path: Optional[str] = None
-    ) -> List[Dict]:
+    ) -> AsyncIterator[Dict]:
         """
-        Рекурсивно собирает видеофайлы из публичной папки.
+        Обходит публичную папку в ширину и отдаёт видеофайлы по мере обнаружения.
 
-        Возвращает список словарей вида:
-            {"name": str, "size": int, "public_key": str, "inner_path": str}
+        Отдаёт словари вида:
+            {"name": str, "size": int, "public_key": str, "inner_path": str,
+             "md5": str, "sha256": str}
         """
-        videos: List[Dict] = []
-        items = await self.get_public_folder_contents(public_key, path)
-
-        if not items:
-            return videos
-
-        for item in items:
-            if item.get("type") == "file":
-                name = item.get("name", "")
-                if self.is_video_file(name):
-                    videos.append({
-                        "name": name,
-                        "size": item.get("size", 0),
-                        "public_key": public_key,
-                        "inner_path": item.get("path", ""),
-                    })
-            elif item.get("type") == "dir":
-                sub_path = item.get("path", "")
-                sub_videos = await self.get_video_files_from_public_folder(public_key, sub_path)
-                videos.extend(sub_videos)
+        async def list_page(sub_path: Optional[str], offset: int, limit: int) -> Optional[List[Dict]]:
+            return await self.get_public_folder_contents(public_key, sub_path, offset, limit)
+
+        async for item in crawl_files(
+            list_page,
+            path,
+            lambda item: self.is_video_file(item.get("name", "")),
+            concurrency=self.listing_concurrency,
+            page_limit=self.PAGE_LIMIT,
+        ):
+            yield {
+                "name": item.get("name", ""),
+                "size": item.get("size", 0),
+                "public_key": public_key,
+                "inner_path": item.get("path", ""),
+                "md5": item.get("md5"),
+                "sha256": item.get("sha256"),
+            }
 
+    async def get_video_files_from_public_folder(
+        self, public_key: str, path: Optional[str] = None
+    ) -> List[Dict]:
+        """Собирает все видеофайлы из публичной папки (в порядке путей)."""
+        videos = [item async for item in self.iter_video_files_from_public_folder(public_key, path)]
+        videos.sort(key=lambda v: v.get("inner_path", ""))
         return videos
 
     async def get_public_download_link(self, public_key: str, path: Optional[str] = None) -> Optional[str]:
         """Возвращает прямую ссылку для скачивания публичного файла/файла из публичной папки."""
-        url = f"{self.API_BASE_URL}/public/resources/download"
         params: Dict = {"public_key": public_key}
         if path:
             params["path"] = path
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("href")
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка получения публичной ссылки: {response.status} - {error_text}")
-                        return None
-            except Exception as e:
-                print(f"Исключение при получении публичной ссылки: {e}")
-                return None
+        try:
+            data = await self._api_get("/public/resources/download", params)
+        except YandexDiskNotFound as e:
+            logger.error(f"Ошибка получения публичной ссылки: {e}")
+            return None
+        return data.get("href")
 
     async def download_public_file(self, public_key: str, save_path: str, inner_path: Optional[str] = None, on_progress=None) -> bool:
-        """Скачивает публичный файл по public_key (и опциональному inner_path внутри папки)."""
-        download_link = await self.get_public_download_link(public_key, inner_path)
-        if not download_link:
-            return False
-
-        timeout = aiohttp.ClientTimeout(total=3600, connect=30)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            try:
-                async with session.get(download_link) as response:
-                    if response.status == 200:
-                        from pathlib import Path
-                        Path(save_path).parent.mkdir(parents=True, exist_ok=True)
-                        total = int(response.headers.get('Content-Length', 0))
-                        downloaded = 0
-                        with open(save_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(65536):
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if on_progress and total:
-                                    await on_progress(downloaded, total)
-                        return True
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка скачивания публичного файла: {response.status} - {error_text}")
-                        return False
-            except Exception as e:
-                print(f"Исключение при скачивании публичного файла: {e}")
-                return False
+        """Скачивает публичный файл по public_key (и опциональному inner_path внутри папки), как download_file."""
+        session = await self._get_session()
+        return await download_ranged(
+            session,
+            lambda: self.get_public_download_link(public_key, inner_path),
+            save_path,
+            on_progress,
+            segments=self.download_segments,
+            max_retries=self.download_retries,
+            chunk_size=self.download_chunk_size,
+            write_size=self.download_write_size,
+            buffer_size=self.download_buffer_size,
+        )
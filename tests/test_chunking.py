@@ -0,0 +1,45 @@
+import numpy as np
+
+from services.chunking import merge_texts, split_chunks
+
+
+def test_merge_removes_overlap_ignoring_case_and_punctuation():
+    texts = [
+        "Сегодня мы поговорим о конвейерах. И о том, как",
+        "и о том как они работают в нашем боте.",
+    ]
+
+    assert merge_texts(texts) == "Сегодня мы поговорим о конвейерах. И о том, как они работают в нашем боте."
+
+
+def test_merge_picks_longest_overlap():
+    assert merge_texts(["a b a b", "a b a b c"]) == "a b a b c"
+
+
+def test_merge_without_overlap_joins_texts():
+    assert merge_texts(["первый фрагмент", "второй фрагмент"]) == "первый фрагмент второй фрагмент"
+
+
+def test_merge_skips_empty_fragments():
+    assert merge_texts(["один два", "", "  ", "два три"]) == "один два три"
+
+
+def test_merge_ignores_overlap_of_punctuation_only():
+    assert merge_texts(["конец —", "— начало"]) == "конец — — начало"
+
+
+def test_merge_limits_overlap_search():
+    words = " ".join(str(i) for i in range(10))
+    # Совпадение длиннее max_overlap_words не ищется
+    assert merge_texts([words, words], max_overlap_words=5) == f"{words} {words}"
+
+
+def test_split_chunks_cover_audio_with_overlap():
+    sample_rate = 100
+    audio = np.random.default_rng(0).standard_normal(1000 * sample_rate).astype(np.float32)
+
+    chunks = split_chunks(audio, sample_rate, chunk_s=300, overlap_s=4, search_s=10)
+
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(audio)
+    for (_, prev_end), (start, _) in zip(chunks, chunks[1:]):
+        assert prev_end - start == 4 * sample_rate
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import pytest
+
+from services.crawler import crawl_files
+
+
+def _file(path: str) -> Dict:
+    return {"type": "file", "path": path, "name": path.rsplit("/", 1)[-1]}
+
+
+def _dir(path: str) -> Dict:
+    return {"type": "dir", "path": path, "name": path.rsplit("/", 1)[-1]}
+
+
+class FakeListing:
+    """Дерево папок в памяти: листинг постранично, как REST API Диска."""
+
+    def __init__(self, tree: Dict[str, List[Dict]]):
+        self.tree = tree
+        self.calls: List[tuple] = []
+
+    async def list_page(self, path: Optional[str], offset: int, limit: int) -> Optional[List[Dict]]:
+        self.calls.append((path, offset, limit))
+        await asyncio.sleep(0)
+        if path not in self.tree:
+            return None
+        return self.tree[path][offset:offset + limit]
+
+
+async def _collect(listing: FakeListing, root: str, **kwargs) -> List[str]:
+    return [item["path"] async for item in crawl_files(listing.list_page, root, lambda item: True, **kwargs)]
+
+
+def test_pagination_reads_every_page():
+    files = [_file(f"/root/{i}.mp4") for i in range(7)]
+    listing = FakeListing({"/root": files})
+
+    found = asyncio.run(_collect(listing, "/root", page_limit=3))
+
+    assert sorted(found) == sorted(f["path"] for f in files)
+    # Полные страницы 0 и 3 вызывают запрос следующей, неполная 6 — последняя
+    assert sorted(offset for _, offset, _ in listing.calls) == [0, 3, 6]
+
+
+def test_exact_multiple_of_page_limit_stops_on_empty_page():
+    files = [_file(f"/root/{i}.mp4") for i in range(4)]
+    listing = FakeListing({"/root": files})
+
+    found = asyncio.run(_collect(listing, "/root", page_limit=2))
+
+    assert len(found) == 4
+    assert sorted(offset for _, offset, _ in listing.calls) == [0, 2, 4]
+
+
+def test_walks_subfolders_and_filters_files():
+    listing = FakeListing({
+        "/root": [_file("/root/a.mp4"), _file("/root/notes.txt"), _dir("/root/sub")],
+        "/root/sub": [_file("/root/sub/b.mp4"), _dir("/root/sub/deep")],
+        "/root/sub/deep": [_file("/root/sub/deep/c.mp4")],
+    })
+
+    async def run():
+        wanted = lambda item: item["name"].endswith(".mp4")
+        return [item["path"] async for item in crawl_files(listing.list_page, "/root", wanted, page_limit=10)]
+
+    assert sorted(asyncio.run(run())) == ["/root/a.mp4", "/root/sub/b.mp4", "/root/sub/deep/c.mp4"]
+
+
+def test_non_recursive_skips_subfolders():
+    listing = FakeListing({
+        "/root": [_file("/root/a.mp4"), _dir("/root/sub")],
+        "/root/sub": [_file("/root/sub/b.mp4")],
+    })
+
+    assert asyncio.run(_collect(listing, "/root", recursive=False)) == ["/root/a.mp4"]
+    assert [path for path, _, _ in listing.calls] == ["/root"]
+
+
+def test_concurrency_is_bounded():
+    tree = {"/root": [_dir(f"/root/{i}") for i in range(10)]}
+    tree.update({f"/root/{i}": [_file(f"/root/{i}/v.mp4")] for i in range(10)})
+    active = 0
+    peak = 0
+
+    async def list_page(path, offset, limit):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return tree.get(path, [])[offset:offset + limit]
+
+    async def run():
+        return [item async for item in crawl_files(list_page, "/root", lambda item: True, concurrency=3)]
+
+    assert len(asyncio.run(run())) == 10
+    assert peak <= 3
+
+
+def test_listing_error_is_raised_after_walk_finishes():
+    listing = FakeListing({
+        "/root": [_dir("/root/broken"), _dir("/root/ok"), _file("/root/a.mp4")],
+        "/root/ok": [_file("/root/ok/b.mp4")],
+    })
+    original = listing.list_page
+
+    async def list_page(path, offset, limit):
+        if path == "/root/broken":
+            raise RuntimeError("429")
+        return await original(path, offset, limit)
+
+    found = []
+
+    async def run():
+        async for item in crawl_files(list_page, "/root", lambda item: True):
+            found.append(item["path"])
+
+    with pytest.raises(RuntimeError, match="429"):
+        asyncio.run(run())
+    # Остальные папки обойдены до того, как ошибка дошла до вызывающего
+    assert sorted(found) == ["/root/a.mp4", "/root/ok/b.mp4"]
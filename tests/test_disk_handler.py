@@ -0,0 +1,184 @@
+import asyncio
+import importlib
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from services.job_store import JobStore
+from services.progress import ProgressUpdater
+from services.scheduler import FairScheduler
+from services.transcript_cache import TranscriptCache
+
+
+class FakeBot:
+    """Bot без Telegram: запоминает отправленные результаты."""
+
+    def __init__(self):
+        self.documents: List[str] = []
+        self._message_id = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self._message_id += 1
+        return SimpleNamespace(message_id=self._message_id)
+
+    async def send_document(self, chat_id, document, caption=""):
+        self.documents.append(caption)
+
+    async def edit_message_text(self, text, **kwargs):
+        pass
+
+
+class FakeConverter:
+    """ffmpeg без ffmpeg: WAV — файл рядом с видео, массив — секунда тишины."""
+
+    def probe_duration(self, source, timeout=30.0):
+        return None
+
+    def video_to_audio(self, video_path, output_path=None, on_progress=None, cancel_event=None):
+        output = output_path or f"{video_path}.wav"
+        Path(output).write_bytes(b"\0" * 100)
+        return output
+
+    def audio_array(self, source, on_progress=None, cancel_event=None):
+        return np.zeros(16000, dtype=np.float32)
+
+    @staticmethod
+    def cleanup(file_path):
+        Path(file_path).unlink(missing_ok=True)
+
+
+class OrderedVideos(dict):
+    """Видео задачи в порядке создания (в обработчике — set с произвольным порядком)."""
+
+    def add(self, item) -> None:
+        self[item] = None
+
+    def discard(self, item) -> None:
+        self.pop(item, None)
+
+
+class ActiveVideos(dict):
+    def setdefault(self, key, default=None):
+        return super().setdefault(key, OrderedVideos())
+
+
+class FakeTranscription:
+    model_tag = "fake:tiny"
+
+    async def transcribe(self, audio, language=None, on_progress=None):
+        return "текст"
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    # Обработчик читает config при импорте: фиктивные токены, файлы — во временной папке
+    monkeypatch.chdir(tmp_path)
+    for name, value in (("BOT_TOKEN", "test"), ("YANDEX_DISK_TOKEN", "test"), ("ADMIN_IDS", "1")):
+        monkeypatch.setenv(name, os.environ.get(name, value))
+    module = importlib.import_module("handlers.disk_handler")
+
+    scheduler = FairScheduler({"download": 3, "convert": 2, "transcribe": 1})
+    scheduler.add_resource("temp", 10 ** 9)
+    monkeypatch.setattr(module, "_scheduler", scheduler)
+    monkeypatch.setattr(module, "_jobs", JobStore(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setattr(module, "_cache", TranscriptCache(str(tmp_path / "transcripts.sqlite3")))
+    monkeypatch.setattr(module, "_progress_updater", ProgressUpdater())
+    monkeypatch.setattr(module, "_converter", FakeConverter())
+    monkeypatch.setattr(module, "_transcription", FakeTranscription())
+    monkeypatch.setattr(module, "_active_videos", {})
+    monkeypatch.setattr(module, "_running_jobs", {})
+    monkeypatch.setattr(module, "_cancelled_jobs", set())
+    monkeypatch.setattr(module, "TEMP_DIR", tmp_path / "temp")
+    monkeypatch.setattr(module, "STREAM_AUDIO", False)
+    monkeypatch.setattr(module, "AUDIO_IN_MEMORY", True)
+    monkeypatch.setattr(module, "PIPELINE_ORDER", "listing")
+    yield module
+    module._jobs.close()
+
+
+def _add_job(handler, bot: FakeBot, user_id: int, videos: List[Dict], links: Dict[str, List[Dict]]) -> int:
+    """Задача со списком видео вместо обхода папки; запускается как в run_job_worker."""
+    url = f"https://disk.yandex.ru/d/{user_id}"
+    links[url] = videos
+    job_id = handler._jobs.create_job(chat_id=user_id, user_id=user_id, url=url)
+    task = asyncio.create_task(handler._run_job(bot, job_id, False))
+    handler._running_jobs[job_id] = task
+    return job_id
+
+
+def _serve_links(handler, monkeypatch, links: Dict[str, List[Dict]]) -> None:
+    async def resolve(url, status_msg):
+        return handler._iter_list(links[url])
+    monkeypatch.setattr(handler, "_resolve_videos", resolve)
+
+
+def _serve_downloads(handler, monkeypatch, gates: Dict[str, asyncio.Event]) -> None:
+    async def download(video, save_path, on_progress=None):
+        gate = gates.get(video["name"])
+        if gate is not None:
+            await gate.wait()
+        Path(save_path).write_bytes(b"\0" * video["size"])
+        return True
+    monkeypatch.setattr(handler, "_download_video", download)
+
+
+@pytest.mark.parametrize("sizes", [(400, 400, 400), (5000,)])
+def test_wav_reservation_does_not_wait_behind_downloads(handler, monkeypatch, sizes):
+    # Квота 1000 байт: два видео по 400 заняты, третье ждёт места в той же очереди пользователя
+    handler._scheduler.add_resource("temp", 1000)
+    monkeypatch.setattr(handler, "AUDIO_IN_MEMORY", False)
+    links: Dict[str, List[Dict]] = {}
+    _serve_links(handler, monkeypatch, links)
+    _serve_downloads(handler, monkeypatch, {})
+    bot = FakeBot()
+    videos = [{"name": f"{i}.mp4", "path": f"/{i}.mp4", "size": size} for i, size in enumerate(sizes)]
+
+    async def run():
+        job_id = _add_job(handler, bot, 1, videos, links)
+        await asyncio.wait_for(handler._running_jobs[job_id], 5)
+        return job_id
+
+    job_id = asyncio.run(run())
+
+    assert handler._jobs.get_job(job_id)["status"] == "done"
+    assert len(bot.documents) == len(sizes)
+    assert handler._scheduler.stats()["temp"]["in_use"] == 0
+
+
+def test_cancel_mid_pipeline_lets_other_job_finish(handler, monkeypatch):
+    # Одно место скачивания: первое видео задачи A его держит, второе и видео B ждут
+    handler._scheduler.add_resource("download", 1)
+    # cancel_job отменяет видео по порядку: держатель места освобождает его раньше,
+    # чем отменённое ожидающее видео успевает уйти из очереди
+    monkeypatch.setattr(handler, "_active_videos", ActiveVideos())
+    links: Dict[str, List[Dict]] = {}
+    _serve_links(handler, monkeypatch, links)
+    bot = FakeBot()
+
+    async def run():
+        stuck = asyncio.Event()
+        _serve_downloads(handler, monkeypatch, {"a0.mp4": stuck, "a1.mp4": stuck})
+        videos = [{"name": f"a{i}.mp4", "path": f"/a{i}.mp4", "size": 10} for i in range(2)]
+        first = _add_job(handler, bot, 1, videos, links)
+        while handler._scheduler.stats()["download"]["in_use"] == 0:
+            await asyncio.sleep(0.01)
+        second = _add_job(handler, bot, 2, [{"name": "b.mp4", "path": "/b.mp4", "size": 10}], links)
+        while handler._scheduler.stats()["download"]["waiting"] < 2:
+            await asyncio.sleep(0.01)
+
+        # Отмена снимает разом и держателя места, и ожидающее видео той же задачи
+        assert handler.cancel_job(first) is True
+        await asyncio.wait_for(handler._running_jobs[second], 5)
+        await asyncio.wait_for(handler._running_jobs[first], 5)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert handler._jobs.job_statuses([first, second]) == {first: "cancelled", second: "done"}
+    assert bot.documents == ["📝 b.mp4"]
+    stats = handler._scheduler.stats()
+    assert stats["download"]["in_use"] == 0 and stats["temp"]["in_use"] == 0
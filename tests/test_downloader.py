@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import aiohttp
+import pytest
+
+from benchmarks.fake_disk import FakeDisk
+from services.downloader import STATE_SUFFIX, download_ranged
+
+SIZE = 3 * 1024 * 1024 + 12345
+# Сегменты по 256 КБ и короткие паузы, чтобы тесты шли быстро
+OPTIONS = dict(
+    segments=4,
+    min_segment_size=256 * 1024,
+    backoff_base=0.01,
+    backoff_max=0.05,
+    chunk_size=64 * 1024,
+    write_size=128 * 1024,
+)
+
+
+@pytest.fixture
+def video(tmp_path) -> Path:
+    path = tmp_path / "video.mp4"
+    path.write_bytes(os.urandom(SIZE))
+    return path
+
+
+def _md5(path: Path) -> str:
+    return hashlib.md5(path.read_bytes()).hexdigest()
+
+
+async def _download(disk: FakeDisk, save_path: Path, **kwargs) -> bool:
+    async with aiohttp.ClientSession() as session:
+        async def get_link():
+            params = {"path": f"{FakeDisk.ROOT}/v0.mp4"}
+            async with session.get(f"{disk.api_url}/resources/download", params=params) as response:
+                return (await response.json())["href"]
+
+        return await download_ranged(session, get_link, str(save_path), **{**OPTIONS, **kwargs})
+
+
+def _run(disk: FakeDisk, body):
+    async def main():
+        await disk.start()
+        try:
+            return await body()
+        finally:
+            await disk.stop()
+    return asyncio.run(main())
+
+
+def test_segmented_download_matches_md5(video, tmp_path):
+    disk = FakeDisk(video, latency=0)
+    save_path = tmp_path / "out.mp4"
+    progress = []
+
+    async def on_progress(done: int, total: int):
+        progress.append((done, total))
+
+    assert _run(disk, lambda: _download(disk, save_path, on_progress=on_progress)) is True
+
+    assert _md5(save_path) == _md5(video)
+    assert not Path(f"{save_path}{STATE_SUFFIX}").exists()
+    # Проба размера и по запросу на каждый сегмент
+    assert disk.download_requests == 1 + OPTIONS["segments"]
+    assert progress[-1] == (SIZE, SIZE)
+
+
+def test_resume_after_cancel(video, tmp_path):
+    disk = FakeDisk(video, latency=0, bandwidth=2 * 1024 * 1024)
+    save_path = tmp_path / "out.mp4"
+    state_file = Path(f"{save_path}{STATE_SUFFIX}")
+
+    async def body():
+        download = asyncio.create_task(_download(disk, save_path))
+        while disk.bytes_sent < SIZE // 3:
+            await asyncio.sleep(0.01)
+        download.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await download
+        segments = json.loads(state_file.read_text())["segments"]
+        remaining = sum(end - pos + 1 for pos, end in segments if pos <= end)
+        assert 0 < remaining < SIZE
+
+        sent_before = disk.bytes_sent
+        disk.bandwidth = 0
+        assert await _download(disk, save_path) is True
+        return remaining, disk.bytes_sent - sent_before
+
+    remaining, resumed_bytes = _run(disk, body)
+
+    assert _md5(save_path) == _md5(video)
+    assert not state_file.exists()
+    # Докачивается только остаток из файла состояния (плюс байт пробы)
+    assert resumed_bytes == remaining + 1
+
+
+@pytest.mark.parametrize("status", [401, 403, 410])
+def test_expired_link_is_refreshed(video, tmp_path, status):
+    disk = FakeDisk(video, latency=0, link_uses=2, expired_status=status)
+    save_path = tmp_path / "out.mp4"
+
+    assert _run(disk, lambda: _download(disk, save_path)) is True
+
+    assert _md5(save_path) == _md5(video)
+    assert disk.expired_responses > 0
+    assert disk.links_issued > 1
+
+
+def test_server_ignoring_range_falls_back_to_whole_file(video, tmp_path):
+    disk = FakeDisk(video, latency=0, ranges=False)
+    save_path = tmp_path / "out.mp4"
+
+    assert _run(disk, lambda: _download(disk, save_path)) is True
+
+    assert _md5(save_path) == _md5(video)
+    assert not Path(f"{save_path}{STATE_SUFFIX}").exists()
+    # Проба и один запрос всего файла, без сегментов
+    assert disk.download_requests == 2
@@ -0,0 +1,203 @@
+import sqlite3
+
+import pytest
+
+from services import job_store
+from services.job_store import JobStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(job_store.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+def _job(store: JobStore, user_id: int, videos: int, priority: int = 1) -> int:
+    job_id = store.create_job(chat_id=user_id, user_id=user_id, url=f"https://disk/{user_id}")
+    if priority != 1:
+        store.update_job(job_id, priority=priority)
+    for i in range(videos):
+        store.add_task(job_id, {"path": f"/{job_id}/{i}.mp4", "name": f"{i}.mp4"})
+    return job_id
+
+
+def _claim_all(store: JobStore, lease_s: float = 60):
+    claimed = []
+    while True:
+        task = store.claim_task("w", lease_s)
+        if task is None:
+            return claimed
+        claimed.append((task["job_id"], task["idx"]))
+
+
+def test_claim_alternates_between_users(store, clock):
+    first = _job(store, user_id=1, videos=3)
+    second = _job(store, user_id=2, videos=2)
+
+    # Пользователь с меньшим числом видео в работе обслуживается первым
+    assert _claim_all(store) == [(first, 1), (second, 1), (first, 2), (second, 2), (first, 3)]
+
+
+def test_claim_prefers_higher_priority(store, clock):
+    big = _job(store, user_id=1, videos=2)
+    small = _job(store, user_id=2, videos=1, priority=0)
+
+    assert _claim_all(store) == [(small, 1), (big, 1), (big, 2)]
+
+
+def test_claimed_task_is_not_given_twice(store, clock):
+    _job(store, user_id=1, videos=1)
+
+    assert store.claim_task("a", 60) is not None
+    assert store.claim_task("b", 60) is None
+
+
+def test_expired_lease_is_reclaimed(store, clock):
+    job_id = _job(store, user_id=1, videos=1)
+    task = store.claim_task("a", 30)
+
+    clock.now += 20
+    store.renew_leases([task["id"]], "a", 30)
+    clock.now += 20
+    # Аренда продлена — видео всё ещё у воркера a
+    assert store.claim_task("b", 30) is None
+
+    clock.now += 31
+    assert store.claim_task("b", 30)["id"] == task["id"]
+    assert store.tasks(job_id)[0]["worker"] == "b"
+    # Продление от прежнего воркера аренду у нового не отнимает
+    store.renew_leases([task["id"]], "a", 1000)
+    assert store.tasks(job_id)[0]["worker"] == "b"
+
+
+def test_released_task_is_claimed_again(store, clock):
+    _job(store, user_id=1, videos=1)
+    task = store.claim_task("a", 60)
+
+    store.release_task(task["id"])
+
+    assert store.claim_task("b", 60)["id"] == task["id"]
+
+
+def test_finished_task_is_not_claimed(store, clock):
+    job_id = _job(store, user_id=1, videos=1)
+    task = store.claim_task("a", 60)
+
+    store.finish_task(task["id"], "transcribed", transcript="текст")
+
+    assert store.claim_task("b", 60) is None
+    row = store.tasks(job_id)[0]
+    assert (row["state"], row["transcript"], row["worker"]) == ("transcribed", "текст", None)
+
+
+def test_cancel_job_stops_claims(store, clock):
+    job_id = _job(store, user_id=1, videos=2)
+
+    assert store.cancel_job(job_id) is True
+    assert store.claim_task("w", 60) is None
+    assert store.job_statuses([job_id]) == {job_id: "cancelled"}
+    # Повторная отмена и отмена завершённой задачи ничего не меняют
+    assert store.cancel_job(job_id) is False
+    done = _job(store, user_id=2, videos=0)
+    store.update_job(done, status="done")
+    assert store.cancel_job(done) is False
+
+
+def test_add_task_with_transcript_is_not_claimed(store, clock):
+    job_id = store.create_job(chat_id=1, user_id=1, url="https://disk/1")
+
+    task = store.add_task(job_id, {"path": "/a.mp4"}, transcript="из кэша")
+
+    assert (task["state"], task["transcript"]) == ("transcribed", "из кэша")
+    assert store.claim_task("w", 60) is None
+
+
+def test_add_task_with_transcript_keeps_leased_task(store, clock):
+    job_id = _job(store, user_id=1, videos=2)
+    leased = store.claim_task("w", 60)
+
+    videos = [task["video"] for task in store.tasks(job_id)]
+    assert store.add_task(job_id, videos[0], transcript="x")["state"] == "listed"
+    assert store.add_task(job_id, videos[1], transcript="x")["state"] == "transcribed"
+    assert leased["idx"] == 1
+
+
+def test_add_task_is_idempotent(store, clock):
+    job_id = store.create_job(chat_id=1, user_id=1, url="https://disk/1")
+
+    first = store.add_task(job_id, {"path": "/a.mp4"})
+    again = store.add_task(job_id, {"path": "/a.mp4"})
+
+    assert first["id"] == again["id"]
+    assert len(store.tasks(job_id)) == 1
+
+
+def test_migrates_baseline_database(tmp_path, clock):
+    path = tmp_path / "jobs.sqlite3"
+    conn = sqlite3.connect(str(path))
+    # Схема до появления воркеров и приоритетов
+    conn.executescript(
+        """
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            listing_done INTEGER NOT NULL DEFAULT 0,
+            status_message_id INTEGER,
+            progress_message_id INTEGER,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            idx INTEGER NOT NULL,
+            video_key TEXT NOT NULL,
+            video TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'listed',
+            video_path TEXT,
+            audio_path TEXT,
+            text_path TEXT,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            UNIQUE (job_id, video_key)
+        );
+        INSERT INTO jobs (chat_id, user_id, url, created_at, updated_at) VALUES (1, 1, 'https://disk/1', 0, 0);
+        INSERT INTO tasks (job_id, idx, video_key, video, state, updated_at)
+            VALUES (1, 1, '/a.mp4', '{"path": "/a.mp4"}', 'downloaded', 0);
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    store = JobStore(str(path))
+    try:
+        task_columns = {row[1] for row in store._conn.execute("PRAGMA table_info(tasks)")}
+        assert {"worker", "lease_until", "step", "pct", "transcript"} <= task_columns
+        assert store.get_job(1)["priority"] == 1
+
+        task = store.claim_task("w", 60)
+        assert (task["video"], task["state"], task["step"], task["priority"]) == ({"path": "/a.mp4"}, "downloaded", 0, 1)
+    finally:
+        store.close()
+
+    # Повторное открытие уже мигрированной базы ничего не ломает
+    JobStore(str(path)).close()
@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+import time
+
+from services.metadata_cache import MetadataCache
+
+
+def _rows(path) -> dict:
+    conn = sqlite3.connect(str(path))
+    try:
+        return {key: stored_at for key, stored_at in conn.execute("SELECT key, stored_at FROM metadata")}
+    finally:
+        conn.close()
+
+
+def test_writes_reach_sqlite_on_flush(tmp_path):
+    path = tmp_path / "meta.sqlite3"
+    cache = MetadataCache(ttl=60, db_path=str(path))
+
+    async def run():
+        cache.put("a", [1, 2], stamp="r1")
+        cache.put("b", {"x": 1}, stamp="r2")
+        before = _rows(path)
+        await cache.flush()
+        return before
+
+    before = asyncio.run(run())
+    cache.close()
+
+    # До flush в базе ничего нет, после — обе записи одной пачкой
+    assert before == {}
+    assert set(_rows(path)) == {"a", "b"}
+    reopened = MetadataCache(ttl=60, db_path=str(path))
+    try:
+        assert reopened.get_stale("a") == ([1, 2], "r1")
+    finally:
+        reopened.close()
+
+
+def test_confirm_is_persisted(tmp_path):
+    path = tmp_path / "meta.sqlite3"
+    cache = MetadataCache(ttl=60, db_path=str(path))
+
+    async def run():
+        cache.put("a", [], stamp="r1")
+        await cache.flush()
+        stored = _rows(path)["a"]
+        await asyncio.sleep(0.01)
+        assert cache.confirm("a", "r1")
+        await cache.flush()
+        return stored
+
+    stored = asyncio.run(run())
+    cache.close()
+
+    assert _rows(path)["a"] > stored
+
+
+def test_close_writes_pending_entries(tmp_path):
+    path = tmp_path / "meta.sqlite3"
+    cache = MetadataCache(ttl=60, db_path=str(path))
+    cache.put("a", [], stamp="r1")
+
+    cache.close()
+
+    assert set(_rows(path)) == {"a"}
+
+
+def test_old_rows_are_pruned_on_open(tmp_path):
+    path = tmp_path / "meta.sqlite3"
+    cache = MetadataCache(ttl=60, db_path=str(path))
+    cache.put("old", [], stamp="r1")
+    cache.put("new", [], stamp="r2")
+    cache.close()
+    conn = sqlite3.connect(str(path))
+    conn.execute("UPDATE metadata SET stored_at = ? WHERE key = 'old'", (time.time() - 3600,))
+    conn.commit()
+    conn.close()
+
+    MetadataCache(ttl=60, db_path=str(path), max_age=600).close()
+
+    assert set(_rows(path)) == {"new"}
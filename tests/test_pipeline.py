@@ -0,0 +1,58 @@
+import asyncio
+from typing import List
+
+from services.pipeline import Pipeline, Stage
+
+
+async def _iter(items):
+    for item in items:
+        yield item
+
+
+def test_ready_items_bypass_stages_and_keep_order():
+    processed: List[int] = []
+    delivered: List[int] = []
+
+    async def slow(item: int) -> int:
+        processed.append(item)
+        await asyncio.sleep(0.01)
+        return item
+
+    async def sink(item: int, error):
+        assert error is None
+        delivered.append(item)
+
+    # Чётные элементы «уже готовы» (как текст из кэша)
+    pipeline = Pipeline([Stage("work", slow, concurrency=2)], max_in_flight=2, ready=lambda item: item % 2 == 0)
+    asyncio.run(pipeline.run(_iter(range(8)), sink))
+
+    assert delivered == list(range(8))
+    assert processed == [1, 3, 5, 7]
+
+
+def test_ready_items_do_not_take_window_slots():
+    async def run() -> List[str]:
+        release = asyncio.Event()
+        delivered: List[str] = []
+
+        async def blocked(item: str) -> str:
+            await release.wait()
+            return item
+
+        async def sink(item: str, error):
+            delivered.append(item)
+
+        async def source():
+            yield "slow"
+            # Окно (max_in_flight=1) занято — готовые элементы всё равно проходят
+            for i in range(3):
+                yield f"cached{i}"
+            release.set()
+
+        pipeline = Pipeline(
+            [Stage("work", blocked)], max_in_flight=1, ordered=False, ready=lambda item: item.startswith("cached")
+        )
+        await asyncio.wait_for(pipeline.run(source(), sink), 5)
+        return delivered
+
+    assert asyncio.run(run()) == ["cached0", "cached1", "cached2", "slow"]
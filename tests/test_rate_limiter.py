@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+from services.rate_limiter import TokenBucket
+
+
+def test_burst_is_served_without_waiting():
+    async def run():
+        bucket = TokenBucket(rate=1, capacity=5)
+        return [await bucket.acquire() for _ in range(5)]
+
+    assert max(asyncio.run(run())) < 0.05
+
+
+def test_rate_is_limited_after_burst():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        started = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Первый токен из запаса, ещё 10 — по 20 мс
+    assert 0.18 <= asyncio.run(run()) < 0.5
+
+
+def test_pause_blocks_all_waiters():
+    async def run():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.1)
+        return await asyncio.gather(*(bucket.acquire() for _ in range(3)))
+
+    assert min(asyncio.run(run())) >= 0.09
+
+
+def test_zero_rate_disables_limit():
+    async def run():
+        bucket = TokenBucket(rate=0, capacity=1)
+        return [await bucket.acquire() for _ in range(100)]
+
+    assert max(asyncio.run(run())) < 0.05
+
+
+def test_pause_applies_without_rate_limit():
+    async def run():
+        bucket = TokenBucket(rate=0, capacity=1)
+        bucket.pause(0.1)
+        return await bucket.acquire()
+
+    assert asyncio.run(run()) >= 0.09
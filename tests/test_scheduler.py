@@ -0,0 +1,168 @@
+import asyncio
+from typing import List
+
+from services.scheduler import PRIORITY_HIGH, FairScheduler
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _grants(scheduler: FairScheduler, requests, name: str = "r") -> List[str]:
+    """
+    Ставит заявки в очередь занятого ресурса и освобождает его по одной выдаче.
+
+    requests — список (пользователь, приоритет) в порядке поступления.
+    """
+    granted: List[str] = []
+
+    async def request(user: str, priority: int):
+        await scheduler.acquire(name, user, priority=priority)
+        granted.append(user)
+
+    # Место занято, все заявки ждут
+    await scheduler.acquire(name, "holder")
+    tasks = []
+    for user, priority in requests:
+        tasks.append(asyncio.create_task(request(user, priority)))
+        await _settle()
+    for _ in requests:
+        scheduler.release(name)
+        await _settle()
+    await asyncio.gather(*tasks)
+    return granted
+
+
+def test_users_are_served_round_robin():
+    scheduler = FairScheduler({"r": 1})
+    requests = [("a", 1), ("a", 1), ("a", 1), ("b", 1), ("b", 1), ("c", 1)]
+
+    assert asyncio.run(_grants(scheduler, requests)) == ["a", "b", "c", "a", "b", "a"]
+
+
+def test_higher_priority_is_served_first():
+    scheduler = FairScheduler({"r": 1})
+    requests = [("big", 1), ("big", 1), ("small", PRIORITY_HIGH), ("other", PRIORITY_HIGH)]
+
+    assert asyncio.run(_grants(scheduler, requests)) == ["small", "other", "big", "big"]
+
+
+def test_position_follows_service_order():
+    async def run():
+        scheduler = FairScheduler({"r": 1})
+        await scheduler.acquire("r", "holder")
+        tasks = [asyncio.create_task(scheduler.acquire("r", user)) for user in ("a", "a", "b")]
+        await _settle()
+        before = {user: scheduler.position("r", user) for user in ("a", "b", "c")}
+
+        tasks.append(asyncio.create_task(scheduler.acquire("r", "c", priority=PRIORITY_HIGH)))
+        await _settle()
+        after = {user: scheduler.position("r", user) for user in ("a", "b", "c")}
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return before, after
+
+    before, after = asyncio.run(run())
+
+    assert before == {"a": 1, "b": 2, "c": 0}
+    assert after == {"a": 2, "b": 3, "c": 1}
+
+
+def test_oversized_request_is_clamped_to_capacity():
+    async def run():
+        scheduler = FairScheduler({"temp": 100})
+        amount = await scheduler.acquire("temp", "a", 500)
+        stats = scheduler.stats()["temp"]
+        scheduler.release("temp", amount)
+        return amount, stats, scheduler.stats()["temp"]["in_use"]
+
+    amount, stats, in_use_after = asyncio.run(run())
+
+    assert amount == 100
+    assert stats["in_use"] == 100
+    assert in_use_after == 0
+
+
+def test_large_request_is_not_starved_by_small_ones():
+    async def run():
+        scheduler = FairScheduler({"temp": 10})
+        await scheduler.acquire("temp", "a", 6)
+        big = asyncio.create_task(scheduler.acquire("temp", "b", 8))
+        await _settle()
+        small = asyncio.create_task(scheduler.acquire("temp", "c", 2))
+        await _settle()
+        # Малая заявка поместилась бы, но ждёт большую, стоящую перед ней
+        blocked = not small.done()
+
+        scheduler.release("temp", 6)
+        await _settle()
+        return blocked, big.done(), small.done()
+
+    assert asyncio.run(run()) == (True, True, True)
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def run():
+        scheduler = FairScheduler({"r": 1})
+        await scheduler.acquire("r", "holder")
+        waiter = asyncio.create_task(scheduler.acquire("r", "a"))
+        await _settle()
+        waiting = scheduler.stats()["r"]["waiting"]
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release("r")
+        return waiting, scheduler.stats()["r"], scheduler.position("r", "a")
+
+    waiting, stats, position = asyncio.run(run())
+
+    assert waiting == 1
+    assert stats["waiting"] == 0 and stats["in_use"] == 0
+    assert position == 0
+
+
+def test_slot_releases_on_error():
+    async def run():
+        scheduler = FairScheduler({"r": 2})
+        try:
+            async with scheduler.slot("r", "a"):
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        return scheduler.stats()["r"]["in_use"]
+
+    assert asyncio.run(run()) == 0
+
+
+def test_cancelling_holder_and_waiter_together_frees_slot():
+    async def run():
+        scheduler = FairScheduler({"download": 1})
+        held = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("download", "a"):
+                held.set()
+                await asyncio.sleep(10)
+
+        first = asyncio.create_task(holder())
+        await held.wait()
+        second = asyncio.create_task(scheduler.acquire("download", "b"))
+        await _settle()
+
+        # Как /cancel: все этапы задачи отменяются разом
+        first.cancel()
+        second.cancel()
+        results = await asyncio.gather(first, second, return_exceptions=True)
+
+        # Место не потеряно: следующий пользователь получает его сразу
+        amount = await asyncio.wait_for(scheduler.acquire("download", "c"), 1)
+        scheduler.release("download", amount)
+        return results, scheduler.stats()["download"]
+
+    results, stats = asyncio.run(run())
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert stats["in_use"] == 0 and stats["waiting"] == 0
@@ -0,0 +1,45 @@
+import asyncio
+from typing import List
+
+import numpy as np
+
+from services.transcription import SAMPLE_RATE
+from services.transcription_pool import TranscriptionPool
+
+
+def _run(pool: TranscriptionPool, audio: np.ndarray) -> List[int]:
+    sizes: List[int] = []
+
+    async def submit(chunk, language, on_progress=None):
+        sizes.append(len(chunk))
+        return "текст"
+
+    pool._executor = object()  # процессы не запускаются
+    pool._submit = submit
+    asyncio.run(pool.transcribe(audio))
+    return sizes
+
+
+def test_long_audio_is_chunked_with_single_worker():
+    pool = TranscriptionPool(workers=1, chunk_s=60, overlap_s=2)
+    audio = np.zeros(300 * SAMPLE_RATE, dtype=np.float32)
+
+    sizes = _run(pool, audio)
+
+    # В процесс уходят только фрагменты, а не вся запись
+    assert len(sizes) > 1
+    assert max(sizes) < len(audio)
+
+
+def test_chunking_disabled_sends_whole_audio():
+    pool = TranscriptionPool(workers=4, chunk_s=0)
+    audio = np.zeros(300 * SAMPLE_RATE, dtype=np.float32)
+
+    assert _run(pool, audio) == [len(audio)]
+
+
+def test_short_audio_is_not_chunked():
+    pool = TranscriptionPool(workers=4, chunk_s=60)
+    audio = np.zeros(80 * SAMPLE_RATE, dtype=np.float32)
+
+    assert _run(pool, audio) == [len(audio)]
@@ -0,0 +1,136 @@
+import asyncio
+from typing import List
+
+import pytest
+from aiohttp import web
+
+from benchmarks.fake_disk import FakeDisk
+from services import yandex_disk
+from services.metadata_cache import MetadataCache
+from services.yandex_disk import YandexDisk, YandexDiskNotFound, YandexDiskServerError
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    # Паузы между повторами без случайного разброса
+    monkeypatch.setattr(yandex_disk.random, "uniform", lambda a, b: 0.0)
+
+
+def _api(responses: List[web.Response], body):
+    """Запускает API, отвечающее по очереди responses (дальше — 200), и выполняет body(disk)."""
+    requests = []
+
+    async def handler(request: web.Request) -> web.Response:
+        requests.append(request.query.get("path"))
+        if responses:
+            return responses.pop(0)
+        return web.json_response({"path": request.query.get("path")})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/v1/disk/resources", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        disk = YandexDisk("token", api_rate=0, api_max_retries=2)
+        disk.API_BASE_URL = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1/disk"
+        try:
+            return await body(disk)
+        finally:
+            await disk.close()
+            await runner.cleanup()
+
+    return asyncio.run(main()), requests
+
+
+def test_rate_limited_request_is_retried_after_retry_after():
+    responses = [web.json_response({"error": "TooManyRequests"}, status=429, headers={"Retry-After": "0.2"})]
+
+    async def body(disk: YandexDisk):
+        started = asyncio.get_running_loop().time()
+        data = await disk._api_get("/resources", {"path": "/a"})
+        return data, asyncio.get_running_loop().time() - started, disk.api_stats()
+
+    (data, elapsed, stats), requests = _api(responses, body)
+
+    assert data == {"path": "/a"}
+    assert requests == ["/a", "/a"]
+    assert elapsed >= 0.2
+    assert stats["retries"] == 1 and stats["rate_limited"] == 1
+
+
+def test_server_error_gives_up_after_max_retries():
+    responses = [web.json_response({"message": "busy"}, status=503) for _ in range(3)]
+
+    async def body(disk: YandexDisk):
+        with pytest.raises(YandexDiskServerError):
+            await disk._api_get("/resources", {"path": "/a"})
+
+    _, requests = _api(responses, body)
+
+    assert len(requests) == 3
+
+
+def test_not_found_is_not_retried():
+    responses = [web.json_response({"description": "нет"}, status=404)]
+
+    async def body(disk: YandexDisk):
+        with pytest.raises(YandexDiskNotFound):
+            await disk._api_get("/resources", {"path": "/a"})
+
+    _, requests = _api(responses, body)
+
+    assert requests == ["/a"]
+
+
+def _fake_disk_run(tmp_path, body):
+    video = tmp_path / "v.mp4"
+    video.write_bytes(b"\0" * 1024)
+    fake = FakeDisk(video, depth=2, width=3, files_per_folder=1, latency=0)
+
+    async def main():
+        await fake.start()
+        cache = MetadataCache(ttl=0.2)
+        disk = YandexDisk("token", api_rate=0, metadata_cache=cache)
+        disk.API_BASE_URL = fake.api_url
+        try:
+            return await body(fake, disk, cache)
+        finally:
+            await disk.close()
+            await fake.stop()
+
+    return asyncio.run(main())
+
+
+def test_revalidated_crawl_confirms_whole_tree(tmp_path):
+    async def body(fake: FakeDisk, disk: YandexDisk, cache: MetadataCache):
+        first = await disk.get_video_files_from_public_folder(FakeDisk.PUBLIC_KEY)
+        full_crawl = fake.api_requests
+
+        await asyncio.sleep(0.25)  # записи кэша устарели
+        fake.api_requests = 0
+        second = await disk.get_video_files_from_public_folder(FakeDisk.PUBLIC_KEY)
+        return first, second, full_crawl, fake.api_requests, cache.stats()
+
+    first, second, full_crawl, revalidation, stats = _fake_disk_run(tmp_path, body)
+
+    assert second == first and len(first) == 13
+    assert full_crawl == 13
+    # Один запрос метки корня подтверждает все 13 папок
+    assert revalidation == 1
+    assert stats["revalidated"] == 13
+
+
+def test_public_resource_info_is_revalidated(tmp_path):
+    async def body(fake: FakeDisk, disk: YandexDisk, cache: MetadataCache):
+        first = await disk.get_public_resource_info(FakeDisk.PUBLIC_KEY)
+        await asyncio.sleep(0.25)
+        second = await disk.get_public_resource_info(FakeDisk.PUBLIC_KEY)
+        return first, second, fake.api_requests, cache.stats()
+
+    first, second, requests, stats = _fake_disk_run(tmp_path, body)
+
+    assert second == first
+    assert requests == 2
+    assert stats["revalidated"] == 1 and stats["misses"] == 1
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+from config import BOT_ROLE, WORKER_ID, METRICS_HOST, METRICS_PORT
+from handlers.disk_handler import run_task_worker, metrics
+from services.metrics import start_metrics_server
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    # Процесс обработки видео: скачивание, конвертация и транскрибация.
+    # Бот (BOT_ROLE=frontend) только принимает ссылки и отправляет результаты,
+    # воркеров может быть несколько — все работают с общей JOB_STORE_PATH
+    if BOT_ROLE != "frontend":
+        raise SystemExit("worker.py работает вместе с ботом в режиме BOT_ROLE=frontend")
+
+    worker_id = WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+    # Работаем до SIGINT/SIGTERM (docker stop)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: остановка по Ctrl+C через KeyboardInterrupt
+
+    # Метрики этапов каждого воркера — на его собственном METRICS_PORT
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(metrics, METRICS_HOST, METRICS_PORT)
+        logger.info(f"Метрики: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+    logger.info(f"Воркер {worker_id} запущен")
+    try:
+        await run_task_worker(worker_id, stop)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+    logger.info(f"Воркер {worker_id} остановлен")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())